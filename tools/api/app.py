@@ -1,7 +1,8 @@
 import os
 from flask import Flask, jsonify
 from flask_cors import CORS
-from .models import db
+from .database import init_database
+from .entity_cache import init_entity_cache
 from .routes import register_routes
 
 def create_app(test_config=None):
@@ -12,7 +13,10 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tools', 'health_protocol.db'),
-        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tools', 'health_protocol.db')}",
+        SQLALCHEMY_DATABASE_URI=os.environ.get(
+            'DATABASE_URL',
+            f"sqlite:///{os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tools', 'health_protocol.db')}"
+        ),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
     )
     
@@ -33,7 +37,8 @@ def create_app(test_config=None):
         pass
     
     # Initialize database
-    db.init_app(app)
+    init_database(app)
+    init_entity_cache(app)
     
     # Register all API routes
     register_routes(app)
@@ -43,6 +48,11 @@ def create_app(test_config=None):
     def health_check():
         return jsonify({"status": "healthy"})
     
+    # Entity cache hit/miss metrics
+    @app.route('/health/cache')
+    def cache_stats():
+        return jsonify(app.extensions['entity_cache'].stats())
+    
     return app
 
 app = create_app()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Benchmark the read endpoints against recorded baselines.
+
+Seeds a database per size with the data generator (fixed seed and date,
+so every run sees the same data), then issues each GET endpoint of the
+blueprints repeatedly, first through the Flask test client and then over
+HTTP to a threaded WSGI server. Per endpoint it records p50/p95/p99
+latency, the SQL statements run per request and the response size.
+
+Any response that is not 2xx fails the run, and is never written to the
+baseline. Results are compared with a baseline file, and regressions are
+reported:
+a median latency that grew by more than the tolerance relative to the
+other endpoints, more queries per request, a larger response or a changed
+status. Query counts and sizes do not depend on the machine. Latencies
+do, so refresh the baseline on the machine the comparison runs on; the
+overall slowdown against the baseline is printed for each run.
+
+Usage (from the tools directory):
+    python -m api.benchmark --sizes small medium           # compare with the baseline
+    python -m api.benchmark --sizes small medium --update-baseline
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from werkzeug.serving import WSGIRequestHandler, make_server
+from .app import create_app
+from .models import db
+from .parity_check import sample_ids
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Data generator options per size, on top of GENERATOR_OPTIONS
+SIZES = {
+    'small': [],
+    'medium': ['--users', '1000', '--activities', '120', '--history-per-user', '20'],
+    'large': ['--users', '20000', '--activities', '1200', '--history-per-user', '50', '--vectorized'],
+}
+GENERATOR_OPTIONS = ['--seed', '0', '--reference-date', '2025-01-01']
+
+# Path arguments -> sample_ids key filling them in
+ARGUMENTS = {
+    'user_id': 'user',
+    'activity_id': 'activity',
+    'body_area_id': 'body_area',
+    'tag_id': 'tag',
+    'protocol_id': 'protocol',
+    'ap_id': 'activity_protocol',
+    'guide_id': 'guide',
+    'version_id': 'guide_version',
+    'playlist_id': 'playlist',
+    'skill_id': 'skill',
+    'category_id': 'skill_category',
+}
+
+# Query strings for endpoints that need (or are usually called with) one
+QUERY_STRINGS = {
+    'activity_routes.get_activities': 'limit=50',
+    'stats_routes.get_activity_stats': 'user_id={user}',
+    'stats_routes.get_playlist_stats': 'user_id={user}',
+    'stats_routes.get_metric_stats': 'source=activity-history&field=reps&user_id={user}',
+}
+
+# Further requests worth tracking on their own
+EXTRA_REQUESTS = {
+    'activity_routes.get_activities (search)': '/api/activities/?q={activity_word}',
+}
+
+
+def seed_database(size, directory):
+    """Generate (or reuse) the database for a size and return its path."""
+    db_path = os.path.join(directory, f'benchmark_{size}.db')
+    if not os.path.exists(db_path):
+        # main.py imports through the tools package and reads paste.txt from its directory
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(TOOLS_DIR), TOOLS_DIR,
+                                                           env.get('PYTHONPATH')]))
+        subprocess.run([sys.executable, 'main.py', '--db', db_path, *GENERATOR_OPTIONS, *SIZES[size]],
+                       cwd=TOOLS_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    return db_path
+
+
+def benchmark_requests(app, engine):
+    """
+    List the GET endpoints of the blueprints as (name, path), with ids
+    from the database filled in. Endpoints with a path argument missing
+    from ARGUMENTS are skipped.
+    """
+    ids = sample_ids(engine)
+    with engine.connect() as conn:
+        ids['guide_version'] = conn.execute(
+            text('SELECT min(id) FROM GuideVersions WHERE guide_id = :guide'), {'guide': ids['guide']}).scalar()
+
+    requests = {}
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or not rule.rule.startswith('/api/'):
+            continue
+        if any(argument not in ARGUMENTS for argument in rule.arguments):
+            continue
+        path = rule.build({argument: ids[ARGUMENTS[argument]] for argument in rule.arguments},
+                          append_unknown=False)[1]
+        if rule.endpoint in QUERY_STRINGS:
+            path += '?' + QUERY_STRINGS[rule.endpoint].format(**ids)
+        requests[rule.endpoint] = path
+    for name, path in EXTRA_REQUESTS.items():
+        requests[name] = path.format(**ids)
+    return sorted(requests.items())
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(requests, send, queries, repeat):
+    """
+    Issue every request repeat times, after a warm-up pass. Requests are
+    interleaved, one pass over all of them at a time, so a slow moment of
+    the machine is spread over all endpoints instead of skewing one.
+
+    Args:
+        requests: (name, path) pairs
+        send: Function making a request for a path and returning (status, body bytes)
+        queries: One-item list counting the statements executed
+        repeat: Number of timed requests per path
+
+    Returns:
+        dict: name -> status, bytes, queries per request and latency percentiles
+    """
+    for _, path in requests:
+        send(path)
+
+    latencies = {name: [] for name, _ in requests}
+    query_counts = dict.fromkeys(latencies, 0)
+    responses = {}
+    for _ in range(repeat):
+        for name, path in requests:
+            queries[0] = 0
+            started = time.perf_counter()
+            responses[name] = send(path)
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            query_counts[name] += queries[0]
+
+    results = {}
+    for name, _ in requests:
+        status, body = responses[name]
+        values = sorted(latencies[name])
+        results[name] = {
+            'status': status,
+            'bytes': len(body),
+            'queries': query_counts[name] / repeat,
+            'p50_ms': round(_percentile(values, 0.50), 3),
+            'p95_ms': round(_percentile(values, 0.95), 3),
+            'p99_ms': round(_percentile(values, 0.99), 3),
+        }
+    return results
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _http_get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def run_size(db_path, repeat):
+    """
+    Benchmark every request against the database, in both modes.
+
+    Returns:
+        dict: mode -> request name -> measurements
+    """
+    uri = f'sqlite:///{db_path}'
+    # Measure the database, not the in-process cache
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'ENTITY_CACHE_ENABLED': False})
+    # Failing endpoints are recorded by status; their tracebacks would drown the report
+    app.logger.disabled = True
+    requests = benchmark_requests(app, create_engine(uri))
+
+    queries = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries[0] += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    client = app.test_client()
+
+    def client_get(path):
+        response = client.get(path)
+        return response.status_code, response.data
+
+    results = {'test_client': measure(requests, client_get, queries, repeat)}
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        results['wsgi'] = measure(requests, lambda path: _http_get(server.port, path), queries, repeat)
+    finally:
+        server.shutdown()
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count)
+            db.engine.dispose()
+    return results
+
+
+def speed_factor(requests, baseline_requests):
+    """
+    Get the median ratio of median latencies to the baseline over the
+    requests both have: how much slower (above 1) or faster the machine
+    ran overall than when the baseline was recorded.
+    """
+    ratios = sorted(new['p50_ms'] / baseline_requests[name]['p50_ms'] for name, new in requests.items()
+                    if baseline_requests.get(name, {}).get('p50_ms'))
+    return ratios[len(ratios) // 2] if ratios else 1.0
+
+
+def compare(results, baseline, tolerance):
+    """
+    Find regressions of the results against the baseline.
+
+    Latency is compared on the median, since the tail of a few dozen
+    requests mostly reflects what else the machine was doing, after
+    scaling the baseline by the run's speed_factor: an endpoint regresses
+    when it slowed down more than the others did. It also has to be at
+    least 1 ms slower, so sub-millisecond noise is not reported.
+
+    Returns:
+        tuple: (size, mode) -> speed factor, and a list of
+        (size, mode, request, metric, baseline value, new value)
+    """
+    factors = {}
+    regressions = []
+    for size, modes in results.items():
+        for mode, requests in modes.items():
+            baseline_requests = baseline.get(size, {}).get(mode, {})
+            factor = factors[size, mode] = speed_factor(requests, baseline_requests)
+            for name, new in requests.items():
+                old = baseline_requests.get(name)
+                if old is None:
+                    continue
+                if new['status'] != old['status']:
+                    regressions.append((size, mode, name, 'status', old['status'], new['status']))
+                if new['queries'] > old['queries']:
+                    regressions.append((size, mode, name, 'queries', old['queries'], new['queries']))
+                if new['bytes'] > old['bytes'] * (1 + tolerance):
+                    regressions.append((size, mode, name, 'bytes', old['bytes'], new['bytes']))
+                expected_ms = old['p50_ms'] * max(factor, 1.0)
+                if new['p50_ms'] > expected_ms * (1 + tolerance) and new['p50_ms'] - expected_ms >= 1:
+                    regressions.append((size, mode, name, 'p50_ms', old['p50_ms'], new['p50_ms']))
+    return factors, regressions
+
+
+def failed_requests(results):
+    """List the (size, mode, request, status) of responses that were not 2xx."""
+    return [(size, mode, name, r['status'])
+            for size, modes in results.items()
+            for mode, requests in modes.items()
+            for name, r in requests.items()
+            if not 200 <= r['status'] < 300]
+
+
+def print_results(size, results):
+    print(f'== {size}')
+    print(f'{"request":<52} {"mode":<11} {"status":>6} {"queries":>7} {"bytes":>9} '
+          f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for mode, requests in results.items():
+        for name, r in requests.items():
+            print(f'{name:<52} {mode:<11} {r["status"]:>6} {r["queries"]:>7g} {r["bytes"]:>9} '
+                  f'{r["p50_ms"]:>8.2f} {r["p95_ms"]:>8.2f} {r["p99_ms"]:>8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the API read endpoints against a baseline')
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(SIZES),
+                        help='Dataset sizes to benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint')
+    parser.add_argument('--data-dir', help='Directory keeping the seeded databases between runs '
+                                           '(default: a temporary directory)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='Fraction by which median latency and response size may grow')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        directory = args.data_dir or temporary_directory
+        os.makedirs(directory, exist_ok=True)
+        results = {}
+        for size in args.sizes:
+            results[size] = run_size(seed_database(size, directory), args.repeat)
+            print_results(size, results[size])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    # A failing endpoint is never an acceptable result, nor a baseline
+    failures = failed_requests(results)
+    for size, mode, name, status in failures:
+        print(f'FAILED  {size} {mode} {name}: status {status}')
+    if failures:
+        print(f'{len(failures)} requests did not succeed' +
+              ('; baseline not written' if args.update_baseline else ''))
+        sys.exit(1)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --update-baseline to record one')
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    factors, regressions = compare(results, baseline, args.tolerance)
+    for (size, mode), factor in factors.items():
+        print(f'{size} {mode}: {factor:.2f}x the baseline latency overall')
+    for size, mode, name, metric, old, new in regressions:
+        print(f'REGRESSION  {size} {mode} {name}: {metric} {old} -> {new}')
+    print(f'{len(regressions)} regressions against {args.baseline}')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
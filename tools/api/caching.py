@@ -0,0 +1,73 @@
+import hashlib
+from functools import wraps
+from flask import current_app, make_response, request
+from sqlalchemy import bindparam, text
+from .models import db
+from .schema import has_table
+
+DEFAULT_MAX_AGE = 300
+
+_versions_query = text(
+    "SELECT table_name, version FROM table_versions WHERE table_name IN :tables"
+).bindparams(bindparam('tables', expanding=True))
+
+
+def table_versions(tables):
+    """
+    Read the write counters for the given tables.
+
+    Returns:
+        dict: table name -> version, or None if the database has no counters
+    """
+    if not has_table('table_versions'):
+        return None
+    rows = db.session.execute(_versions_query, {'tables': list(tables)})
+    versions = dict.fromkeys(tables, 0)
+    versions.update(rows.all())
+    return versions
+
+
+def make_etag(versions):
+    """Build a strong ETag from table versions and the requested representation."""
+    key = [request.full_path, request.headers.get('Accept', '')]
+    key.extend(f'{table}={versions[table]}' for table in sorted(versions))
+    return hashlib.sha1('\n'.join(key).encode()).hexdigest()
+
+
+def conditional_get(*models):
+    """
+    Serve a view with an ETag derived from the versions of the tables backing
+    ``models``, answering ``304 Not Modified`` without running the view when
+    the client's ``If-None-Match`` still matches.
+
+    The tables must be listed in schema_utils.VERSIONED_TABLES so that writes
+    bump their counter. Responses carry ``Cache-Control: public, max-age``
+    from the ``REFERENCE_DATA_MAX_AGE`` setting. On databases created without
+    the counters the view is served as usual, without caching headers.
+    """
+    tables = [model.__tablename__ for model in models]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = table_versions(tables)
+            if versions is None:
+                return view(*args, **kwargs)
+
+            etag = make_etag(versions)
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config.get('REFERENCE_DATA_MAX_AGE', DEFAULT_MAX_AGE)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,147 @@
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from .models import db
+
+# PRAGMAs applied to every new SQLite connection, by profile. WAL lets
+# readers run alongside the single writer instead of blocking on the
+# rollback journal lock, and synchronous=NORMAL is durable in WAL mode
+# except for the last commits before a power loss. busy_timeout makes a
+# writer wait for the lock rather than fail with "database is locked".
+SQLITE_PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,       # milliseconds
+        'cache_size': -65536,       # negative values are KiB, so 64 MiB
+        'mmap_size': 268435456,     # 256 MiB
+        'temp_store': 'MEMORY',
+    },
+    # SQLite's own defaults: rollback journal, synchronous=FULL
+    'default': {},
+}
+
+# Connection pool for a file database served from several threads. Each
+# worker thread holds one connection while handling a request, so the pool
+# should be at least as large as the number of server threads.
+SQLITE_POOL_OPTIONS = {
+    'pool_size': 16,
+    'max_overflow': 16,
+    'pool_timeout': 30,
+}
+
+
+# Connection pool for PostgreSQL (e.g. the Supabase database). Connections
+# are checked before use and recycled, since poolers and managed databases
+# close idle connections on their side.
+POSTGRES_POOL_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
+
+# Tables filled by SQLite triggers (see schema_utils). They are not created
+# on other databases, where the API falls back to computing from the base
+# tables or reports the feature as unavailable.
+DERIVED_TABLES = ('activity_history_rollups', 'playlist_performance_rollups')
+
+
+def database_uri(uri):
+    """
+    Normalize a database URI, accepting the postgres:// scheme Supabase and
+    Heroku style DATABASE_URL values use, which SQLAlchemy does not.
+    """
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def sqlite_pragmas(app):
+    """
+    Get the PRAGMAs for the app's ``SQLITE_PROFILE`` ('production' unless
+    configured otherwise), with ``SQLITE_PRAGMAS`` overriding single values.
+    """
+    profile = app.config.get('SQLITE_PROFILE', 'production')
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f'Unknown SQLITE_PROFILE: {profile}')
+    return {**SQLITE_PROFILES[profile], **app.config.get('SQLITE_PRAGMAS', {})}
+
+
+def _is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def init_database(app):
+    """
+    Set up Flask-SQLAlchemy for the app's ``SQLALCHEMY_DATABASE_URI``.
+
+    For SQLite file databases, unless ``SQLITE_PROFILE`` is 'default', the
+    profile's PRAGMAs are run on every connection the pool opens and the
+    pool defaults from SQLITE_POOL_OPTIONS are used. PostgreSQL databases
+    get POSTGRES_POOL_OPTIONS. Either way ``SQLALCHEMY_ENGINE_OPTIONS``
+    takes precedence over the defaults.
+    """
+    uri = app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    backend = make_url(uri).get_backend_name()
+    pragmas = sqlite_pragmas(app) if _is_sqlite_file(uri) else {}
+
+    pool_options = {}
+    if pragmas:
+        pool_options = SQLITE_POOL_OPTIONS
+    elif backend == 'postgresql':
+        pool_options = POSTGRES_POOL_OPTIONS
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **pool_options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+
+    db.init_app(app)
+
+    if not pragmas:
+        return
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'connect')
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.close()
+
+
+def create_tables():
+    """
+    Create the model tables missing from the current app's database, for
+    databases not initialized by schema_utils (e.g. PostgreSQL).
+    """
+    tables = [table for table in db.metadata.sorted_tables if table.name not in DERIVED_TABLES]
+    db.metadata.create_all(db.engine, tables=tables)
+
+
+def begin_transaction():
+    """
+    Make sure the session's transaction has begun in the database, so that
+    savepoints (``db.session.begin_nested()``) nest inside it.
+
+    The sqlite3 module only sends BEGIN before its first INSERT, UPDATE or
+    DELETE. A SAVEPOINT issued earlier would start the transaction itself,
+    and releasing it would commit, out of reach of a later rollback.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    dbapi_connection = connection.connection.driver_connection
+    if not dbapi_connection.in_transaction:
+        dbapi_connection.execute('BEGIN')
+
+
+def insert(model):
+    """
+    Get an INSERT statement for the model in the current database's dialect,
+    which supports ``on_conflict_do_nothing()``/``on_conflict_do_update()``
+    on both SQLite and PostgreSQL.
+    """
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model)
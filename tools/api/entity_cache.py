@@ -0,0 +1,373 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import abort, current_app, has_app_context, request
+from sqlalchemy import event
+from .models import (
+    db, Activity, ActivityMedia, ActivityBodyArea, BodyArea, ActivityTag, Tag,
+    Guide, GuidePart, GuideVersion, GuidePartVersion, Playlist, PlaylistItem,
+)
+from .models.serializer import serializer_options
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 300
+
+# Cached models whose serialized form embeds rows of other models. A write to
+# any of the listed models drops every cached entry of the dependent model,
+# since working out which entries embed the changed row would cost more than
+# the writes are worth.
+CACHE_DEPENDENCIES = {
+    Activity: (ActivityMedia, ActivityBodyArea, BodyArea, ActivityTag, Tag),
+    Playlist: (PlaylistItem, Activity, ActivityMedia, ActivityBodyArea, BodyArea, ActivityTag, Tag),
+    Guide: (GuidePart, GuideVersion, GuidePartVersion),
+}
+
+
+class LRUCache:
+    """
+    In-process least recently used cache with a per-entry time to live.
+
+    This is the default backend. Other backends (e.g. RedisCache) implement
+    the same get/set/delete/delete_prefix/clear/generation methods.
+
+    Every delete bumps the generation of the keys it drops. Passing the
+    generation read before loading a value to set() skips storing it if the
+    key was deleted meanwhile, so a load racing a write cannot cache what the
+    write replaced. Generations of the most recently deleted keys are kept;
+    older keys report the newest generation forgotten, which at worst skips
+    storing a value.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._generations = OrderedDict()
+        self._prefix_generations = {}
+        self._forgotten_generation = 0
+
+    def _bump(self, key):
+        self._generation += 1
+        self._generations[key] = self._generation
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.max_entries:
+            self._forgotten_generation = self._generations.popitem(last=False)[1]
+
+    def _generation_of(self, key):
+        generation = self._generations.get(key, self._forgotten_generation)
+        for prefix, prefix_generation in self._prefix_generations.items():
+            if key.startswith(prefix):
+                generation = max(generation, prefix_generation)
+        return generation
+
+    def generation(self, key):
+        with self._lock:
+            return self._generation_of(key)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and self._generation_of(key) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._bump(key)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+            self._generation += 1
+            self._prefix_generations[prefix] = self._generation
+
+    def clear(self):
+        self.delete_prefix('')
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    Shared cache backend storing entries as JSON in Redis, so that several
+    API processes see the same entries and invalidations.
+
+    Generations are counters kept next to the entries, one per deleted key
+    and one per deleted prefix, and set() with a generation is a
+    compare-and-set watching them. Prefixes are expected to end at a ``:``
+    of the keys (as the ``Model:`` prefixes of EntityCache do), since those
+    are the only prefixes a key's generation is read for.
+
+    Requires the ``redis`` package.
+    """
+
+    def __init__(self, url, ttl=DEFAULT_TTL, namespace='health_protocol:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.namespace = namespace
+        self._watch_error = redis.WatchError
+
+    def _generation_keys(self, key):
+        prefixes = [''] + [key[:i + 1] for i, char in enumerate(key) if char == ':']
+        return [f'{self.namespace}generation:{key}'] + [
+            f'{self.namespace}generation:{prefix}*' for prefix in prefixes]
+
+    def _bump(self, generation_key):
+        # Generations only have to outlive the loads running when they are
+        # bumped, which take far less than an entry's time to live
+        with self.client.pipeline() as pipe:
+            pipe.incr(generation_key)
+            pipe.expire(generation_key, self.ttl)
+            pipe.execute()
+
+    def generation(self, key):
+        return self.client.mget(self._generation_keys(key))
+
+    def get(self, key):
+        value = self.client.get(self.namespace + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, generation=None):
+        if generation is None:
+            self.client.set(self.namespace + key, json.dumps(value), ex=self.ttl)
+            return
+        generation_keys = self._generation_keys(key)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(*generation_keys)
+                if pipe.mget(generation_keys) != generation:
+                    return
+                pipe.multi()
+                pipe.set(self.namespace + key, json.dumps(value), ex=self.ttl)
+                pipe.execute()
+            except self._watch_error:
+                # Deleted while setting
+                pass
+
+    def delete(self, key):
+        self._bump(self._generation_keys(key)[0])
+        self.client.delete(self.namespace + key)
+
+    def delete_prefix(self, prefix):
+        self._bump(f'{self.namespace}generation:{prefix}*')
+        keys = list(self.client.scan_iter(match=f'{self.namespace}{prefix}*'))
+        keys = [key for key in keys if not key.startswith(f'{self.namespace}generation:'.encode())]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.delete_prefix('')
+
+
+class EntityCache:
+    """
+    Read-through cache of serialized model rows keyed by model and id.
+
+    Each entry maps the canonical ``fields``/``expand`` options to the dict
+    to_dict() produced for them, so every variant of a row is dropped
+    together when the row changes. An entry with no variants records that
+    the row exists.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model, id):
+        return f'{model.__name__}:{id}'
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_dict(self, model, id, options, loader=None):
+        """
+        Get the serialized row, loading and caching it on a miss.
+
+        ``loader`` is the loader option profile (see models.loaders) the row
+        is loaded with for the options. Aborts with 404 if the row does not exist.
+        """
+        key = self.key(model, id)
+        variant = json.dumps(options, sort_keys=True)
+        # Read before the entry, so that a write invalidating the row while it
+        # is loaded keeps the stale dict out of the cache
+        generation = self.backend.generation(key)
+        entry = self.backend.get(key) or {}
+        if variant in entry:
+            self._count(True)
+            return entry[variant]
+
+        self._count(False)
+        data = _load_or_404(model, id, loader, options).to_dict(**options)
+        entry[variant] = data
+        self.backend.set(key, entry, generation)
+        return data
+
+    def exists_or_404(self, model, id):
+        """Abort with 404 unless the row exists, remembering rows that do."""
+        key = self.key(model, id)
+        generation = self.backend.generation(key)
+        if self.backend.get(key) is not None:
+            self._count(True)
+            return
+
+        self._count(False)
+        if db.session.query(model.id).filter(model.id == id).first() is None:
+            abort(404)
+        self.backend.set(key, {}, generation)
+
+    def invalidate(self, model, id=None):
+        """Drop one cached row, or every row of the model when id is None."""
+        with self._lock:
+            self.invalidations += 1
+        if id is None:
+            self.backend.delete_prefix(f'{model.__name__}:')
+        else:
+            self.backend.delete(self.key(model, id))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            'invalidations': self.invalidations,
+        }
+        if isinstance(self.backend, LRUCache):
+            stats['entries'] = len(self.backend)
+            stats['evictions'] = self.backend.evictions
+        return stats
+
+
+def init_entity_cache(app):
+    """
+    Create the entity cache for the app from its config.
+
+    ``ENTITY_CACHE_URL`` selects a shared Redis backend; otherwise an
+    in-process LRU cache holding ``ENTITY_CACHE_MAX_ENTRIES`` rows is used.
+    Entries expire after ``ENTITY_CACHE_TTL`` seconds either way, which
+    bounds staleness from writes made outside this API (e.g. the data
+    generators). Set ``ENTITY_CACHE_ENABLED`` to False to bypass it.
+    """
+    ttl = app.config.get('ENTITY_CACHE_TTL', DEFAULT_TTL)
+    if app.config.get('ENTITY_CACHE_URL'):
+        backend = RedisCache(app.config['ENTITY_CACHE_URL'], ttl=ttl)
+    else:
+        backend = LRUCache(app.config.get('ENTITY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES), ttl=ttl)
+    app.extensions['entity_cache'] = EntityCache(backend)
+
+
+def entity_cache():
+    """Get the current app's entity cache, or None if it is disabled."""
+    if not current_app.config.get('ENTITY_CACHE_ENABLED', True):
+        return None
+    return current_app.extensions.get('entity_cache')
+
+
+def _load_or_404(model, id, loader, options):
+    query = model.query
+    if loader is not None:
+        query = query.options(*loader(**options))
+    return query.get_or_404(id)
+
+
+def cached_dict(model, id, loader=None):
+    """
+    Serialize a row with the request's ``fields``/``expand`` options through
+    the entity cache, aborting with 404 if it does not exist. ``loader`` is
+    the loader option profile to load the row with, see models.loaders.
+    """
+    options = serializer_options(request.args)
+    cache = entity_cache()
+    if cache is None:
+        return _load_or_404(model, id, loader, options).to_dict(**options)
+    return cache.get_dict(model, id, options, loader)
+
+
+def exists_or_404(model, id):
+    """Abort with 404 unless the row exists, checking the entity cache first."""
+    cache = entity_cache()
+    if cache is None:
+        model.query.get_or_404(id)
+    else:
+        cache.exists_or_404(model, id)
+
+
+# Invalidation. Changes are collected per session as (model, id) pairs while
+# flushing, with id None for bulk statements that may touch any row, and only
+# applied once the transaction commits.
+
+def _pending(session):
+    return session.info.setdefault('entity_cache_pending', set())
+
+
+def _record(session, model, id):
+    pending = _pending(session)
+    pending.add((model, id))
+    for dependent, dependencies in CACHE_DEPENDENCIES.items():
+        if model in dependencies:
+            pending.add((dependent, None))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        _record(session, type(obj), getattr(obj, 'id', None))
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _collect_bulk(orm_execute_state):
+    state = orm_execute_state
+    if not (state.is_insert or state.is_update or state.is_delete) or state.bind_mapper is None:
+        return
+    _record(state.session, state.bind_mapper.class_, None)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_invalidations(session):
+    pending = session.info.pop('entity_cache_pending', None)
+    if not pending or not has_app_context():
+        return
+    cache = current_app.extensions.get('entity_cache')
+    if cache is None:
+        return
+    models = {model for model, id in pending if id is None}
+    for model, id in pending:
+        if id is None or model not in models:
+            cache.invalidate(model, id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('entity_cache_pending', None)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Flag route queries that scan whole tables on a SQLite database.
+
+Issues the read requests of the parity check (plus the stats endpoints)
+against an app on the given database, records every SQL statement they
+run, and replays each one with EXPLAIN QUERY PLAN. Scans of a table that
+do not use an index are reported with the routes that caused them.
+Statements without a WHERE clause read whole tables by design and are not
+flagged.
+
+Plans are made without the sqlite_stat1 statistics, as if every table were
+large, so a scan means no index fits the query rather than that the table
+is small enough for a scan to be cheaper. Pass --use-stats to keep them.
+
+Usage (from the tools directory):
+    python -m api.index_advisor --db health_protocol.db
+"""
+import argparse
+import re
+import sys
+from sqlalchemy import create_engine, event
+from .app import create_app
+from .models import db
+from .parity_check import PATHS, sample_ids
+
+ADVISOR_PATHS = PATHS + (
+    '/api/stats/activities?user_id={user}',
+    '/api/stats/playlists?user_id={user}',
+    '/api/stats/metrics?source=activity-history&field=reps&user_id={user}',
+)
+
+# "SCAN t" or "SCAN t AS alias" without "USING ... INDEX" (virtual tables
+# such as the FTS index print "VIRTUAL TABLE INDEX"); SQLite versions
+# before 3.36 print "SCAN TABLE t"
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)\b(?! .*(?:USING|VIRTUAL TABLE))')
+WHERE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+# Reflection queries on the schema tables, the one-row CONSTANT ROW scan
+# and the placeholder SQLAlchemy renders for an empty IN list
+IGNORED = re.compile(r'^(sqlite_\w+|CONSTANT)$')
+EMPTY_IN = '1!=1'
+
+
+def capture_statements(app, paths):
+    """
+    Run GET requests and record the statements they execute.
+
+    Returns:
+        dict: (statement, parameters) -> list of paths that ran it
+    """
+    statements = {}
+    current = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.setdefault((statement, tuple(parameters)), []).append(current['path'])
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        client = app.test_client()
+        for path in paths:
+            current['path'] = path
+            client.get(path)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+
+def full_scans(conn, statement, parameters):
+    """Get the tables a statement scans without an index, per EXPLAIN QUERY PLAN."""
+    if not WHERE.search(statement) or EMPTY_IN in statement:
+        return []
+    plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    tables = []
+    for row in plan:
+        match = FULL_SCAN.match(row[-1])
+        if match and not IGNORED.match(match.group(1)) and match.group(1) not in tables:
+            tables.append(match.group(1))
+    return tables
+
+
+def hide_statistics(conn):
+    """
+    Make the planner ignore sqlite_stat1 on this connection until the
+    transaction is rolled back. ANALYZE sqlite_master reloads the (now
+    empty) statistics without analyzing any table.
+    """
+    if conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").first():
+        conn.exec_driver_sql('DELETE FROM sqlite_stat1')
+        conn.exec_driver_sql('ANALYZE sqlite_master')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag route queries doing full table scans')
+    parser.add_argument('--db', default='health_protocol.db', help='SQLite database to analyze')
+    parser.add_argument('--verbose', action='store_true', help='Print the flagged statements')
+    parser.add_argument('--use-stats', action='store_true', help='Plan with the sqlite_stat1 statistics')
+    args = parser.parse_args()
+
+    uri = f'sqlite:///{args.db}'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'ENTITY_CACHE_ENABLED': False})
+    engine = create_engine(uri)
+    ids = sample_ids(engine)
+    paths = [path.format(**ids) for path in ADVISOR_PATHS]
+
+    statements = capture_statements(app, paths)
+    flagged = 0
+    with engine.connect() as conn:
+        if not args.use_stats:
+            hide_statistics(conn)
+        for (statement, parameters), statement_paths in statements.items():
+            tables = full_scans(conn, statement, parameters)
+            if not tables:
+                continue
+            flagged += 1
+            print(f"FULL SCAN  {', '.join(tables)}  <- {', '.join(sorted(set(statement_paths)))}")
+            if args.verbose:
+                print(f'    {" ".join(statement.split())}')
+        conn.rollback()
+    print(f'{flagged} of {len(statements)} statements scan a table without an index')
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == '__main__':
+    main()
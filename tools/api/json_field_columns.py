@@ -0,0 +1,28 @@
+"""
+JSON keys promoted to generated columns. Kept free of Flask and SQLAlchemy
+imports, since schema_utils creates the columns from it and the API reads
+them (see models/json_fields.py).
+"""
+
+# JSON keys promoted to typed, indexed generated columns named
+# <json column>_<key>, so analytics can filter and aggregate in SQL:
+# table -> (JSON column, [(key, type)]). Values of the wrong JSON type
+# (e.g. "weight": "light") read as NULL.
+JSON_FIELDS = {
+    "Useractivities": ("performance_data", [
+        ("reps", "INTEGER"), ("sets", "INTEGER"), ("weight", "REAL"),
+        ("heart_rate", "INTEGER"), ("duration_minutes", "REAL"), ("completed", "BOOLEAN"),
+    ]),
+    "PlaylistPerformance": ("performance_data", [
+        ("duration_minutes", "REAL"), ("energy_level", "INTEGER"), ("satisfaction", "INTEGER"),
+        ("heart_rate", "INTEGER"), ("completed", "BOOLEAN"),
+    ]),
+    "activity_protocols": ("parameters", [
+        ("reps", "INTEGER"), ("sets", "INTEGER"), ("weight", "REAL"),
+        ("rest", "INTEGER"), ("duration", "INTEGER"),
+    ]),
+    "activity_history": ("parameters", [
+        ("reps", "INTEGER"), ("sets", "INTEGER"), ("weight", "REAL"),
+        ("heart_rate", "INTEGER"), ("duration", "INTEGER"), ("completed", "BOOLEAN"),
+    ]),
+}
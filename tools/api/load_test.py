@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Mixed read/write load test comparing SQLite profiles.
+
+Each profile runs against its own copy of the database, with worker threads
+issuing requests through the Flask test client for a fixed duration. Reads
+fetch activities, user activity lists and activity stats; writes record one
+activity history entry each through the batch endpoint, as devices do.
+
+Usage (from the tools directory):
+    python -m api.load_test --db health_protocol.db --threads 8 --duration 10
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from .app import create_app
+
+READ_PATHS = (
+    '/api/activities/{activity_id}',
+    '/api/users/{user_id}/activities',
+    '/api/stats/activities?user_id={user_id}',
+)
+
+
+def _reset_journal(db_path):
+    """Put a database copy back in rollback journal mode, SQLite's default."""
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = DELETE')
+    conn.close()
+
+
+def _ids(db_path, table):
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute(f'SELECT id FROM {table}')]
+    conn.close()
+    return ids
+
+
+def _worker(app, ids, args, stop, thread_number, results):
+    client = app.test_client()
+    rng = random.Random(args.seed + thread_number)
+    # Writes use start times no existing record has, unique per thread
+    next_start_ms = (thread_number + 1) * 10 ** 12
+    latencies = {'read': [], 'write': []}
+    errors = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        if rng.random() < args.write_ratio:
+            kind = 'write'
+            next_start_ms += 1000
+            response = client.post('/api/protocols/activity-history/batch', json=[{
+                'user_id': rng.choice(ids['users']),
+                'activity_protocol_id': rng.choice(ids['activity_protocols']),
+                'start_time_ms': next_start_ms,
+                'end_time_ms': next_start_ms + 600000,
+                'status': 'completed',
+            }])
+        else:
+            kind = 'read'
+            response = client.get(rng.choice(READ_PATHS).format(
+                activity_id=rng.choice(ids['activities']), user_id=rng.choice(ids['users'])))
+        if response.status_code >= 400:
+            errors += 1
+        else:
+            latencies[kind].append(time.perf_counter() - started)
+    results.append((latencies, errors))
+
+
+def run_profile(profile, source_db, args):
+    """
+    Run the workload against a fresh copy of source_db with a SQLite profile.
+
+    Returns:
+        dict: throughput and latency figures
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'load_test.db')
+        shutil.copyfile(source_db, db_path)
+        _reset_journal(db_path)
+        ids = {table: _ids(db_path, table) for table in ('users', 'activities', 'activity_protocols')}
+
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+            'SQLITE_PROFILE': profile,
+            # Measure the database, not the in-process cache
+            'ENTITY_CACHE_ENABLED': False,
+        })
+
+        stop = threading.Event()
+        results = []
+        threads = [threading.Thread(target=_worker, args=(app, ids, args, stop, n, results))
+                   for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            from .models import db
+            db.engine.dispose()
+
+    summary = {'profile': profile, 'errors': sum(errors for _, errors in results)}
+    for kind in ('read', 'write'):
+        latencies = sorted(l for thread_latencies, _ in results for l in thread_latencies[kind])
+        summary[f'{kind}s_per_second'] = len(latencies) / args.duration
+        summary[f'{kind}_p50_ms'] = statistics.median(latencies) * 1000 if latencies else None
+        summary[f'{kind}_p95_ms'] = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None
+    return summary
+
+
+def _format(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SQLite profiles under a mixed read/write load')
+    parser.add_argument('--db', default='health_protocol.db', help='Database to copy for each run')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent worker threads')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run each profile')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of requests that write')
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'], help='SQLite profiles to compare')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix')
+    args = parser.parse_args()
+
+    columns = ('profile', 'reads_per_second', 'read_p50_ms', 'read_p95_ms',
+               'writes_per_second', 'write_p50_ms', 'write_p95_ms', 'errors')
+    print('  '.join(f'{column:>17}' for column in columns))
+    for profile in args.profiles:
+        summary = run_profile(profile, args.db, args)
+        print('  '.join(
+            f'{summary[column]:>17}' if column in ('profile', 'errors') else f'{_format(summary[column]):>17}'
+            for column in columns
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 from . import db
+from .serializer import Serializable
 import json
 from datetime import datetime
 
-class Activity(db.Model):
+# Values allowed by the CHECK constraints in schema.sql
+ACTIVITY_TYPES = ('breathwork', 'calisthenics', 'meditation', 'strength')
+MEDIA_TYPES = ('video', 'image', 'audio')
+
+class Activity(Serializable, db.Model):
     __tablename__ = 'activities'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -26,7 +31,9 @@ class Activity(db.Model):
     activity_protocols = db.relationship('ActivityProtocol', back_populates='activity')
     playlist_items = db.relationship('PlaylistItem', back_populates='activity')
     
-    def to_dict(self):
+    __expandable__ = ('media', 'body_areas', 'tags')
+    
+    def _base_dict(self):
         return {
             'id': self.id,
             'name': self.name,
@@ -34,14 +41,20 @@ class Activity(db.Model):
             'type': self.type,
             'difficulty_level': self.difficulty_level,
             'activity_type': self.activity_type,
-            'complexity_level': self.complexity_level,
-            'media': [m.to_dict() for m in self.media],
-            'body_areas': [ba.body_area.name for ba in self.body_areas],
-            'tags': [t.tag.name for t in self.tags]
+            'complexity_level': self.complexity_level
         }
+    
+    def _expand_media(self, fields, expand):
+        return [m.to_dict(fields, expand) for m in self.media]
+    
+    def _expand_body_areas(self, fields, expand):
+        return [ba.body_area.name for ba in self.body_areas]
+    
+    def _expand_tags(self, fields, expand):
+        return [t.tag.name for t in self.tags]
 
 
-class DifficultyLevel(db.Model):
+class DifficultyLevel(Serializable, db.Model):
     __tablename__ = 'DifficultyLevels'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -51,7 +64,7 @@ class DifficultyLevel(db.Model):
     # Relationships
     activities = db.relationship('Activity', back_populates='difficulty')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'name': self.name,
@@ -59,7 +72,7 @@ class DifficultyLevel(db.Model):
         }
 
 
-class ActivityRelationship(db.Model):
+class ActivityRelationship(Serializable, db.Model):
     __tablename__ = 'ActivityRelationships'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -71,7 +84,7 @@ class ActivityRelationship(db.Model):
     activity1 = db.relationship('Activity', foreign_keys=[activity1_id])
     activity2 = db.relationship('Activity', foreign_keys=[activity2_id])
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'activity1_id': self.activity1_id,
@@ -80,7 +93,7 @@ class ActivityRelationship(db.Model):
         }
 
 
-class ActivityMedia(db.Model):
+class ActivityMedia(Serializable, db.Model):
     __tablename__ = 'ActivityMedia'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -91,7 +104,7 @@ class ActivityMedia(db.Model):
     # Relationships
     activity = db.relationship('Activity', back_populates='media')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'activity_id': self.activity_id,
@@ -100,7 +113,7 @@ class ActivityMedia(db.Model):
         }
 
 
-class UserActivity(db.Model):
+class UserActivity(Serializable, db.Model):
     __tablename__ = 'Useractivities'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -122,7 +135,7 @@ class UserActivity(db.Model):
     def set_performance_data(self, data):
         self.performance_data = json.dumps(data)
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -1,20 +1,23 @@
 from . import db
+from .serializer import Serializable
 import json
 
-class ActivityProtocol(db.Model):
+class ActivityProtocol(Serializable, db.Model):
     __tablename__ = 'activity_protocols'
     
     id = db.Column(db.Integer, primary_key=True)
     activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
     protocol_id = db.Column(db.Integer, db.ForeignKey('protocols.id'), nullable=False)
     parameters = db.Column(db.Text)
-    created_at = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.BigInteger, nullable=False)
     
     # Relationships
     activity = db.relationship('Activity', back_populates='activity_protocols')
     protocol = db.relationship('Protocol', back_populates='activity_protocols')
     history = db.relationship('ActivityHistory', back_populates='activity_protocol')
     
+    __expandable__ = ('activity', 'protocol')
+    
     def get_parameters(self):
         if self.parameters:
             return json.loads(self.parameters)
@@ -23,20 +26,28 @@ class ActivityProtocol(db.Model):
     def set_parameters(self, data):
         self.parameters = json.dumps(data)
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'activity_id': self.activity_id,
             'protocol_id': self.protocol_id,
             'parameters': self.get_parameters(),
-            'created_at': self.created_at,
-            'activity': self.activity.to_dict() if self.activity else None,
-            'protocol': self.protocol.to_dict() if self.protocol else None
+            'created_at': self.created_at
         }
+    
+    def _expand_activity(self, fields, expand):
+        return self.activity.to_dict(fields, expand) if self.activity else None
+    
+    def _expand_protocol(self, fields, expand):
+        return self.protocol.to_dict(fields, expand) if self.protocol else None
 
 
-class ActivityHistory(db.Model):
+class ActivityHistory(Serializable, db.Model):
     __tablename__ = 'activity_history'
+    __table_args__ = (
+        # Same as schema_utils.ACTIVITY_HISTORY_KEY_INDEX, for databases created from the models
+        db.Index('idx_activity_history_key', 'user_id', 'activity_protocol_id', 'start_time_ms', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -44,8 +55,8 @@ class ActivityHistory(db.Model):
     parameters = db.Column(db.Text)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
-    start_time_ms = db.Column(db.Integer, nullable=False)
-    end_time_ms = db.Column(db.Integer, nullable=False)
+    start_time_ms = db.Column(db.BigInteger, nullable=False)
+    end_time_ms = db.Column(db.BigInteger, nullable=False)
     status = db.Column(db.String, nullable=False)
     notes = db.Column(db.Text)
     
@@ -61,7 +72,7 @@ class ActivityHistory(db.Model):
     def set_parameters(self, data):
         self.parameters = json.dumps(data)
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -1,6 +1,7 @@
 from . import db
+from .serializer import Serializable
 
-class BodyArea(db.Model):
+class BodyArea(Serializable, db.Model):
     __tablename__ = 'BodyAreas'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -9,14 +10,14 @@ class BodyArea(db.Model):
     # Relationships
     activity_areas = db.relationship('ActivityBodyArea', back_populates='body_area')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'name': self.name
         }
 
 
-class ActivityBodyArea(db.Model):
+class ActivityBodyArea(Serializable, db.Model):
     __tablename__ = 'ActivityBodyAreas'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -27,7 +28,7 @@ class ActivityBodyArea(db.Model):
     activity = db.relationship('Activity', back_populates='body_areas')
     body_area = db.relationship('BodyArea', back_populates='activity_areas')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'activity_id': self.activity_id,
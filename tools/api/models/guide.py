@@ -1,7 +1,8 @@
 from . import db
+from .serializer import Serializable
 from datetime import datetime
 
-class Guide(db.Model):
+class Guide(Serializable, db.Model):
     __tablename__ = 'Guides'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -12,17 +13,23 @@ class Guide(db.Model):
     parts = db.relationship('GuidePart', back_populates='guide')
     versions = db.relationship('GuideVersion', back_populates='guide')
     
-    def to_dict(self):
+    __expandable__ = ('parts', 'versions')
+    
+    def _base_dict(self):
         return {
             'id': self.id,
             'name': self.name,
-            'description': self.description,
-            'parts': [part.to_dict() for part in self.parts],
-            'versions': [version.to_dict() for version in self.versions]
+            'description': self.description
         }
+    
+    def _expand_parts(self, fields, expand):
+        return [part.to_dict(fields, expand) for part in self.parts]
+    
+    def _expand_versions(self, fields, expand):
+        return [version.to_dict(fields, expand) for version in self.versions]
 
 
-class GuidePart(db.Model):
+class GuidePart(Serializable, db.Model):
     __tablename__ = 'GuideParts'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -35,7 +42,7 @@ class GuidePart(db.Model):
     guide = db.relationship('Guide', back_populates='parts')
     versions = db.relationship('GuidePartVersion', back_populates='guide_part')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'guide_id': self.guide_id,
@@ -45,7 +52,7 @@ class GuidePart(db.Model):
         }
 
 
-class GuideVersion(db.Model):
+class GuideVersion(Serializable, db.Model):
     __tablename__ = 'GuideVersions'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -58,18 +65,22 @@ class GuideVersion(db.Model):
     guide = db.relationship('Guide', back_populates='versions')
     part_versions = db.relationship('GuidePartVersion', back_populates='guide_version')
     
-    def to_dict(self):
+    __expandable__ = ('part_versions',)
+    
+    def _base_dict(self):
         return {
             'id': self.id,
             'guide_id': self.guide_id,
             'version_number': self.version_number,
             'release_notes': self.release_notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'part_versions': [pv.to_dict() for pv in self.part_versions]
+            'created_at': self.created_at.isoformat() if self.created_at else None
         }
+    
+    def _expand_part_versions(self, fields, expand):
+        return [pv.to_dict(fields, expand) for pv in self.part_versions]
 
 
-class GuidePartVersion(db.Model):
+class GuidePartVersion(Serializable, db.Model):
     __tablename__ = 'GuidePartVersions'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -81,7 +92,7 @@ class GuidePartVersion(db.Model):
     guide_version = db.relationship('GuideVersion', back_populates='part_versions')
     guide_part = db.relationship('GuidePart', back_populates='versions')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'guide_version_id': self.guide_version_id,
@@ -0,0 +1,39 @@
+from sqlalchemy import Boolean, Float, Integer, literal_column
+from ..json_field_columns import JSON_FIELDS as JSON_FIELD_COLUMNS
+from .activity import UserActivity
+from .activity_protocol import ActivityProtocol, ActivityHistory
+from .playlist import PlaylistPerformance
+
+SQL_TYPES = {'INTEGER': Integer, 'REAL': Float, 'BOOLEAN': Boolean}
+
+
+def _typed_fields(model):
+    column, fields = JSON_FIELD_COLUMNS[model.__tablename__]
+    return column, {key: SQL_TYPES[sql_type] for key, sql_type in fields}
+
+
+# Typed JSON keys that schema_utils.create_json_field_columns adds as
+# generated columns named <json column>_<key>, read from
+# json_field_columns.JSON_FIELDS: model -> (JSON column, {key: type}).
+# They are not mapped on the models, so loading and inserting rows keeps
+# working on databases created without them.
+JSON_FIELDS = {
+    model: _typed_fields(model)
+    for model in (UserActivity, PlaylistPerformance, ActivityProtocol, ActivityHistory)
+}
+
+
+def json_field_name(model, key):
+    """Get the generated column name of a promoted JSON key."""
+    return f'{JSON_FIELDS[model][0]}_{key}'
+
+
+def json_field(model, key):
+    """
+    Get a SQL expression for a promoted JSON key, for use in queries that
+    already select from the model's table. Booleans read back as 0/1 so
+    they can be summed and averaged.
+    """
+    _, fields = JSON_FIELDS[model]
+    type_ = Integer if fields[key] is Boolean else fields[key]
+    return literal_column(f'"{model.__tablename__}".{json_field_name(model, key)}', type_)
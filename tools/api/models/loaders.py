@@ -0,0 +1,135 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from .activity import Activity
+from .body_area import ActivityBodyArea
+from .tag import ActivityTag
+from .playlist import Playlist, PlaylistItem
+from .activity_protocol import ActivityProtocol
+from .skill import ActivitySkill, SkillPrerequisite, UserSkillProgress
+from .guide import Guide, GuideVersion
+
+
+# Loader option profiles, one per serializer. Each profile eagerly loads
+# what the matching to_dict() touches for the given ``fields``/``expand``
+# (as returned by serializer_options), so that serializing a list of N rows
+# costs a fixed number of queries instead of 1 + N * relationships, and
+# expandable relationships left out of the output are not loaded at all.
+# Relationships read by _base_dict() are always loaded, since the base dict
+# is built in full before ``fields`` filters it.
+
+
+def _wanted(key, fields, expand):
+    """Whether Serializable.to_dict() embeds ``key``, and its nested fields/expand."""
+    if fields is not None and key not in fields:
+        return False, None, None
+    if expand is not None and key not in expand:
+        return False, None, None
+    nested_fields = fields.get(key) or None if fields is not None else None
+    nested_expand = expand[key] if expand is not None else None
+    return True, nested_fields, nested_expand
+
+
+def activity_body_area_options(fields=None, expand=None):
+    """Loader options for ActivityBodyArea.to_dict."""
+    return (
+        joinedload(ActivityBodyArea.body_area),
+    )
+
+
+def activity_tag_options(fields=None, expand=None):
+    """Loader options for ActivityTag.to_dict."""
+    return (
+        joinedload(ActivityTag.tag),
+    )
+
+
+def activity_options(fields=None, expand=None):
+    """Loader options for Activity.to_dict."""
+    options = []
+    if _wanted('media', fields, expand)[0]:
+        options.append(selectinload(Activity.media))
+    if _wanted('body_areas', fields, expand)[0]:
+        options.append(selectinload(Activity.body_areas).options(*activity_body_area_options()))
+    if _wanted('tags', fields, expand)[0]:
+        options.append(selectinload(Activity.tags).options(*activity_tag_options()))
+    return tuple(options)
+
+
+def activity_protocol_options(fields=None, expand=None):
+    """Loader options for ActivityProtocol.to_dict."""
+    options = []
+    wanted, nested_fields, nested_expand = _wanted('activity', fields, expand)
+    if wanted:
+        options.append(joinedload(ActivityProtocol.activity).options(
+            *activity_options(nested_fields, nested_expand)))
+    if _wanted('protocol', fields, expand)[0]:
+        options.append(joinedload(ActivityProtocol.protocol))
+    return tuple(options)
+
+
+def playlist_item_options(fields=None, expand=None):
+    """Loader options for PlaylistItem.to_dict."""
+    wanted, nested_fields, nested_expand = _wanted('activity', fields, expand)
+    if not wanted:
+        return ()
+    return (
+        joinedload(PlaylistItem.activity).options(*activity_options(nested_fields, nested_expand)),
+    )
+
+
+def playlist_options(fields=None, expand=None):
+    """Loader options for Playlist.to_dict."""
+    wanted, nested_fields, nested_expand = _wanted('items', fields, expand)
+    if not wanted:
+        return ()
+    return (
+        selectinload(Playlist.items).options(*playlist_item_options(nested_fields, nested_expand)),
+    )
+
+
+def skill_prerequisite_options(fields=None, expand=None):
+    """Loader options for SkillPrerequisite.to_dict."""
+    return (
+        joinedload(SkillPrerequisite.prerequisite_skill),
+    )
+
+
+def skill_options(fields=None, expand=None):
+    """Loader options for ActivitySkill.to_dict."""
+    options = [joinedload(ActivitySkill.category)]
+    wanted, nested_fields, nested_expand = _wanted('prerequisites', fields, expand)
+    if wanted:
+        options.append(selectinload(ActivitySkill.prerequisites).options(
+            *skill_prerequisite_options(nested_fields, nested_expand)))
+    return tuple(options)
+
+
+def skill_progress_options(fields=None, expand=None):
+    """Loader options for UserSkillProgress.to_dict."""
+    return (
+        joinedload(UserSkillProgress.skill),
+    )
+
+
+def guide_version_options(fields=None, expand=None):
+    """Loader options for GuideVersion.to_dict."""
+    if not _wanted('part_versions', fields, expand)[0]:
+        return ()
+    return (
+        joinedload(GuideVersion.part_versions),
+    )
+
+
+def guide_options(fields=None, expand=None):
+    """Loader options for Guide.to_dict."""
+    options = []
+    if _wanted('parts', fields, expand)[0]:
+        options.append(selectinload(Guide.parts))
+    wanted, nested_fields, nested_expand = _wanted('versions', fields, expand)
+    if wanted:
+        # Joined rather than selectin: one query fewer for the usual single
+        # guide, and versions and their part versions do not multiply rows
+        # with the parts the way two joined collections would
+        options.append(joinedload(Guide.versions).options(
+            *guide_version_options(nested_fields, nested_expand)))
+    return tuple(options)
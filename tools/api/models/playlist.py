@@ -1,8 +1,9 @@
 from . import db
+from .serializer import Serializable
 import json
 from datetime import datetime
 
-class Playlist(db.Model):
+class Playlist(Serializable, db.Model):
     __tablename__ = 'Playlists'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -16,17 +17,21 @@ class Playlist(db.Model):
     performances = db.relationship('PlaylistPerformance', back_populates='playlist')
     sharings = db.relationship('PlaylistSharing', back_populates='playlist')
     
-    def to_dict(self):
+    __expandable__ = ('items',)
+    
+    def _base_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'name': self.name,
-            'description': self.description,
-            'items': [item.to_dict() for item in self.items]
+            'description': self.description
         }
+    
+    def _expand_items(self, fields, expand):
+        return [item.to_dict(fields, expand) for item in self.items]
 
 
-class PlaylistItem(db.Model):
+class PlaylistItem(Serializable, db.Model):
     __tablename__ = 'PlaylistItems'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -38,17 +43,21 @@ class PlaylistItem(db.Model):
     playlist = db.relationship('Playlist', back_populates='items')
     activity = db.relationship('Activity', back_populates='playlist_items')
     
-    def to_dict(self):
+    __expandable__ = ('activity',)
+    
+    def _base_dict(self):
         return {
             'id': self.id,
             'playlist_id': self.playlist_id,
             'activity_id': self.activity_id,
-            'order': self.order,
-            'activity': self.activity.to_dict() if self.activity else None
+            'order': self.order
         }
+    
+    def _expand_activity(self, fields, expand):
+        return self.activity.to_dict(fields, expand) if self.activity else None
 
 
-class PlaylistPerformance(db.Model):
+class PlaylistPerformance(Serializable, db.Model):
     __tablename__ = 'PlaylistPerformance'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -69,7 +78,7 @@ class PlaylistPerformance(db.Model):
     def set_performance_data(self, data):
         self.performance_data = json.dumps(data)
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -1,6 +1,7 @@
 from . import db
+from .serializer import Serializable
 
-class Protocol(db.Model):
+class Protocol(Serializable, db.Model):
     __tablename__ = 'protocols'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -11,7 +12,7 @@ class Protocol(db.Model):
     # Relationships
     activity_protocols = db.relationship('ActivityProtocol', back_populates='protocol')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'name': self.name,
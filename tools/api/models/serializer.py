@@ -0,0 +1,62 @@
+def parse_paths(value):
+    """
+    Parse a comma separated list of dotted paths into a nested dict.
+
+    'id,items.activity.name,items.order' becomes
+    {'id': {}, 'items': {'activity': {'name': {}}, 'order': {}}}
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def serializer_options(args):
+    """
+    Read the ``fields`` and ``expand`` query arguments into to_dict() keyword
+    arguments. Missing arguments keep the full, fully expanded output.
+    """
+    options = {}
+    if args.get('fields'):
+        options['fields'] = parse_paths(args['fields'])
+    if 'expand' in args:
+        options['expand'] = parse_paths(args['expand'])
+    return options
+
+
+class Serializable:
+    """
+    Mixin giving models a to_dict() with sparse fieldsets and expansion.
+
+    Models implement _base_dict() for their own columns and list in
+    __expandable__ the keys that embed related objects, each backed by an
+    _expand_<key>(fields, expand) method. Nested objects that are not
+    requested are never loaded or serialized.
+
+    ``fields`` selects keys (None for all), ``expand`` selects which
+    expandable keys to embed (None for all, recursively). Both are nested
+    dicts as returned by parse_paths, so 'items.activity' reaches down.
+    """
+    __expandable__ = ()
+
+    def _base_dict(self):
+        raise NotImplementedError
+
+    def to_dict(self, fields=None, expand=None):
+        data = self._base_dict()
+        if fields is not None:
+            data = {key: value for key, value in data.items() if key in fields}
+
+        for key in self.__expandable__:
+            if fields is not None and key not in fields:
+                continue
+            if expand is not None and key not in expand:
+                continue
+            nested_fields = fields.get(key) or None if fields is not None else None
+            nested_expand = expand[key] if expand is not None else None
+            data[key] = getattr(self, f'_expand_{key}')(nested_fields, nested_expand)
+
+        return data
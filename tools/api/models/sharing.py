@@ -1,6 +1,7 @@
 from . import db
+from .serializer import Serializable
 
-class ActivitySharing(db.Model):
+class ActivitySharing(Serializable, db.Model):
     __tablename__ = 'ActivitySharing'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -12,7 +13,7 @@ class ActivitySharing(db.Model):
     user_activity = db.relationship('UserActivity', back_populates='sharings')
     shared_with = db.relationship('User', foreign_keys=[shared_with_id])
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'user_activity_id': self.user_activity_id,
@@ -21,7 +22,7 @@ class ActivitySharing(db.Model):
         }
 
 
-class PlaylistSharing(db.Model):
+class PlaylistSharing(Serializable, db.Model):
     __tablename__ = 'PlaylistSharing'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -35,7 +36,7 @@ class PlaylistSharing(db.Model):
     shared_by = db.relationship('User', foreign_keys=[shared_by_id])
     shared_with = db.relationship('User', foreign_keys=[shared_with_id])
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'playlist_id': self.playlist_id,
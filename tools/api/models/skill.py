@@ -1,6 +1,7 @@
 from . import db
+from .serializer import Serializable
 
-class SkillCategory(db.Model):
+class SkillCategory(Serializable, db.Model):
     __tablename__ = 'skill_categories'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -11,7 +12,7 @@ class SkillCategory(db.Model):
     # Relationships
     skills = db.relationship('ActivitySkill', back_populates='category')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'name': self.name,
@@ -20,7 +21,7 @@ class SkillCategory(db.Model):
         }
 
 
-class ActivitySkill(db.Model):
+class ActivitySkill(Serializable, db.Model):
     __tablename__ = 'activity_skills'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -41,7 +42,9 @@ class ActivitySkill(db.Model):
                                      back_populates='prerequisite_skill')
     user_progress = db.relationship('UserSkillProgress', back_populates='skill')
     
-    def to_dict(self):
+    __expandable__ = ('prerequisites',)
+    
+    def _base_dict(self):
         return {
             'id': self.id,
             'activity_id': self.activity_id,
@@ -49,12 +52,14 @@ class ActivitySkill(db.Model):
             'description': self.description,
             'difficulty': self.difficulty,
             'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
-            'prerequisites': [p.to_dict() for p in self.prerequisites]
+            'category_name': self.category.name if self.category else None
         }
+    
+    def _expand_prerequisites(self, fields, expand):
+        return [p.to_dict(fields, expand) for p in self.prerequisites]
 
 
-class SkillPrerequisite(db.Model):
+class SkillPrerequisite(Serializable, db.Model):
     __tablename__ = 'skill_prerequisites'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -66,7 +71,7 @@ class SkillPrerequisite(db.Model):
     skill = db.relationship('ActivitySkill', foreign_keys=[skill_id], back_populates='prerequisites')
     prerequisite_skill = db.relationship('ActivitySkill', foreign_keys=[prerequisite_skill_id], back_populates='prerequisite_of')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'skill_id': self.skill_id,
@@ -76,22 +81,22 @@ class SkillPrerequisite(db.Model):
         }
 
 
-class UserSkillProgress(db.Model):
+class UserSkillProgress(Serializable, db.Model):
     __tablename__ = 'user_skill_progress'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     skill_id = db.Column(db.Integer, db.ForeignKey('activity_skills.id'), nullable=False)
     mastery_level = db.Column(db.Float, default=0)
-    last_practiced_at = db.Column(db.Integer)
-    total_practice_time_ms = db.Column(db.Integer, default=0)
+    last_practiced_at = db.Column(db.BigInteger)
+    total_practice_time_ms = db.Column(db.BigInteger, default=0)
     practice_count = db.Column(db.Integer, default=0)
     
     # Relationships
     user = db.relationship('User', back_populates='skill_progress')
     skill = db.relationship('ActivitySkill', back_populates='user_progress')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
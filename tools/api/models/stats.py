@@ -0,0 +1,56 @@
+from . import db
+from .serializer import Serializable
+
+
+def completion_rate(completed_count, session_count):
+    return completed_count / session_count if session_count else None
+
+
+class ActivityHistoryRollup(Serializable, db.Model):
+    """Daily/weekly activity history aggregates, maintained by triggers (see schema_utils.ROLLUPS)."""
+    __tablename__ = 'activity_history_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    period = db.Column(db.String, primary_key=True)
+    period_start = db.Column(db.String, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), primary_key=True)
+    session_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def _base_dict(self):
+        return {
+            'user_id': self.user_id,
+            'period': self.period,
+            'period_start': self.period_start,
+            'activity_id': self.activity_id,
+            'session_count': self.session_count,
+            'completed_count': self.completed_count,
+            'completion_rate': completion_rate(self.completed_count, self.session_count),
+            'total_duration_ms': self.total_duration_ms
+        }
+
+
+class PlaylistPerformanceRollup(Serializable, db.Model):
+    """Daily/weekly playlist performance aggregates, maintained by triggers (see schema_utils.ROLLUPS)."""
+    __tablename__ = 'playlist_performance_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    period = db.Column(db.String, primary_key=True)
+    period_start = db.Column(db.String, primary_key=True)
+    playlist_id = db.Column(db.Integer, db.ForeignKey('Playlists.id'), primary_key=True)
+    session_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def _base_dict(self):
+        return {
+            'user_id': self.user_id,
+            'period': self.period,
+            'period_start': self.period_start,
+            'playlist_id': self.playlist_id,
+            'session_count': self.session_count,
+            'completed_count': self.completed_count,
+            'completion_rate': completion_rate(self.completed_count, self.session_count),
+            'total_duration_ms': self.total_duration_ms
+        }
@@ -1,6 +1,7 @@
 from . import db
+from .serializer import Serializable
 
-class Tag(db.Model):
+class Tag(Serializable, db.Model):
     __tablename__ = 'Tags'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -11,7 +12,7 @@ class Tag(db.Model):
     # Relationships
     activity_tags = db.relationship('ActivityTag', back_populates='tag')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'name': self.name,
@@ -20,7 +21,7 @@ class Tag(db.Model):
         }
 
 
-class ActivityTag(db.Model):
+class ActivityTag(Serializable, db.Model):
     __tablename__ = 'ActivityTags'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -31,7 +32,7 @@ class ActivityTag(db.Model):
     activity = db.relationship('Activity', back_populates='tags')
     tag = db.relationship('Tag', back_populates='activity_tags')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'activity_id': self.activity_id,
@@ -1,6 +1,7 @@
 from . import db
+from .serializer import Serializable
 
-class User(db.Model):
+class User(Serializable, db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -15,7 +16,7 @@ class User(db.Model):
     playlists = db.relationship('Playlist', back_populates='user')
     activity_history = db.relationship('ActivityHistory', back_populates='user')
     
-    def to_dict(self):
+    def _base_dict(self):
         return {
             'id': self.id,
             'first_name': self.first_name,
@@ -0,0 +1,149 @@
+from flask import Response, current_app, jsonify, request, stream_with_context, url_for
+from .models.serializer import serializer_options
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+class PaginationError(ValueError):
+    """Raised when the pagination query parameters are invalid."""
+
+
+def _int_arg(name, minimum):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise PaginationError(f'{name} must be an integer')
+    if value < minimum:
+        raise PaginationError(f'{name} must be at least {minimum}')
+    return value
+
+
+def wants_ndjson():
+    """Check whether the client asked for an NDJSON stream."""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def _page_args(ranked):
+    """Read ``after`` and ``limit`` (capped at MAX_PAGE_SIZE) from the request."""
+    limit = _int_arg('limit', 1)
+    after = _int_arg('after', 0)
+    if ranked and after is not None:
+        raise PaginationError('after is not supported for ranked results')
+    if limit is not None:
+        limit = min(limit, MAX_PAGE_SIZE)
+    return after, limit
+
+
+def _keyset_page(query, model, after, limit):
+    query = query.order_by(model.id)
+    if after is not None:
+        query = query.filter(model.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def keyset(query, model, ranked=False):
+    """
+    Apply keyset pagination on ``model.id`` from the request arguments.
+
+    ``after`` is the id of the last row the client has seen and ``limit``
+    caps the page size (at most MAX_PAGE_SIZE). Ranked queries keep their
+    own ordering, so they only accept ``limit``.
+
+    Returns:
+        tuple: (query, limit) where limit is None when not paginating
+    """
+    after, limit = _page_args(ranked)
+    return _keyset_page(query, model, after, limit), limit
+
+
+def _next_page_headers(next_cursor, limit):
+    args = request.args.to_dict()
+    args.update(after=next_cursor, limit=limit)
+    next_url = url_for(request.endpoint, **(request.view_args or {}), **args)
+    return {
+        'X-Next-Cursor': str(next_cursor),
+        'Link': f'<{next_url}>; rel="next"',
+    }
+
+
+def _stream_ndjson(query, model, serialize, ranked):
+    """
+    Stream the rows STREAM_BATCH_SIZE at a time, each batch a keyset page
+    (an offset page for ranked queries) loaded with the query's eager
+    loading options, so memory use does not grow with the collection.
+    """
+    after, limit = _page_args(ranked)
+    dumps = current_app.json.dumps
+    session = query.session
+
+    def generate():
+        cursor, offset, remaining = after, 0, limit
+        while remaining is None or remaining > 0:
+            size = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+            if ranked:
+                rows = query.order_by(model.id).slice(offset, offset + size).all()
+            else:
+                rows = _keyset_page(query, model, cursor, size).all()
+            for obj in rows:
+                yield dumps(serialize(obj)) + '\n'
+            if len(rows) < size:
+                break
+            cursor, offset = rows[-1].id, offset + size
+            if remaining is not None:
+                remaining -= size
+            # Let the batch be garbage collected
+            session.expunge_all()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def collection_response(query, model, serialize=None, ranked=False, loader=None):
+    """
+    Build the response for a collection endpoint.
+
+    Without pagination arguments the whole collection is returned as a JSON
+    array, as before. With ``limit``/``after`` one keyset page is returned and
+    the cursor for the next page is sent in the ``X-Next-Cursor`` and ``Link``
+    headers. With ``format=ndjson`` (or ``Accept: application/x-ndjson``) the
+    rows are streamed one JSON object per line, loaded in batches.
+
+    Args:
+        query: Filtered query for the collection
+        model: Model class whose ``id`` column is used as the cursor
+        serialize: Callable turning a row into a dict, defaults to to_dict()
+            with the request's ``fields``/``expand`` options
+        ranked: Whether the query is ordered by relevance rather than id
+        loader: Loader option profile from models.loaders, called with the
+            request's ``fields``/``expand`` so only the relationships in the
+            output are eager loaded
+
+    Returns:
+        Flask response, or an (error response, status) tuple
+    """
+    options = serializer_options(request.args)
+    if loader is not None:
+        query = query.options(*loader(**options))
+    if serialize is None:
+        serialize = lambda obj: obj.to_dict(**options)
+
+    try:
+        if wants_ndjson():
+            return _stream_ndjson(query, model, serialize, ranked)
+        query, limit = keyset(query, model, ranked)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = query.all()
+    response = jsonify([serialize(obj) for obj in rows])
+    if limit is not None and len(rows) == limit and not ranked:
+        response.headers.extend(_next_page_headers(rows[-1].id, limit))
+    return response
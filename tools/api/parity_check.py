@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Check that the API answers the same on SQLite and other databases.
+
+Copies the model tables of a SQLite database into each target database
+(e.g. a local PostgreSQL), then issues the same read requests against an
+app on each and reports every response that differs. Features built on
+SQLite-only derived tables (stats rollups, full-text search ranking) are
+left out, since other databases do not have them.
+
+A scratch SQLite database holding only the model tables is always checked
+too. It runs the same fallbacks as other databases (search by LIKE,
+skill availability computed on the fly), so the check is meaningful
+without a database server. Without --source, the small benchmark
+database is seeded and used (see benchmark.py).
+
+Usage (from the tools directory), e.g. in CI with a PostgreSQL service:
+    python -m api.parity_check --target postgresql://localhost/health_protocol_parity --reset
+
+Exits with status 1 if any response differs or a target cannot be checked.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from .app import create_app
+from .database import DERIVED_TABLES, create_tables
+from .models import db
+
+COPY_BATCH_SIZE = 1000
+SOURCE_SIZE = 'small'
+
+# Requests compared between the two apps, filled in with ids from the source
+PATHS = (
+    '/api/users/',
+    '/api/users/{user}',
+    '/api/users/{user}/activities',
+    '/api/users/{user}/playlists',
+    '/api/users/{user}/skills',
+    '/api/activities/?limit=50',
+    '/api/activities/?q={activity_word}',
+    '/api/activities/{activity}',
+    '/api/activities/{activity}/media',
+    '/api/activities/{activity}/tags',
+    '/api/activities/{activity}/body-areas',
+    '/api/activities/{activity}/skills',
+    '/api/activities/difficulty-levels',
+    '/api/body-areas/',
+    '/api/body-areas/{body_area}',
+    '/api/body-areas/{body_area}/activities',
+    '/api/tags/',
+    '/api/tags/{tag}',
+    '/api/tags/{tag}/activities',
+    '/api/protocols/',
+    '/api/protocols/{protocol}',
+    '/api/protocols/{protocol}/activities',
+    '/api/protocols/activity-protocols/{activity_protocol}/history',
+    '/api/guides/',
+    '/api/guides/{guide}',
+    '/api/guides/{guide}/versions',
+    '/api/playlists/',
+    '/api/playlists/{playlist}',
+    '/api/playlists/{playlist}/items',
+    '/api/playlists/{playlist}/performances',
+    '/api/skills/',
+    '/api/skills/categories',
+    '/api/skills/categories/{skill_category}',
+    '/api/skills/{skill}',
+    '/api/skills/{skill}/prerequisites',
+    '/api/skills/{skill}/ancestors',
+    '/api/skills/user/{user}/progress',
+    '/api/skills/user/{user}/available',
+    '/api/skills/user/{user}/unlock-path/{skill}',
+)
+
+SAMPLE_TABLES = {
+    'user': 'users',
+    'activity': 'activities',
+    'body_area': 'BodyAreas',
+    'tag': 'Tags',
+    'protocol': 'protocols',
+    'activity_protocol': 'activity_protocols',
+    'guide': 'Guides',
+    'playlist': 'Playlists',
+    'skill': 'activity_skills',
+    'skill_category': 'skill_categories',
+}
+
+
+def _datetime(value):
+    """Convert the datetime representations found in SQLite data to a datetime."""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    return datetime.fromisoformat(value)
+
+
+def copy_tables(source_engine, reset=False):
+    """
+    Copy the model tables from the source engine into the current app's
+    database, recreating them first when reset is set.
+
+    Returns:
+        dict: table name -> number of rows copied
+    """
+    tables = [table for table in db.metadata.sorted_tables if table.name not in DERIVED_TABLES]
+    if reset:
+        db.metadata.drop_all(db.engine, tables=tables)
+    create_tables()
+
+    source_tables = set(inspect(source_engine).get_table_names())
+    copied = {}
+    with source_engine.connect() as source, db.engine.begin() as target:
+        for table in tables:
+            if table.name not in source_tables:
+                continue
+            datetime_columns = [c.name for c in table.columns if isinstance(c.type, DateTime)]
+            columns = ', '.join(f'"{c.name}"' for c in table.columns)
+            # Read raw values, since SQLite holds datetimes in several formats
+            result = source.execute(text(f'SELECT {columns} FROM "{table.name}"')).mappings()
+            copied[table.name] = 0
+            while True:
+                rows = [dict(row) for row in result.fetchmany(COPY_BATCH_SIZE)]
+                if not rows:
+                    break
+                for row in rows:
+                    for column in datetime_columns:
+                        row[column] = _datetime(row[column])
+                target.execute(table.insert(), rows)
+                copied[table.name] += len(rows)
+
+            # Move PostgreSQL sequences past the copied ids
+            if db.engine.dialect.name == 'postgresql' and 'id' in table.columns and copied[table.name]:
+                target.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+                    f"(SELECT max(id) FROM \"{table.name}\"))"
+                ))
+    return copied
+
+
+def sample_ids(source_engine):
+    """Pick an existing id per SAMPLE_TABLES entry, and a word to search for, to fill in PATHS."""
+    ids = {}
+    with source_engine.connect() as source:
+        for name, table in SAMPLE_TABLES.items():
+            ids[name] = source.execute(text(f'SELECT min(id) FROM "{table}"')).scalar()
+        name = source.execute(text('SELECT name FROM activities ORDER BY id LIMIT 1')).scalar() or ''
+    ids['activity_word'] = name.split()[0] if name.split() else name
+    return ids
+
+
+def normalize(value):
+    """
+    Make a response body comparable across databases: collections the API
+    does not order are compared as multisets, and floats are rounded.
+    """
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return sorted((normalize(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    if isinstance(value, float):
+        return round(value, 9)
+    return value
+
+
+def compare(source_client, target_client, paths):
+    """
+    Issue each request against both apps.
+
+    Returns:
+        list: (path, source status, target status) for every differing response
+    """
+    differences = []
+    for path in paths:
+        source_response = source_client.get(path)
+        target_response = target_client.get(path)
+        same = (source_response.status_code == target_response.status_code and
+                normalize(source_response.get_json(silent=True)) == normalize(target_response.get_json(silent=True)))
+        if not same:
+            differences.append((path, source_response.status_code, target_response.status_code))
+    return differences
+
+
+def check_target(source_client, source_engine, uri, paths, copy=True, reset=False):
+    """
+    Copy the source data into a target database and compare the responses
+    of an app on it with the source app's.
+
+    Returns:
+        list: (path, source status, target status) for every differing response
+    """
+    target_app = create_app({'ENTITY_CACHE_ENABLED': False, 'SQLALCHEMY_DATABASE_URI': uri})
+    target_app.logger.disabled = True
+    try:
+        if copy:
+            with target_app.app_context():
+                for table, count in copy_tables(source_engine, reset=reset).items():
+                    print(f'copied {count:>8} rows  {table}')
+        return compare(source_client, target_app.test_client(), paths)
+    finally:
+        with target_app.app_context():
+            db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare API responses on SQLite and other databases')
+    parser.add_argument('--source', help='SQLite database holding the data '
+                                         f'(default: the {SOURCE_SIZE} benchmark database, seeded if needed)')
+    parser.add_argument('--data-dir', help='Directory keeping the seeded source database between runs '
+                                           '(default: a temporary directory)')
+    parser.add_argument('--target', action='append', default=[],
+                        help='Database URI to compare against, e.g. postgresql://localhost/health_protocol; '
+                             'may be repeated. A scratch SQLite database is always compared too')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate the model tables in the targets first')
+    parser.add_argument('--no-copy', action='store_true', help='Compare against the data already in the targets')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        if args.source:
+            source_path = args.source
+        else:
+            from .benchmark import seed_database
+            source_path = seed_database(SOURCE_SIZE, args.data_dir or temporary_directory)
+        source_uri = f'sqlite:///{source_path}'
+        source_app = create_app({'ENTITY_CACHE_ENABLED': False, 'SQLALCHEMY_DATABASE_URI': source_uri})
+        source_app.logger.disabled = True
+        source_engine = create_engine(source_uri)
+
+        ids = sample_ids(source_engine)
+        paths = [path.format(**ids) for path in PATHS]
+        scratch_uri = f'sqlite:///{os.path.join(temporary_directory, "parity_target.db")}'
+        targets = [(scratch_uri, True)] + [(uri, not args.no_copy) for uri in args.target]
+
+        failed = False
+        for uri, copy in targets:
+            name = make_url(uri).render_as_string(hide_password=True)
+            print(f'target {name}')
+            try:
+                differences = check_target(source_app.test_client(), source_engine, uri, paths,
+                                           copy=copy, reset=args.reset)
+            except (SQLAlchemyError, ImportError) as e:
+                print(f'FAILED   cannot check {name}: {e}')
+                failed = True
+                continue
+            for path, source_status, target_status in differences:
+                print(f'DIFFERS  {path}  (source {source_status}, target {target_status})')
+            print(f'{len(paths) - len(differences)}/{len(paths)} responses match on {name}')
+            failed = failed or bool(differences)
+        source_engine.dispose()
+        with source_app.app_context():
+            db.engine.dispose()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
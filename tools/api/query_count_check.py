@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Check that the read endpoints run a constant number of SQL statements per
+request, however many rows they return.
+
+Seeds the medium benchmark database (see benchmark.py), then counts the
+statements each GET endpoint of the blueprints runs, twice:
+
+- list endpoints at two page sizes, ``limit=SMALL_PAGE`` and
+  ``limit=LARGE_PAGE``
+- endpoints taking an id, for the parent with the smallest and the one
+  with the largest non-empty response among the first SAMPLE_PARENTS rows
+
+The collection endpoints in NDJSON_REQUESTS are also requested with
+``format=ndjson``. The stream has to hold the same rows as the JSON array
+when it spans several batches, and its statements are compared at both
+page sizes too.
+
+Both counts have to be equal. A relationship loaded lazily per row shows
+up as a count growing with the rows returned. Any response that is not
+2xx fails the check as well; endpoints with no rows for any sampled
+parent are reported as skipped.
+
+Usage (from the tools directory):
+    python -m api.query_count_check --data-dir /tmp/bench
+
+Exits with status 1 if any endpoint fails.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from urllib.parse import parse_qsl
+from sqlalchemy import event, text
+from . import pagination
+from .app import create_app
+from .benchmark import ARGUMENTS, QUERY_STRINGS, seed_database
+from .models import db
+from .parity_check import SAMPLE_TABLES, sample_ids
+
+SIZE = 'medium'
+SMALL_PAGE = 5
+LARGE_PAGE = 50
+SAMPLE_PARENTS = 50
+# Batch size while comparing streams with JSON, so that they span several batches
+SMALL_STREAM_BATCH = 7
+
+# Collection endpoints streaming NDJSON -> query string
+NDJSON_REQUESTS = {
+    'activity_routes.get_activities': '',
+    'activity_routes.get_activities (search)': 'q={activity_word}',
+    'guide_routes.get_guides': '',
+    'playlist_routes.get_playlists': '',
+    'skill_routes.get_skills': '',
+    'tag_routes.get_tags': '',
+    'user_routes.get_users': '',
+}
+
+# sample_ids key -> table holding the rows, for the path arguments
+PARENT_TABLES = dict(SAMPLE_TABLES, guide_version='GuideVersions')
+
+
+class StatementCounter:
+    """Count the statements run on an engine while requests are made."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def get(self, client, path, **kwargs):
+        """
+        Make a request, reading the whole body before counting so streamed
+        responses are included.
+
+        Returns:
+            tuple: (response, body bytes, statements run)
+        """
+        self.count = 0
+        response = client.get(path, **kwargs)
+        body = response.get_data()
+        return response, body, self.count
+
+
+def _rows(response):
+    """Number of rows in a JSON list response (1 for other responses)."""
+    data = response.get_json(silent=True)
+    return len(data) if isinstance(data, list) else 1
+
+
+def _is_empty(response):
+    return not response.get_json(silent=True)
+
+
+def check_list(client, counter, path, query):
+    """
+    Compare the statements of a list endpoint at both page sizes.
+
+    Returns:
+        dict: statements and rows per page size, and a failure or None
+    """
+    result = {'path': path, 'failure': None}
+    counter.get(client, path, query_string=query)  # warm-up
+    for name, limit in (('small', SMALL_PAGE), ('large', LARGE_PAGE)):
+        response, _, statements = counter.get(client, path, query_string=dict(query, limit=limit))
+        if not 200 <= response.status_code < 300:
+            result['failure'] = f'status {response.status_code}'
+            return result
+        result[name] = (statements, _rows(response))
+    if result['small'][0] != result['large'][0]:
+        result['failure'] = 'statements grow with the page size'
+    return result
+
+
+def check_parent(client, counter, rule, argument, parent_ids):
+    """
+    Compare the statements of an endpoint taking an id for the parent with
+    the smallest and the one with the largest non-empty response.
+
+    Returns:
+        dict: statements and response size per parent, and a failure or None
+    """
+    result = {'path': rule.rule, 'failure': None}
+    responses = []
+    for parent_id in parent_ids:
+        path = rule.build({argument: parent_id}, append_unknown=False)[1]
+        counter.get(client, path)  # warm-up
+        response, body, statements = counter.get(client, path)
+        if not 200 <= response.status_code < 300:
+            result['failure'] = f'status {response.status_code} for {path}'
+            return result
+        if not _is_empty(response):
+            responses.append((len(body), statements, path))
+    if not responses:
+        result['skipped'] = 'no parent with a non-empty response'
+        return result
+    responses.sort()
+    result['small'] = (responses[0][1], responses[0][0])
+    result['large'] = (responses[-1][1], responses[-1][0])
+    if result['small'][0] != result['large'][0]:
+        result['failure'] = (f'statements grow with the response: {responses[0][2]} runs {responses[0][1]}, '
+                             f'{responses[-1][2]} runs {responses[-1][1]}')
+    return result
+
+
+def _ndjson_rows(response, body):
+    if response.mimetype != pagination.NDJSON_MIMETYPE:
+        return None
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+def check_ndjson(client, counter, name, path, query):
+    """
+    Check a collection endpoint's NDJSON stream against its JSON array, and
+    compare the stream's statements at both page sizes.
+
+    Returns:
+        dict: statements and rows per page size, and a failure or None
+    """
+    result = {'path': f'{name} (ndjson)', 'failure': None}
+    stream_query = dict(query, format='ndjson')
+
+    expected = client.get(path, query_string=query).get_json()
+    batch_size = pagination.STREAM_BATCH_SIZE
+    pagination.STREAM_BATCH_SIZE = SMALL_STREAM_BATCH
+    try:
+        response, body, _ = counter.get(client, path, query_string=stream_query)
+    except Exception as e:
+        # Errors raised while streaming surface when the body is read
+        result['failure'] = f'stream failed: {e}'
+        return result
+    finally:
+        pagination.STREAM_BATCH_SIZE = batch_size
+    if not 200 <= response.status_code < 300:
+        result['failure'] = f'status {response.status_code}'
+        return result
+    rows = _ndjson_rows(response, body)
+    if rows is None:
+        result['failure'] = f'answered {response.mimetype} instead of NDJSON'
+        return result
+    if rows != expected:
+        result['failure'] = f'streamed {len(rows)} rows differing from the {len(expected)} rows of the JSON array'
+        return result
+
+    for name, limit in (('small', SMALL_PAGE), ('large', LARGE_PAGE)):
+        try:
+            response, body, statements = counter.get(client, path, query_string=dict(stream_query, limit=limit))
+        except Exception as e:
+            result['failure'] = f'stream failed with limit={limit}: {e}'
+            return result
+        if not 200 <= response.status_code < 300:
+            result['failure'] = f'status {response.status_code} with limit={limit}'
+            return result
+        result[name] = (statements, len(_ndjson_rows(response, body) or ()))
+    if result['small'][0] != result['large'][0]:
+        result['failure'] = 'statements grow with the page size'
+    return result
+
+
+def run_checks(app):
+    """Check every GET endpoint of the blueprints and return the results."""
+    with app.app_context():
+        engine = db.engine
+        ids = sample_ids(engine)
+        with engine.connect() as conn:
+            parents = {key: [row[0] for row in conn.execute(
+                text(f'SELECT id FROM "{table}" ORDER BY id LIMIT :limit'), {'limit': SAMPLE_PARENTS})]
+                for key, table in PARENT_TABLES.items()}
+
+    client = app.test_client()
+    results = []
+    endpoints = {rule.endpoint: rule.rule for rule in app.url_map.iter_rules()}
+    with StatementCounter(engine) as counter:
+        for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+            if 'GET' not in rule.methods or not rule.rule.startswith('/api/'):
+                continue
+            if not rule.arguments:
+                query = dict(parse_qsl(QUERY_STRINGS.get(rule.endpoint, '').format(**ids)))
+                results.append(check_list(client, counter, rule.rule, query))
+            elif len(rule.arguments) == 1 and next(iter(rule.arguments)) in ARGUMENTS:
+                argument = next(iter(rule.arguments))
+                results.append(check_parent(client, counter, rule, argument, parents[ARGUMENTS[argument]]))
+        for name, query_string in NDJSON_REQUESTS.items():
+            query = dict(parse_qsl(query_string.format(**ids)))
+            results.append(check_ndjson(client, counter, name, endpoints[name.split(' ')[0]], query))
+    return results
+
+
+def print_results(results):
+    print(f'{"request":<58} {"statements":>12} {"rows/bytes":>16}')
+    for r in results:
+        if 'small' in r and 'large' in r:
+            statements = f'{r["small"][0]} / {r["large"][0]}'
+            sizes = f'{r["small"][1]} / {r["large"][1]}'
+        else:
+            statements = sizes = '-'
+        print(f'{r["path"]:<58} {statements:>12} {sizes:>16}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that read endpoints run a constant number of statements')
+    parser.add_argument('--data-dir', help='Directory keeping the seeded database between runs '
+                                           '(default: a temporary directory)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        db_path = seed_database(SIZE, args.data_dir or temporary_directory)
+        # Count the database statements, not the in-process cache
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'ENTITY_CACHE_ENABLED': False})
+        app.logger.disabled = True
+        results = run_checks(app)
+        with app.app_context():
+            db.engine.dispose()
+
+    print_results(results)
+    for r in results:
+        if r.get('skipped'):
+            print(f'SKIPPED {r["path"]}: {r["skipped"]}')
+    failures = [r for r in results if r['failure']]
+    for r in failures:
+        print(f'FAILED  {r["path"]}: {r["failure"]}')
+    print(f'{len(results)} endpoints checked, {len(failures)} failed')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
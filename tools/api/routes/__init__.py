@@ -10,6 +10,7 @@ def register_routes(app):
     from .guides import guide_routes
     from .playlists import playlist_routes
     from .skills import skill_routes
+    from .stats import stats_routes
     
     # Register all route blueprints
     app.register_blueprint(user_routes, url_prefix='/api/users')
@@ -20,3 +21,4 @@ def register_routes(app):
     app.register_blueprint(guide_routes, url_prefix='/api/guides')
     app.register_blueprint(playlist_routes, url_prefix='/api/playlists')
     app.register_blueprint(skill_routes, url_prefix='/api/skills')
+    app.register_blueprint(stats_routes, url_prefix='/api/stats')
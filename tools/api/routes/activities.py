@@ -1,8 +1,32 @@
 from flask import Blueprint, jsonify, request
-from ..models import db, Activity, DifficultyLevel, ActivityMedia, ActivityTag, ActivityBodyArea, ActivitySkill
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import DBAPIError
+from ..models import db, Activity, DifficultyLevel, ActivityMedia, ActivityTag, ActivityBodyArea, ActivitySkill, Tag, BodyArea
+from ..models.activity import ACTIVITY_TYPES, MEDIA_TYPES
+from ..models.loaders import activity_options, activity_body_area_options, activity_tag_options, skill_options
+from ..models.serializer import serializer_options
+from ..pagination import collection_response
+from ..search import search_activities
+from ..caching import conditional_get
+from ..database import begin_transaction
+from ..entity_cache import cached_dict, exists_or_404
 
 activity_routes = Blueprint('activity_routes', __name__)
 
+MAX_BULK_ACTIVITIES = 10000
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _existing_ids(model, ids):
+    """Return which of the given ids exist in the model's table, using one IN query."""
+    ids = {i for i in ids if _is_int(i)}
+    if not ids:
+        return set()
+    return set(db.session.scalars(db.select(model.id).where(model.id.in_(ids))))
+
 
 @activity_routes.route('/', methods=['GET'])
 def get_activities():
@@ -26,18 +50,17 @@ def get_activities():
             pass  # Ignore invalid difficulty
     
     if search_query:
-        query = query.filter(Activity.name.ilike(f'%{search_query}%') | 
-                            Activity.description.ilike(f'%{search_query}%'))
+        # Relevance-ranked results can be limited but not cursored by id
+        query = search_activities(query, search_query)
+        return collection_response(query, Activity, ranked=True, loader=activity_options)
     
-    activities = query.all()
-    return jsonify([activity.to_dict() for activity in activities])
+    return collection_response(query, Activity, loader=activity_options)
 
 
 @activity_routes.route('/<int:activity_id>', methods=['GET'])
 def get_activity(activity_id):
     """Get a specific activity by ID."""
-    activity = Activity.query.get_or_404(activity_id)
-    return jsonify(activity.to_dict())
+    return jsonify(cached_dict(Activity, activity_id, activity_options))
 
 
 @activity_routes.route('/', methods=['POST'])
@@ -75,10 +98,9 @@ def create_activity():
     
     # Handle tags
     if 'tags' in data and isinstance(data['tags'], list):
-        from ..models import Tag
+        valid_tag_ids = _existing_ids(Tag, data['tags'])
         for tag_id in data['tags']:
-            tag = Tag.query.get(tag_id)
-            if tag:
+            if tag_id in valid_tag_ids:
                 activity_tag = ActivityTag(
                     activity_id=new_activity.id,
                     tag_id=tag_id
@@ -139,10 +161,9 @@ def update_activity(activity_id):
         ActivityTag.query.filter_by(activity_id=activity_id).delete()
         
         # Add new tags
-        from ..models import Tag
+        valid_tag_ids = _existing_ids(Tag, data['tags'])
         for tag_id in data['tags']:
-            tag = Tag.query.get(tag_id)
-            if tag:
+            if tag_id in valid_tag_ids:
                 activity_tag = ActivityTag(
                     activity_id=activity_id,
                     tag_id=tag_id
@@ -166,6 +187,204 @@ def update_activity(activity_id):
     return jsonify(activity.to_dict())
 
 
+def _validate_bulk_activity(item, activity_ids, tag_ids, body_area_ids, difficulty_ids):
+    """Return an error message for an invalid bulk item, or None."""
+    if not isinstance(item, dict):
+        return 'Activity must be an object'
+    
+    if 'id' in item:
+        if not _is_int(item['id']) or item['id'] not in activity_ids:
+            return f"Activity not found: {item['id']}"
+    elif 'name' not in item:
+        return 'Activity name is required'
+    
+    if 'name' in item and (not isinstance(item['name'], str) or not item['name'].strip()):
+        return 'Activity name must be a non-empty string'
+    for key in ('description', 'activity_type'):
+        if item.get(key) is not None and not isinstance(item[key], str):
+            return f'{key} must be a string'
+    if item.get('complexity_level') is not None and not _is_int(item['complexity_level']):
+        return 'complexity_level must be an integer'
+    if item.get('difficulty_level') is not None:
+        if not _is_int(item['difficulty_level']) or item['difficulty_level'] not in difficulty_ids:
+            return f"Unknown difficulty_level: {item['difficulty_level']}"
+    
+    if item.get('type') is not None and (not isinstance(item['type'], str) or item['type'] not in ACTIVITY_TYPES):
+        return f"Invalid activity type: {item['type']}"
+    
+    for key, known_ids in (('tags', tag_ids), ('body_areas', body_area_ids)):
+        if key not in item:
+            continue
+        if not isinstance(item[key], list):
+            return f'{key} must be a list'
+        unknown = [i for i in item[key] if not _is_int(i) or i not in known_ids]
+        if unknown:
+            return f'Unknown {key} ids: {unknown}'
+    
+    if 'media' in item:
+        if not isinstance(item['media'], list):
+            return 'media must be a list'
+        for media_item in item['media']:
+            if not isinstance(media_item, dict) or 'media_type' not in media_item or 'url' not in media_item:
+                return 'Media items require media_type and url'
+            if not isinstance(media_item['media_type'], str) or media_item['media_type'] not in MEDIA_TYPES:
+                return f"Invalid media type: {media_item['media_type']}"
+            if not isinstance(media_item['url'], str):
+                return 'Media url must be a string'
+    
+    return None
+
+
+def _referenced_ids(items, key):
+    """Collect the ids referenced under key across all bulk items."""
+    ids = []
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get(key), list):
+            ids.extend(item[key])
+    return ids
+
+
+def _replace_associations(model, replaced_activity_ids, rows):
+    """Delete the associations of the given activities and bulk insert the new rows."""
+    if replaced_activity_ids:
+        db.session.execute(delete(model).where(model.activity_id.in_(replaced_activity_ids)))
+    if rows:
+        db.session.execute(insert(model), rows)
+
+
+def _write_bulk_activities(entries):
+    """
+    Write validated bulk items, batched into one statement per table.
+    
+    Args:
+        entries: (index, item) pairs, in input order
+    
+    Returns:
+        dict: index -> result for every item written
+    """
+    results = {}
+    creates = [(index, item) for index, item in entries if 'id' not in item]
+    updates = [(index, item) for index, item in entries if 'id' in item]
+    written = []  # (activity_id, item, is_update) for every item written
+    
+    if creates:
+        rows = [{
+            'name': item['name'],
+            'description': item.get('description'),
+            'type': item.get('type'),
+            'difficulty_level': item.get('difficulty_level'),
+            'activity_type': item.get('activity_type', 'exercise'),
+            'complexity_level': item.get('complexity_level', 1)
+        } for _, item in creates]
+        # activities.id is AUTOINCREMENT, so ids are handed out in insertion
+        # order and sorting them maps them back to the input rows. This keeps
+        # the insert batched; sort_by_parameter_order would make SQLite fall
+        # back to one statement per row.
+        new_ids = sorted(db.session.scalars(insert(Activity).returning(Activity.id), rows))
+        for (index, item), activity_id in zip(creates, new_ids):
+            results[index] = {'index': index, 'status': 'created', 'id': activity_id}
+            written.append((activity_id, item, False))
+    
+    if updates:
+        fields = ('name', 'description', 'type', 'difficulty_level', 'activity_type', 'complexity_level')
+        rows = []
+        for index, item in updates:
+            row = {field: item[field] for field in fields if field in item}
+            if row:
+                rows.append(dict(row, id=item['id']))
+            results[index] = {'index': index, 'status': 'updated', 'id': item['id']}
+            written.append((item['id'], item, True))
+        if rows:
+            db.session.execute(update(Activity), rows)
+    
+    # Association rows for all items, written with one executemany per table.
+    # Updated activities have their existing associations replaced.
+    replaced = {'tags': [], 'body_areas': [], 'media': []}
+    tag_rows, body_area_rows, media_rows = [], [], []
+    for activity_id, item, is_update in written:
+        for key in replaced:
+            if key in item and is_update:
+                replaced[key].append(activity_id)
+        # An id listed twice in one item is associated once
+        if 'tags' in item:
+            tag_rows.extend({'activity_id': activity_id, 'tag_id': tag_id}
+                            for tag_id in dict.fromkeys(item['tags']))
+        if 'body_areas' in item:
+            body_area_rows.extend({'activity_id': activity_id, 'body_area_id': body_area_id}
+                                  for body_area_id in dict.fromkeys(item['body_areas']))
+        if 'media' in item:
+            media_rows.extend({'activity_id': activity_id, 'media_type': m['media_type'], 'url': m['url']}
+                              for m in item['media'])
+    
+    _replace_associations(ActivityTag, replaced['tags'], tag_rows)
+    _replace_associations(ActivityBodyArea, replaced['body_areas'], body_area_rows)
+    _replace_associations(ActivityMedia, replaced['media'], media_rows)
+    return results
+
+
+@activity_routes.route('/bulk', methods=['POST'])
+def bulk_upsert_activities():
+    """
+    Create or update many activities in one transaction.
+    
+    Accepts a list of activities (or {"activities": [...]}). Items with an
+    ``id`` update that activity, items without one are created. ``tags``,
+    ``body_areas`` and ``media`` replace the existing associations when given.
+    Invalid items are reported per index and skipped; all valid items are
+    written together. If the database rejects the batch, the items are
+    written again one at a time, each in its own savepoint, so only the
+    items it rejects are reported as errors.
+    """
+    data = request.get_json()
+    items = data.get('activities') if isinstance(data, dict) else data
+    
+    if not isinstance(items, list):
+        return jsonify({'error': 'Expected a list of activities'}), 400
+    if len(items) > MAX_BULK_ACTIVITIES:
+        return jsonify({'error': f'At most {MAX_BULK_ACTIVITIES} activities per request'}), 400
+    
+    # Resolve every referenced id with a single IN query per table
+    activity_ids = _existing_ids(Activity, [item.get('id') for item in items if isinstance(item, dict)])
+    tag_ids = _existing_ids(Tag, _referenced_ids(items, 'tags'))
+    body_area_ids = _existing_ids(BodyArea, _referenced_ids(items, 'body_areas'))
+    difficulty_ids = _existing_ids(DifficultyLevel, [item.get('difficulty_level') for item in items
+                                                     if isinstance(item, dict)])
+    
+    results = [None] * len(items)
+    entries = []
+    for index, item in enumerate(items):
+        error = _validate_bulk_activity(item, activity_ids, tag_ids, body_area_ids, difficulty_ids)
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'error': error}
+        else:
+            entries.append((index, item))
+    
+    if entries:
+        begin_transaction()
+        try:
+            with db.session.begin_nested():
+                written = _write_bulk_activities(entries)
+        except DBAPIError:
+            written = {}
+            for index, item in entries:
+                try:
+                    with db.session.begin_nested():
+                        written.update(_write_bulk_activities([(index, item)]))
+                except DBAPIError as e:
+                    written[index] = {'index': index, 'status': 'error', 'error': str(e.orig)}
+        for index, result in written.items():
+            results[index] = result
+    
+    db.session.commit()
+    
+    return jsonify({
+        'created': sum(1 for r in results if r['status'] == 'created'),
+        'updated': sum(1 for r in results if r['status'] == 'updated'),
+        'errors': sum(1 for r in results if r['status'] == 'error'),
+        'results': results
+    })
+
+
 @activity_routes.route('/<int:activity_id>', methods=['DELETE'])
 def delete_activity(activity_id):
     """Delete an activity."""
@@ -186,7 +405,7 @@ def delete_activity(activity_id):
 @activity_routes.route('/<int:activity_id>/media', methods=['GET'])
 def get_activity_media(activity_id):
     """Get all media for an activity."""
-    Activity.query.get_or_404(activity_id)  # Verify activity exists
+    exists_or_404(Activity, activity_id)  # Verify activity exists
     
     media = ActivityMedia.query.filter_by(activity_id=activity_id).all()
     return jsonify([m.to_dict() for m in media])
@@ -195,31 +414,35 @@ def get_activity_media(activity_id):
 @activity_routes.route('/<int:activity_id>/tags', methods=['GET'])
 def get_activity_tags(activity_id):
     """Get all tags for an activity."""
-    Activity.query.get_or_404(activity_id)  # Verify activity exists
+    exists_or_404(Activity, activity_id)  # Verify activity exists
     
-    tags = ActivityTag.query.filter_by(activity_id=activity_id).all()
+    tags = ActivityTag.query.filter_by(activity_id=activity_id).options(*activity_tag_options()).all()
     return jsonify([t.to_dict() for t in tags])
 
 
 @activity_routes.route('/<int:activity_id>/body-areas', methods=['GET'])
 def get_activity_body_areas(activity_id):
     """Get all body areas for an activity."""
-    Activity.query.get_or_404(activity_id)  # Verify activity exists
+    exists_or_404(Activity, activity_id)  # Verify activity exists
     
-    body_areas = ActivityBodyArea.query.filter_by(activity_id=activity_id).all()
+    body_areas = ActivityBodyArea.query.filter_by(activity_id=activity_id).options(
+        *activity_body_area_options()
+    ).all()
     return jsonify([ba.to_dict() for ba in body_areas])
 
 
 @activity_routes.route('/<int:activity_id>/skills', methods=['GET'])
 def get_activity_skills(activity_id):
     """Get all skills for an activity."""
-    Activity.query.get_or_404(activity_id)  # Verify activity exists
+    exists_or_404(Activity, activity_id)  # Verify activity exists
     
-    skills = ActivitySkill.query.filter_by(activity_id=activity_id).all()
-    return jsonify([s.to_dict() for s in skills])
+    options = serializer_options(request.args)
+    skills = ActivitySkill.query.filter_by(activity_id=activity_id).options(*skill_options(**options)).all()
+    return jsonify([s.to_dict(**options) for s in skills])
 
 
 @activity_routes.route('/difficulty-levels', methods=['GET'])
+@conditional_get(DifficultyLevel)
 def get_difficulty_levels():
     """Get all difficulty levels."""
     levels = DifficultyLevel.query.all()
@@ -1,10 +1,16 @@
 from flask import Blueprint, jsonify, request
+from sqlalchemy.orm import joinedload
 from ..models import db, BodyArea, ActivityBodyArea
+from ..models.loaders import activity_options
+from ..models.serializer import serializer_options
+from ..caching import conditional_get
+from ..entity_cache import exists_or_404
 
 body_area_routes = Blueprint('body_area_routes', __name__)
 
 
 @body_area_routes.route('/', methods=['GET'])
+@conditional_get(BodyArea)
 def get_body_areas():
     """Get all body areas."""
     body_areas = BodyArea.query.all()
@@ -12,6 +18,7 @@ def get_body_areas():
 
 
 @body_area_routes.route('/<int:body_area_id>', methods=['GET'])
+@conditional_get(BodyArea)
 def get_body_area(body_area_id):
     """Get a specific body area by ID."""
     body_area = BodyArea.query.get_or_404(body_area_id)
@@ -72,13 +79,16 @@ def delete_body_area(body_area_id):
 @body_area_routes.route('/<int:body_area_id>/activities', methods=['GET'])
 def get_body_area_activities(body_area_id):
     """Get all activities for a body area."""
-    BodyArea.query.get_or_404(body_area_id)  # Verify body area exists
+    exists_or_404(BodyArea, body_area_id)  # Verify body area exists
     
-    activity_body_areas = ActivityBodyArea.query.filter_by(body_area_id=body_area_id).all()
+    options = serializer_options(request.args)
+    activity_body_areas = ActivityBodyArea.query.filter_by(body_area_id=body_area_id).options(
+        joinedload(ActivityBodyArea.activity).options(*activity_options(**options))
+    ).all()
     
     result = []
     for aba in activity_body_areas:
         if aba.activity:
-            result.append(aba.activity.to_dict())
+            result.append(aba.activity.to_dict(**options))
     
     return jsonify(result)
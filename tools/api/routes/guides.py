@@ -1,5 +1,9 @@
 from flask import Blueprint, jsonify, request
 from ..models import db, Guide, GuidePart, GuideVersion, GuidePartVersion
+from ..models.loaders import guide_options, guide_version_options
+from ..models.serializer import serializer_options
+from ..pagination import collection_response
+from ..entity_cache import cached_dict, exists_or_404
 from datetime import datetime
 
 guide_routes = Blueprint('guide_routes', __name__)
@@ -8,15 +12,13 @@ guide_routes = Blueprint('guide_routes', __name__)
 @guide_routes.route('/', methods=['GET'])
 def get_guides():
     """Get all guides."""
-    guides = Guide.query.all()
-    return jsonify([guide.to_dict() for guide in guides])
+    return collection_response(Guide.query, Guide, loader=guide_options)
 
 
 @guide_routes.route('/<int:guide_id>', methods=['GET'])
 def get_guide(guide_id):
     """Get a specific guide by ID."""
-    guide = Guide.query.get_or_404(guide_id)
-    return jsonify(guide.to_dict())
+    return jsonify(cached_dict(Guide, guide_id, guide_options))
 
 
 @guide_routes.route('/', methods=['POST'])
@@ -115,7 +117,7 @@ def delete_guide(guide_id):
 @guide_routes.route('/<int:guide_id>/parts', methods=['GET'])
 def get_guide_parts(guide_id):
     """Get all parts for a guide."""
-    Guide.query.get_or_404(guide_id)  # Verify guide exists
+    exists_or_404(Guide, guide_id)  # Verify guide exists
     
     parts = GuidePart.query.filter_by(guide_id=guide_id).order_by(GuidePart.order).all()
     return jsonify([part.to_dict() for part in parts])
@@ -194,10 +196,13 @@ def delete_guide_part(guide_id, part_id):
 @guide_routes.route('/<int:guide_id>/versions', methods=['GET'])
 def get_guide_versions(guide_id):
     """Get all versions for a guide."""
-    Guide.query.get_or_404(guide_id)  # Verify guide exists
+    exists_or_404(Guide, guide_id)  # Verify guide exists
     
-    versions = GuideVersion.query.filter_by(guide_id=guide_id).order_by(GuideVersion.version_number.desc()).all()
-    return jsonify([version.to_dict() for version in versions])
+    options = serializer_options(request.args)
+    versions = GuideVersion.query.filter_by(guide_id=guide_id).options(
+        *guide_version_options(**options)
+    ).order_by(GuideVersion.version_number.desc()).all()
+    return jsonify([version.to_dict(**options) for version in versions])
 
 
 @guide_routes.route('/<int:guide_id>/versions', methods=['POST'])
@@ -253,4 +258,4 @@ def get_guide_version(guide_id, version_id):
     if version.guide_id != guide_id:
         return jsonify({'error': 'Version does not belong to the specified guide'}), 400
     
-    return jsonify(version.to_dict())
+    return jsonify(version.to_dict(**serializer_options(request.args)))
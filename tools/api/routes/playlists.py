@@ -1,5 +1,9 @@
 from flask import Blueprint, jsonify, request
 from ..models import db, Playlist, PlaylistItem, PlaylistPerformance, User, Activity, PlaylistSharing
+from ..models.loaders import playlist_options, playlist_item_options
+from ..models.serializer import serializer_options
+from ..pagination import collection_response
+from ..entity_cache import cached_dict, exists_or_404
 from datetime import datetime
 
 playlist_routes = Blueprint('playlist_routes', __name__)
@@ -20,15 +24,13 @@ def get_playlists():
         except ValueError:
             pass  # Ignore invalid user_id
     
-    playlists = query.all()
-    return jsonify([playlist.to_dict() for playlist in playlists])
+    return collection_response(query, Playlist, loader=playlist_options)
 
 
 @playlist_routes.route('/<int:playlist_id>', methods=['GET'])
 def get_playlist(playlist_id):
     """Get a specific playlist by ID."""
-    playlist = Playlist.query.get_or_404(playlist_id)
-    return jsonify(playlist.to_dict())
+    return jsonify(cached_dict(Playlist, playlist_id, playlist_options))
 
 
 @playlist_routes.route('/', methods=['POST'])
@@ -113,10 +115,13 @@ def delete_playlist(playlist_id):
 @playlist_routes.route('/<int:playlist_id>/items', methods=['GET'])
 def get_playlist_items(playlist_id):
     """Get all items for a playlist."""
-    Playlist.query.get_or_404(playlist_id)  # Verify playlist exists
+    exists_or_404(Playlist, playlist_id)  # Verify playlist exists
     
-    items = PlaylistItem.query.filter_by(playlist_id=playlist_id).order_by(PlaylistItem.order).all()
-    return jsonify([item.to_dict() for item in items])
+    options = serializer_options(request.args)
+    items = PlaylistItem.query.filter_by(playlist_id=playlist_id).options(
+        *playlist_item_options(**options)
+    ).order_by(PlaylistItem.order).all()
+    return jsonify([item.to_dict(**options) for item in items])
 
 
 @playlist_routes.route('/<int:playlist_id>/items', methods=['POST'])
@@ -197,7 +202,7 @@ def delete_playlist_item(playlist_id, item_id):
 @playlist_routes.route('/<int:playlist_id>/performances', methods=['GET'])
 def get_playlist_performances(playlist_id):
     """Get all performances for a playlist."""
-    Playlist.query.get_or_404(playlist_id)  # Verify playlist exists
+    exists_or_404(Playlist, playlist_id)  # Verify playlist exists
     
     performances = PlaylistPerformance.query.filter_by(playlist_id=playlist_id).order_by(PlaylistPerformance.performed_at.desc()).all()
     return jsonify([performance.to_dict() for performance in performances])
@@ -1,21 +1,40 @@
+import json
+from datetime import datetime, timezone
 from flask import Blueprint, jsonify, request
-from ..models import db, Protocol, ActivityProtocol
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import joinedload
+from ..models import db, Protocol, ActivityProtocol, User
+from ..models.loaders import activity_options
+from ..models.serializer import serializer_options
+from ..caching import conditional_get
+from ..database import begin_transaction, insert
+from ..entity_cache import exists_or_404
+from ..pagination import NDJSON_MIMETYPE
+from .activities import _existing_ids
 
 protocol_routes = Blueprint('protocol_routes', __name__)
 
+MAX_BATCH_HISTORY = 10000
+# Millisecond timestamps accepted for history records, up to the end of year
+# 9999, the last one a datetime can hold
+MAX_TIME_MS = 253402300799999
+
 
 @protocol_routes.route('/', methods=['GET'])
+@conditional_get(Protocol)
 def get_protocols():
     """Get all protocols."""
     protocols = Protocol.query.all()
-    return jsonify([protocol.to_dict() for protocol in protocols])
+    options = serializer_options(request.args)
+    return jsonify([protocol.to_dict(**options) for protocol in protocols])
 
 
 @protocol_routes.route('/<int:protocol_id>', methods=['GET'])
+@conditional_get(Protocol)
 def get_protocol(protocol_id):
     """Get a specific protocol by ID."""
     protocol = Protocol.query.get_or_404(protocol_id)
-    return jsonify(protocol.to_dict())
+    return jsonify(protocol.to_dict(**serializer_options(request.args)))
 
 
 @protocol_routes.route('/', methods=['POST'])
@@ -78,13 +97,16 @@ def delete_protocol(protocol_id):
 @protocol_routes.route('/<int:protocol_id>/activities', methods=['GET'])
 def get_protocol_activities(protocol_id):
     """Get all activities using this protocol."""
-    Protocol.query.get_or_404(protocol_id)  # Verify protocol exists
+    exists_or_404(Protocol, protocol_id)  # Verify protocol exists
     
-    activity_protocols = ActivityProtocol.query.filter_by(protocol_id=protocol_id).all()
+    options = serializer_options(request.args)
+    activity_protocols = ActivityProtocol.query.filter_by(protocol_id=protocol_id).options(
+        joinedload(ActivityProtocol.activity).options(*activity_options(**options))
+    ).all()
     
     result = []
     for ap in activity_protocols:
-        activity_data = ap.activity.to_dict() if ap.activity else {}
+        activity_data = ap.activity.to_dict(**options) if ap.activity else {}
         activity_data['activity_protocol_id'] = ap.id
         activity_data['parameters'] = ap.get_parameters()
         result.append(activity_data)
@@ -155,7 +177,7 @@ def delete_activity_protocol(ap_id):
 @protocol_routes.route('/activity-protocols/<int:ap_id>/history', methods=['GET'])
 def get_activity_protocol_history(ap_id):
     """Get history for an activity protocol."""
-    ActivityProtocol.query.get_or_404(ap_id)  # Verify activity protocol exists
+    exists_or_404(ActivityProtocol, ap_id)  # Verify activity protocol exists
     
     from ..models import ActivityHistory
     history = ActivityHistory.query.filter_by(activity_protocol_id=ap_id).all()
@@ -174,13 +196,29 @@ def create_activity_history():
         if field not in data:
             return jsonify({'error': f'Missing required field: {field}'}), 400
     
+    times, error = _history_times(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
     from ..models import ActivityHistory
+    # Records are identified by (user_id, activity_protocol_id, start_time_ms)
+    def stored_duplicate():
+        return ActivityHistory.query.filter_by(
+            user_id=data['user_id'],
+            activity_protocol_id=data['activity_protocol_id'],
+            start_time_ms=data['start_time_ms']
+        ).first()
+    
+    existing = stored_duplicate()
+    if existing:
+        return jsonify({'error': 'This activity history record already exists', 'id': existing.id}), 409
+    
     # Create new activity history
     new_history = ActivityHistory(
         user_id=data['user_id'],
         activity_protocol_id=data['activity_protocol_id'],
-        start_time=data['start_time'],
-        end_time=data['end_time'],
+        start_time=times['start_time'],
+        end_time=times['end_time'],
         start_time_ms=data['start_time_ms'],
         end_time_ms=data['end_time_ms'],
         status=data['status'],
@@ -192,6 +230,220 @@ def create_activity_history():
         new_history.set_parameters(data['parameters'])
     
     db.session.add(new_history)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request stored the same record after the check above
+        db.session.rollback()
+        existing = stored_duplicate()
+        if not existing:
+            raise
+        return jsonify({'error': 'This activity history record already exists', 'id': existing.id}), 409
     
     return jsonify(new_history.to_dict()), 201
+
+
+def _read_history_batch():
+    """
+    Parse the records of a batch request, either a JSON array (or
+    {"records": [...]}) or NDJSON with one record per line.
+    
+    Returns:
+        tuple: (records, error) where a record is None for an unparseable
+        NDJSON line
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        records = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+        return records, None
+    
+    data = request.get_json(silent=True)
+    records = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return None, 'Expected a list of activity history records'
+    return records, None
+
+
+def _history_times(record):
+    """
+    Return ({'start_time': ..., 'end_time': ...}, error) for a record, as
+    naive UTC like the other stored timestamps. Each defaults to its
+    millisecond timestamp.
+    """
+    times = {}
+    for field in ('start_time', 'end_time'):
+        value = record.get(field)
+        if value is None:
+            try:
+                times[field] = datetime.fromtimestamp(record[f'{field}_ms'] / 1000, timezone.utc).replace(tzinfo=None)
+            except (OverflowError, ValueError, OSError):
+                return None, f'{field}_ms is out of range'
+            continue
+        try:
+            time = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None, f'{field} must be an ISO 8601 timestamp'
+        if time.tzinfo is not None:
+            time = time.astimezone(timezone.utc).replace(tzinfo=None)
+        times[field] = time
+    return times, None
+
+
+def _validate_history_record(record, user_ids, activity_protocol_ids):
+    """Return (row, error) for a batch record, with row ready for insertion."""
+    if not isinstance(record, dict):
+        return None, 'Record must be a JSON object'
+
+    for field in ('user_id', 'activity_protocol_id', 'start_time_ms', 'end_time_ms', 'status'):
+        if field not in record:
+            return None, f'Missing required field: {field}'
+    for field in ('user_id', 'activity_protocol_id', 'start_time_ms', 'end_time_ms'):
+        if not isinstance(record[field], int) or isinstance(record[field], bool):
+            return None, f'{field} must be an integer'
+    for field in ('start_time_ms', 'end_time_ms'):
+        if not 0 <= record[field] <= MAX_TIME_MS:
+            return None, f'{field} is out of range'
+    if record['end_time_ms'] < record['start_time_ms']:
+        return None, 'end_time_ms must not be before start_time_ms'
+    if not isinstance(record['status'], str) or not record['status']:
+        return None, 'status must be a non-empty string'
+    if record.get('notes') is not None and not isinstance(record['notes'], str):
+        return None, 'notes must be a string'
+    if record['user_id'] not in user_ids:
+        return None, f"User not found: {record['user_id']}"
+    if record['activity_protocol_id'] not in activity_protocol_ids:
+        return None, f"Activity protocol not found: {record['activity_protocol_id']}"
+
+    times, error = _history_times(record)
+    if error:
+        return None, error
+
+    return {
+        'user_id': record['user_id'],
+        'activity_protocol_id': record['activity_protocol_id'],
+        'parameters': json.dumps(record['parameters']) if 'parameters' in record else None,
+        'start_time': times['start_time'],
+        'end_time': times['end_time'],
+        'start_time_ms': record['start_time_ms'],
+        'end_time_ms': record['end_time_ms'],
+        'status': record['status'],
+        'notes': record.get('notes')
+    }, None
+
+
+def _history_key(row):
+    return (row['user_id'], row['activity_protocol_id'], row['start_time_ms'])
+
+
+def _insert_history(pending):
+    """
+    Insert validated batch records with one statement.
+
+    Args:
+        pending: key -> (index, row) for the records to insert
+
+    Returns:
+        dict: index -> result for every record
+    """
+    from ..models import ActivityHistory
+    results = {}
+    remaining = dict(pending)
+    # ON CONFLICT DO NOTHING covers a concurrent request storing the same
+    # record between the lookup of stored keys and this insert
+    inserted = db.session.execute(
+        insert(ActivityHistory).on_conflict_do_nothing().returning(
+            ActivityHistory.id, ActivityHistory.user_id,
+            ActivityHistory.activity_protocol_id, ActivityHistory.start_time_ms),
+        [row for _, row in remaining.values()]
+    )
+    for history_id, *key in inserted:
+        index, _ = remaining.pop(tuple(key))
+        results[index] = {'index': index, 'status': 'created', 'id': history_id}
+    for index, _ in remaining.values():
+        results[index] = {'index': index, 'status': 'duplicate'}
+    return results
+
+
+@protocol_routes.route('/activity-history/batch', methods=['POST'])
+def create_activity_history_batch():
+    """
+    Record many activity history entries in one transaction.
+
+    Accepts a JSON array of records (or {"records": [...]}) or an NDJSON
+    body (Content-Type: application/x-ndjson). Records are identified by
+    (user_id, activity_protocol_id, start_time_ms): a record already stored,
+    or repeated earlier in the batch, is reported as a duplicate instead of
+    inserted again, so devices can safely resend a batch after a failure.
+    Invalid records are reported per index and skipped.
+    """
+    from ..models import ActivityHistory
+    records, error = _read_history_batch()
+    if error:
+        return jsonify({'error': error}), 400
+    if len(records) > MAX_BATCH_HISTORY:
+        return jsonify({'error': f'At most {MAX_BATCH_HISTORY} records per request'}), 400
+
+    # Resolve every referenced id with a single IN query per table
+    def referenced(field):
+        return {r.get(field) for r in records if isinstance(r, dict) and isinstance(r.get(field), int)}
+
+    user_ids = _existing_ids(User, referenced('user_id'))
+    activity_protocol_ids = _existing_ids(ActivityProtocol, referenced('activity_protocol_id'))
+
+    results = [None] * len(records)
+    pending = {}  # key -> (index, row), first occurrence in the batch wins
+    for index, record in enumerate(records):
+        row, error = _validate_history_record(record, user_ids, activity_protocol_ids)
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'error': error}
+        elif _history_key(row) in pending:
+            results[index] = {'index': index, 'status': 'duplicate'}
+        else:
+            pending[_history_key(row)] = (index, row)
+
+    if pending:
+        # Keys already stored, found through the (user_id, activity_protocol_id,
+        # start_time_ms) index with one range query
+        start_times = [key[2] for key in pending]
+        stored = db.session.execute(
+            db.select(ActivityHistory.user_id, ActivityHistory.activity_protocol_id, ActivityHistory.start_time_ms)
+            .where(ActivityHistory.user_id.in_({key[0] for key in pending}))
+            .where(ActivityHistory.activity_protocol_id.in_({key[1] for key in pending}))
+            .where(ActivityHistory.start_time_ms.between(min(start_times), max(start_times)))
+        )
+        for key in stored:
+            if tuple(key) in pending:
+                index, _ = pending.pop(tuple(key))
+                results[index] = {'index': index, 'status': 'duplicate'}
+
+    if pending:
+        begin_transaction()
+        try:
+            with db.session.begin_nested():
+                written = _insert_history(pending)
+        except DBAPIError:
+            written = {}
+            for key, (index, row) in pending.items():
+                try:
+                    with db.session.begin_nested():
+                        written.update(_insert_history({key: (index, row)}))
+                except DBAPIError as e:
+                    written[index] = {'index': index, 'status': 'error', 'error': str(e.orig)}
+        for index, result in written.items():
+            results[index] = result
+
+    db.session.commit()
+
+    statuses = [r['status'] for r in results]
+    return jsonify({
+        'created': statuses.count('created'),
+        'duplicates': statuses.count('duplicate'),
+        'errors': statuses.count('error'),
+        'results': results
+    })
@@ -1,10 +1,19 @@
 from flask import Blueprint, jsonify, request
 from ..models import db, SkillCategory, ActivitySkill, SkillPrerequisite, UserSkillProgress, User, Activity
+from ..models.loaders import skill_options, skill_prerequisite_options, skill_progress_options
+from ..models.serializer import serializer_options
+from ..pagination import collection_response
+from ..caching import conditional_get
+from ..entity_cache import exists_or_404
+from ..skill_availability import (
+    available_skills, delete_skill_availability, refresh_skills, refresh_user_skill, skill_graph
+)
 
 skill_routes = Blueprint('skill_routes', __name__)
 
 
 @skill_routes.route('/categories', methods=['GET'])
+@conditional_get(SkillCategory)
 def get_skill_categories():
     """Get all skill categories."""
     categories = SkillCategory.query.all()
@@ -12,6 +21,7 @@ def get_skill_categories():
 
 
 @skill_routes.route('/categories/<int:category_id>', methods=['GET'])
+@conditional_get(SkillCategory)
 def get_skill_category(category_id):
     """Get a specific skill category by ID."""
     category = SkillCategory.query.get_or_404(category_id)
@@ -98,15 +108,15 @@ def get_skills():
         except ValueError:
             pass  # Ignore invalid category_id
     
-    skills = query.all()
-    return jsonify([skill.to_dict() for skill in skills])
+    return collection_response(query, ActivitySkill, loader=skill_options)
 
 
 @skill_routes.route('/<int:skill_id>', methods=['GET'])
 def get_skill(skill_id):
     """Get a specific skill by ID."""
-    skill = ActivitySkill.query.get_or_404(skill_id)
-    return jsonify(skill.to_dict())
+    options = serializer_options(request.args)
+    skill = ActivitySkill.query.options(*skill_options(**options)).get_or_404(skill_id)
+    return jsonify(skill.to_dict(**options))
 
 
 @skill_routes.route('/', methods=['POST'])
@@ -176,6 +186,7 @@ def update_skill(skill_id):
 def delete_skill(skill_id):
     """Delete a skill."""
     skill = ActivitySkill.query.get_or_404(skill_id)
+    dependents = skill_graph().dependents.get(skill_id, set()) - {skill_id}
     
     # Delete prerequisites
     SkillPrerequisite.query.filter_by(skill_id=skill_id).delete()
@@ -183,6 +194,10 @@ def delete_skill(skill_id):
     
     # Delete user progress
     UserSkillProgress.query.filter_by(skill_id=skill_id).delete()
+    delete_skill_availability(skill_id)
+    
+    # Skills that required this one lose a prerequisite
+    refresh_skills(dependents)
     
     # Delete skill
     db.session.delete(skill)
@@ -194,12 +209,27 @@ def delete_skill(skill_id):
 @skill_routes.route('/<int:skill_id>/prerequisites', methods=['GET'])
 def get_skill_prerequisites(skill_id):
     """Get all prerequisites for a skill."""
-    ActivitySkill.query.get_or_404(skill_id)  # Verify skill exists
+    exists_or_404(ActivitySkill, skill_id)  # Verify skill exists
     
-    prerequisites = SkillPrerequisite.query.filter_by(skill_id=skill_id).all()
+    prerequisites = SkillPrerequisite.query.filter_by(skill_id=skill_id).options(
+        *skill_prerequisite_options()
+    ).all()
     return jsonify([prereq.to_dict() for prereq in prerequisites])
 
 
+@skill_routes.route('/<int:skill_id>/ancestors', methods=['GET'])
+def get_skill_ancestors(skill_id):
+    """Get all direct and transitive prerequisites of a skill."""
+    exists_or_404(ActivitySkill, skill_id)  # Verify skill exists
+    
+    depths = skill_graph().ancestors(skill_id)
+    options = serializer_options(request.args)
+    skills = ActivitySkill.query.filter(ActivitySkill.id.in_(depths)).options(*skill_options(**options)).all()
+    skills.sort(key=lambda skill: (depths[skill.id], skill.id))
+    
+    return jsonify([dict(skill.to_dict(**options), depth=depths[skill.id]) for skill in skills])
+
+
 @skill_routes.route('/<int:skill_id>/prerequisites', methods=['POST'])
 def add_skill_prerequisite(skill_id):
     """Add a prerequisite to a skill."""
@@ -228,6 +258,10 @@ def add_skill_prerequisite(skill_id):
     if existing_prereq:
         return jsonify({'error': 'This prerequisite already exists'}), 409
     
+    # Verify the prerequisite does not (transitively) require the skill
+    if skill_graph().creates_cycle(skill_id, data['prerequisite_skill_id']):
+        return jsonify({'error': 'This prerequisite would create a cycle'}), 400
+    
     # Create new prerequisite
     new_prereq = SkillPrerequisite(
         skill_id=skill_id,
@@ -236,6 +270,7 @@ def add_skill_prerequisite(skill_id):
     )
     
     db.session.add(new_prereq)
+    refresh_skills([skill_id])
     db.session.commit()
     
     return jsonify(new_prereq.to_dict()), 201
@@ -255,6 +290,7 @@ def update_skill_prerequisite(skill_id, prereq_id):
     # Update required mastery level if provided
     if 'required_mastery_level' in data:
         prereq.required_mastery_level = data['required_mastery_level']
+        refresh_skills([skill_id])
     
     db.session.commit()
     return jsonify(prereq.to_dict())
@@ -271,6 +307,7 @@ def delete_skill_prerequisite(skill_id, prereq_id):
     
     # Delete prerequisite
     db.session.delete(prereq)
+    refresh_skills([skill_id])
     db.session.commit()
     
     return jsonify({'message': 'Skill prerequisite deleted successfully'})
@@ -279,9 +316,9 @@ def delete_skill_prerequisite(skill_id, prereq_id):
 @skill_routes.route('/user/<int:user_id>/progress', methods=['GET'])
 def get_user_skill_progress(user_id):
     """Get skill progress for a user."""
-    User.query.get_or_404(user_id)  # Verify user exists
+    exists_or_404(User, user_id)  # Verify user exists
     
-    progress = UserSkillProgress.query.filter_by(user_id=user_id).all()
+    progress = UserSkillProgress.query.filter_by(user_id=user_id).options(*skill_progress_options()).all()
     return jsonify([p.to_dict() for p in progress])
 
 
@@ -289,8 +326,8 @@ def get_user_skill_progress(user_id):
 def update_user_skill_progress(user_id, skill_id):
     """Update skill progress for a user."""
     # Verify user and skill exist
-    User.query.get_or_404(user_id)
-    ActivitySkill.query.get_or_404(skill_id)
+    exists_or_404(User, user_id)
+    exists_or_404(ActivitySkill, skill_id)
     
     data = request.get_json()
     
@@ -317,6 +354,7 @@ def update_user_skill_progress(user_id, skill_id):
         progress.total_practice_time_ms += data['practice_time_ms']
         progress.practice_count += 1
     
+    refresh_user_skill(user_id, skill_id)
     db.session.commit()
     return jsonify(progress.to_dict())
 
@@ -324,16 +362,10 @@ def update_user_skill_progress(user_id, skill_id):
 @skill_routes.route('/user/<int:user_id>/available', methods=['GET'])
 def get_user_available_skills(user_id):
     """Get available skills for a user based on prerequisites."""
-    User.query.get_or_404(user_id)  # Verify user exists
-    
-    # Execute raw SQL to use the available_user_skills view
-    available_skills = db.session.execute(
-        "SELECT * FROM available_user_skills WHERE user_id = :user_id",
-        {"user_id": user_id}
-    ).fetchall()
+    exists_or_404(User, user_id)  # Verify user exists
     
     result = []
-    for skill in available_skills:
+    for skill in available_skills(user_id):
         skill_dict = {
             'skill_id': skill.skill_id,
             'skill_name': skill.skill_name,
@@ -344,3 +376,36 @@ def get_user_available_skills(user_id):
         result.append(skill_dict)
     
     return jsonify(result)
+
+
+@skill_routes.route('/user/<int:user_id>/unlock-path/<int:skill_id>', methods=['GET'])
+def get_user_unlock_path(user_id, skill_id):
+    """Get the skills a user still has to master, in order, to unlock a skill."""
+    # Verify user and skill exist
+    exists_or_404(User, user_id)
+    exists_or_404(ActivitySkill, skill_id)
+    
+    mastery = dict(
+        db.session.query(UserSkillProgress.skill_id, UserSkillProgress.mastery_level)
+        .filter(UserSkillProgress.user_id == user_id)
+    )
+    path = skill_graph().unlock_path(skill_id, mastery)
+    names = dict(
+        db.session.query(ActivitySkill.id, ActivitySkill.name)
+        .filter(ActivitySkill.id.in_([step_id for step_id, _ in path]))
+    )
+    
+    steps = []
+    for step_id, required_mastery_level in path:
+        steps.append({
+            'skill_id': step_id,
+            'skill_name': names.get(step_id),
+            'mastery_level': mastery.get(step_id),
+            'required_mastery_level': required_mastery_level
+        })
+    
+    return jsonify({
+        'skill_id': skill_id,
+        'is_available': not steps,
+        'steps': steps
+    })
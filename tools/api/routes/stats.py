@@ -0,0 +1,162 @@
+from datetime import date
+from flask import Blueprint, jsonify, request
+from sqlalchemy import func
+from ..models import db, ActivityHistoryRollup, PlaylistPerformanceRollup, ActivityHistory, PlaylistPerformance, UserActivity
+from ..models.json_fields import JSON_FIELDS, json_field, json_field_name
+from ..models.stats import completion_rate
+from ..schema import has_column, has_table
+
+stats_routes = Blueprint('stats_routes', __name__)
+
+PERIODS = ('day', 'week')
+
+# Sources for /metrics: model and the SQL arguments to date() giving the UTC day of a row
+METRIC_SOURCES = {
+    'activity-history': (ActivityHistory, lambda: (ActivityHistory.start_time_ms / 1000, 'unixepoch')),
+    'playlist-performances': (PlaylistPerformance, lambda: (PlaylistPerformance.performed_at,)),
+    'user-activities': (UserActivity, lambda: (UserActivity.performed_at,)),
+}
+
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+
+
+def _rollup_stats(model, key):
+    """
+    Query a rollup table with the request's filters.
+    
+    Supports ``period`` (day or week), ``from``/``to`` (inclusive dates the
+    periods start within), ``user_id``, the rollup key (``activity_id`` or
+    ``playlist_id``) and ``group_by=period`` to sum across keys.
+    """
+    if not has_table(model.__tablename__):
+        return jsonify({'error': 'Stats rollups are not available for this database'}), 503
+    
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        return jsonify({'error': f"period must be one of: {', '.join(PERIODS)}"}), 400
+    
+    group_by = request.args.get('group_by')
+    if group_by not in (None, 'period'):
+        return jsonify({'error': 'group_by must be period'}), 400
+    
+    try:
+        start = _date_arg('from')
+        end = _date_arg('to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    key_column = getattr(model, key)
+    filters = [model.period == period]
+    if start:
+        filters.append(model.period_start >= start)
+    if end:
+        filters.append(model.period_start <= end)
+    
+    user_id = request.args.get('user_id', type=int)
+    if user_id is not None:
+        filters.append(model.user_id == user_id)
+    key_id = request.args.get(key, type=int)
+    if key_id is not None:
+        filters.append(key_column == key_id)
+    
+    if group_by == 'period':
+        rows = (
+            db.session.query(
+                model.period_start,
+                func.sum(model.session_count),
+                func.sum(model.completed_count),
+                func.sum(model.total_duration_ms),
+            )
+            .filter(*filters)
+            .group_by(model.period_start)
+            .order_by(model.period_start)
+            .all()
+        )
+        return jsonify([{
+            'period': period,
+            'period_start': period_start,
+            'session_count': session_count,
+            'completed_count': completed_count,
+            'completion_rate': completion_rate(completed_count, session_count),
+            'total_duration_ms': total_duration_ms
+        } for period_start, session_count, completed_count, total_duration_ms in rows])
+    
+    rollups = model.query.filter(*filters).order_by(model.period_start, model.user_id, key_column).all()
+    return jsonify([rollup.to_dict() for rollup in rollups])
+
+
+@stats_routes.route('/activities', methods=['GET'])
+def get_activity_stats():
+    """Get activity history aggregates per user, activity and period."""
+    return _rollup_stats(ActivityHistoryRollup, 'activity_id')
+
+
+@stats_routes.route('/playlists', methods=['GET'])
+def get_playlist_stats():
+    """Get playlist performance aggregates per user, playlist and period."""
+    return _rollup_stats(PlaylistPerformanceRollup, 'playlist_id')
+
+
+@stats_routes.route('/metrics', methods=['GET'])
+def get_metric_stats():
+    """Aggregate a typed JSON field per period, in SQL."""
+    source = request.args.get('source')
+    if source not in METRIC_SOURCES:
+        return jsonify({'error': f"source must be one of: {', '.join(METRIC_SOURCES)}"}), 400
+    model, day_args = METRIC_SOURCES[source]
+    
+    fields = JSON_FIELDS[model][1]
+    field = request.args.get('field')
+    if field not in fields:
+        return jsonify({'error': f"field must be one of: {', '.join(fields)}"}), 400
+    if not has_column(model.__tablename__, json_field_name(model, field)):
+        return jsonify({'error': 'Typed JSON fields are not available for this database'}), 503
+    column = json_field(model, field)
+    
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        return jsonify({'error': f"period must be one of: {', '.join(PERIODS)}"}), 400
+    
+    try:
+        start = _date_arg('from')
+        end = _date_arg('to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    day = func.date(*day_args())
+    period_start = day if period == 'day' else func.date(day, 'weekday 0', '-6 days')
+    
+    query = db.session.query(
+        period_start,
+        func.count(column),
+        func.avg(column),
+        func.min(column),
+        func.max(column),
+        func.sum(column),
+    ).filter(column.isnot(None))
+    if start:
+        query = query.filter(day >= start)
+    if end:
+        query = query.filter(day <= end)
+    user_id = request.args.get('user_id', type=int)
+    if user_id is not None:
+        query = query.filter(model.user_id == user_id)
+    
+    rows = query.group_by(period_start).order_by(period_start).all()
+    return jsonify([{
+        'period': period,
+        'period_start': start_date,
+        'count': count,
+        'avg': avg,
+        'min': minimum,
+        'max': maximum,
+        'sum': total
+    } for start_date, count, avg, minimum, maximum, total in rows])
@@ -1,10 +1,17 @@
 from flask import Blueprint, jsonify, request
+from sqlalchemy.orm import joinedload
 from ..models import db, Tag, ActivityTag
+from ..models.loaders import activity_options
+from ..models.serializer import serializer_options
+from ..pagination import collection_response
+from ..caching import conditional_get
+from ..entity_cache import exists_or_404
 
 tag_routes = Blueprint('tag_routes', __name__)
 
 
 @tag_routes.route('/', methods=['GET'])
+@conditional_get(Tag)
 def get_tags():
     """Get all tags."""
     tag_type = request.args.get('type')
@@ -15,11 +22,11 @@ def get_tags():
     if tag_type:
         query = query.filter(Tag.type == tag_type)
     
-    tags = query.all()
-    return jsonify([tag.to_dict() for tag in tags])
+    return collection_response(query, Tag)
 
 
 @tag_routes.route('/<int:tag_id>', methods=['GET'])
+@conditional_get(Tag)
 def get_tag(tag_id):
     """Get a specific tag by ID."""
     tag = Tag.query.get_or_404(tag_id)
@@ -86,13 +93,16 @@ def delete_tag(tag_id):
 @tag_routes.route('/<int:tag_id>/activities', methods=['GET'])
 def get_tag_activities(tag_id):
     """Get all activities for a tag."""
-    Tag.query.get_or_404(tag_id)  # Verify tag exists
+    exists_or_404(Tag, tag_id)  # Verify tag exists
     
-    activity_tags = ActivityTag.query.filter_by(tag_id=tag_id).all()
+    options = serializer_options(request.args)
+    activity_tags = ActivityTag.query.filter_by(tag_id=tag_id).options(
+        joinedload(ActivityTag.activity).options(*activity_options(**options))
+    ).all()
     
     result = []
     for at in activity_tags:
         if at.activity:
-            result.append(at.activity.to_dict())
+            result.append(at.activity.to_dict(**options))
     
     return jsonify(result)
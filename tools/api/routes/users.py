@@ -1,5 +1,8 @@
 from flask import Blueprint, jsonify, request
 from ..models import db, User
+from ..models.serializer import serializer_options
+from ..pagination import collection_response
+from ..entity_cache import exists_or_404
 
 user_routes = Blueprint('user_routes', __name__)
 
@@ -7,8 +10,7 @@ user_routes = Blueprint('user_routes', __name__)
 @user_routes.route('/', methods=['GET'])
 def get_users():
     """Get all users."""
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    return collection_response(User.query, User)
 
 
 @user_routes.route('/<int:user_id>', methods=['GET'])
@@ -83,7 +85,7 @@ def delete_user(user_id):
 @user_routes.route('/<int:user_id>/activities', methods=['GET'])
 def get_user_activities(user_id):
     """Get all activities performed by a user."""
-    User.query.get_or_404(user_id)  # Verify user exists
+    exists_or_404(User, user_id)  # Verify user exists
     
     from ..models import UserActivity
     activities = UserActivity.query.filter_by(user_id=user_id).all()
@@ -93,18 +95,21 @@ def get_user_activities(user_id):
 @user_routes.route('/<int:user_id>/playlists', methods=['GET'])
 def get_user_playlists(user_id):
     """Get all playlists created by a user."""
-    User.query.get_or_404(user_id)  # Verify user exists
+    exists_or_404(User, user_id)  # Verify user exists
     
     from ..models import Playlist
-    playlists = Playlist.query.filter_by(user_id=user_id).all()
-    return jsonify([playlist.to_dict() for playlist in playlists])
+    from ..models.loaders import playlist_options
+    options = serializer_options(request.args)
+    playlists = Playlist.query.filter_by(user_id=user_id).options(*playlist_options(**options)).all()
+    return jsonify([playlist.to_dict(**options) for playlist in playlists])
 
 
 @user_routes.route('/<int:user_id>/skills', methods=['GET'])
 def get_user_skills(user_id):
     """Get all skills and their progress for a user."""
-    User.query.get_or_404(user_id)  # Verify user exists
+    exists_or_404(User, user_id)  # Verify user exists
     
     from ..models import UserSkillProgress
-    skills = UserSkillProgress.query.filter_by(user_id=user_id).all()
+    from ..models.loaders import skill_progress_options
+    skills = UserSkillProgress.query.filter_by(user_id=user_id).options(*skill_progress_options()).all()
     return jsonify([skill.to_dict() for skill in skills])
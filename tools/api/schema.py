@@ -0,0 +1,26 @@
+from sqlalchemy import inspect
+from .models import db
+
+_tables = {}
+_columns = {}
+
+
+def has_table(name):
+    """
+    Check (once per database) whether a table exists.
+
+    Used for the optional tables schema_utils adds on top of schema.sql, so
+    the API keeps working against databases created without them.
+    """
+    url = str(db.engine.url)
+    if url not in _tables:
+        _tables[url] = set(inspect(db.engine).get_table_names())
+    return name in _tables[url]
+
+
+def has_column(table, column):
+    """Check (once per database and table) whether a table has a column."""
+    key = (str(db.engine.url), table)
+    if key not in _columns:
+        _columns[key] = {c['name'] for c in inspect(db.engine).get_columns(table)} if has_table(table) else set()
+    return column in _columns[key]
@@ -0,0 +1,54 @@
+import re
+from sqlalchemy import column, func, literal_column, table
+from .models import db, Activity
+from .schema import has_table
+
+# Relative bm25 weights for the activity_search columns:
+# name, description, tags, body_areas
+ACTIVITY_SEARCH_WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+
+activity_search = table('activity_search', column('rowid'))
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(search_query):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so 'box bre' matches
+    'Box Breathing'. Terms are ANDed together.
+
+    Returns:
+        str: MATCH expression, or None if the text has no searchable words
+    """
+    tokens = _TOKEN_RE.findall(search_query)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_activities(query, search_query):
+    """
+    Filter an Activity query by free text, ranked by relevance.
+
+    Uses the activity_search FTS5 index (name, description, tag names and
+    body area names) with BM25 ranking when it exists, and falls back to a
+    LIKE scan on name and description for databases created without it.
+    """
+    if not has_table('activity_search'):
+        return query.filter(Activity.name.ilike(f'%{search_query}%') |
+                            Activity.description.ilike(f'%{search_query}%'))
+
+    expression = match_expression(search_query)
+    if expression is None:
+        return query.filter(db.false())
+
+    search_table = literal_column('activity_search')
+    rank = func.bm25(search_table, *ACTIVITY_SEARCH_WEIGHTS)
+    return (
+        query
+        .join(activity_search, activity_search.c.rowid == Activity.id)
+        .filter(search_table.op('MATCH')(expression))
+        .order_by(rank)
+    )
@@ -0,0 +1,225 @@
+from collections import defaultdict
+from sqlalchemy import bindparam, text
+from .caching import table_versions
+from .models import db, SkillPrerequisite
+from .schema import has_table
+
+# Same definition as schema_utils.SKILL_AVAILABILITY_ROW: whether each
+# progress row's skill has all of its prerequisites met by that user.
+AVAILABILITY_ROW = """
+    SELECT
+        us.user_id,
+        us.skill_id,
+        NOT EXISTS (
+            SELECT 1 FROM skill_prerequisites sp
+            LEFT JOIN user_skill_progress p
+                ON p.user_id = us.user_id AND p.skill_id = sp.prerequisite_skill_id
+            WHERE sp.skill_id = us.skill_id
+              AND NOT coalesce(p.mastery_level >= sp.required_mastery_level, FALSE)
+        ) AS is_available
+    FROM user_skill_progress us
+"""
+
+_UPSERT = """
+INSERT INTO user_skill_availability (user_id, skill_id, is_available)
+{row} WHERE {where}
+ON CONFLICT (user_id, skill_id) DO UPDATE SET is_available = excluded.is_available
+"""
+
+_refresh_user_skills = text(
+    _UPSERT.format(row=AVAILABILITY_ROW, where='us.user_id = :user_id AND us.skill_id IN :skill_ids')
+).bindparams(bindparam('skill_ids', expanding=True))
+
+_refresh_skills = text(
+    _UPSERT.format(row=AVAILABILITY_ROW, where='us.skill_id IN :skill_ids')
+).bindparams(bindparam('skill_ids', expanding=True))
+
+_delete_skill = text("DELETE FROM user_skill_availability WHERE skill_id = :skill_id")
+
+_available_skills = text("""
+    SELECT s.id AS skill_id, s.name AS skill_name, s.difficulty, us.mastery_level, a.is_available
+    FROM user_skill_availability a
+    JOIN user_skill_progress us ON us.user_id = a.user_id AND us.skill_id = a.skill_id
+    JOIN activity_skills s ON s.id = a.skill_id
+    WHERE a.user_id = :user_id
+    ORDER BY s.id
+""")
+
+_computed_available_skills = text(f"""
+    SELECT s.id AS skill_id, s.name AS skill_name, s.difficulty, us.mastery_level, a.is_available
+    FROM ({AVAILABILITY_ROW} WHERE us.user_id = :user_id) a
+    JOIN user_skill_progress us ON us.user_id = a.user_id AND us.skill_id = a.skill_id
+    JOIN activity_skills s ON s.id = a.skill_id
+    ORDER BY s.id
+""")
+
+_graphs = {}
+
+
+def prerequisite_met(mastery_level, required_mastery_level):
+    """Same test as the availability SQL: a missing level never meets a requirement."""
+    return (mastery_level is not None and required_mastery_level is not None
+            and mastery_level >= required_mastery_level)
+
+
+class SkillGraph:
+    """
+    In-memory prerequisite DAG built from skill_prerequisites.
+
+    ``prerequisites`` maps a skill id to {prerequisite skill id: required
+    mastery level} and ``dependents`` maps a skill id to the ids of the
+    skills listing it as a prerequisite.
+    """
+
+    def __init__(self, edges):
+        self.prerequisites = defaultdict(dict)
+        self.dependents = defaultdict(set)
+        for skill_id, prerequisite_skill_id, required_mastery_level in edges:
+            self.prerequisites[skill_id][prerequisite_skill_id] = required_mastery_level
+            self.dependents[prerequisite_skill_id].add(skill_id)
+        self._ancestors = {}
+
+    def ancestors(self, skill_id):
+        """
+        Get every skill that must be learned before ``skill_id``, directly or
+        transitively, with its distance in prerequisite hops. Computed once
+        per graph with a breadth-first walk, so O(edges).
+
+        Returns:
+            dict: ancestor skill id -> depth (1 for direct prerequisites)
+        """
+        if skill_id not in self._ancestors:
+            depths = {}
+            frontier = [skill_id]
+            depth = 0
+            while frontier:
+                depth += 1
+                next_frontier = []
+                for node in frontier:
+                    for prerequisite_skill_id in self.prerequisites.get(node, ()):
+                        if prerequisite_skill_id not in depths and prerequisite_skill_id != skill_id:
+                            depths[prerequisite_skill_id] = depth
+                            next_frontier.append(prerequisite_skill_id)
+                frontier = next_frontier
+            self._ancestors[skill_id] = depths
+        return self._ancestors[skill_id]
+
+    def creates_cycle(self, skill_id, prerequisite_skill_id):
+        """Check whether making ``prerequisite_skill_id`` a prerequisite of ``skill_id`` would close a cycle."""
+        return skill_id == prerequisite_skill_id or skill_id in self.ancestors(prerequisite_skill_id)
+
+    def unlock_path(self, skill_id, mastery):
+        """
+        Get the skills a user still has to master before ``skill_id`` becomes
+        available, in an order where every skill comes after its own
+        prerequisites.
+
+        Prerequisites the user already meets are not expanded further, so
+        the result is the smallest set of skills to work on. A skill
+        required by several others has to reach the highest of their
+        required levels.
+
+        Args:
+            skill_id: Skill to unlock
+            mastery: dict of skill id -> the user's current mastery level
+
+        Returns:
+            list: (skill id, required mastery level) tuples
+        """
+        required = {}
+        frontier = [skill_id]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for prerequisite_skill_id, level in self.prerequisites.get(node, {}).items():
+                    if prerequisite_met(mastery.get(prerequisite_skill_id), level):
+                        continue
+                    if prerequisite_skill_id not in required:
+                        next_frontier.append(prerequisite_skill_id)
+                    previous = required.get(prerequisite_skill_id)
+                    required[prerequisite_skill_id] = level if previous is None else max(previous, level or 0)
+            frontier = next_frontier
+        required.pop(skill_id, None)
+
+        # Kahn's algorithm over the required skills, prerequisites first
+        pending = {
+            node: sum(1 for prerequisite in self.prerequisites.get(node, ()) if prerequisite in required)
+            for node in required
+        }
+        ready = sorted(node for node, count in pending.items() if count == 0)
+        path = []
+        while ready:
+            node = ready.pop()
+            path.append((node, required[node]))
+            for dependent in self.dependents.get(node, ()):
+                if dependent in pending:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        ready.append(dependent)
+        return path
+
+    @classmethod
+    def load(cls):
+        return cls(db.session.query(
+            SkillPrerequisite.skill_id,
+            SkillPrerequisite.prerequisite_skill_id,
+            SkillPrerequisite.required_mastery_level,
+        ))
+
+
+def skill_graph():
+    """
+    Get the prerequisite graph, rebuilt only when the skill_prerequisites
+    version counter has moved (on every call for databases without
+    table_versions). Load it before changing prerequisites in the same
+    transaction so the cached graph always matches a committed version.
+    """
+    versions = table_versions(['skill_prerequisites'])
+    if versions is None:
+        return SkillGraph.load()
+
+    url = str(db.engine.url)
+    version = versions['skill_prerequisites']
+    cached = _graphs.get(url)
+    if cached is None or cached[0] != version:
+        cached = _graphs[url] = (version, SkillGraph.load())
+    return cached[1]
+
+
+def refresh_user_skill(user_id, skill_id):
+    """
+    Recompute a user's availability after their mastery of a skill changed.
+
+    Only the skill itself (for a new progress row) and the skills that list
+    it as a prerequisite can change, so only those rows are touched.
+    """
+    if not has_table('user_skill_availability'):
+        return
+    skill_ids = {skill_id} | skill_graph().dependents.get(skill_id, set())
+    db.session.flush()
+    db.session.execute(_refresh_user_skills, {'user_id': user_id, 'skill_ids': list(skill_ids)})
+
+
+def refresh_skills(skill_ids):
+    """Recompute availability of the given skills for every user, after their prerequisites changed."""
+    if not skill_ids or not has_table('user_skill_availability'):
+        return
+    db.session.flush()
+    db.session.execute(_refresh_skills, {'skill_ids': list(skill_ids)})
+
+
+def delete_skill_availability(skill_id):
+    """Drop the availability rows of a deleted skill."""
+    if has_table('user_skill_availability'):
+        db.session.execute(_delete_skill, {'skill_id': skill_id})
+
+
+def available_skills(user_id):
+    """
+    Get the skills a user has progress on and whether each is available.
+
+    Reads the precomputed user_skill_availability table, or computes the
+    same rows on the fly for databases created without it.
+    """
+    query = _available_skills if has_table('user_skill_availability') else _computed_available_skills
+    return db.session.execute(query, {'user_id': user_id}).fetchall()
@@ -1,8 +1,11 @@
 from typing import Optional, List
 from supabase import Client, create_client
-from gqlalchemy import Memgraph, Node, Relationship, Field, match, create
+from gqlalchemy import Memgraph, Node, Relationship, Field
+from gqlalchemy.models import MemgraphConstraintUnique, MemgraphIndex
+import argparse
 import json
 import os
+import time
 from dotenv import load_dotenv
 from relational_db.supabase_client import upload_directory
 
@@ -51,6 +54,123 @@ class OfType(Relationship, type="OF_TYPE"):
     pass
 
 
+# Keys every sync query looks nodes up by. Memgraph only uses label-property
+# indexes to find nodes, and uniqueness constraints do not create one, so
+# each key gets both: the index for MATCH/MERGE lookups, the constraint so
+# concurrent MERGEs cannot create duplicates.
+GRAPH_INDEXES = [
+    ("Activity", "name"),
+    ("MediaType", "name"),
+    ("Guide", "url"),
+    ("Guide", "name"),
+]
+GRAPH_UNIQUE_CONSTRAINTS = GRAPH_INDEXES
+
+
+def missing_graph_schema() -> tuple:
+    """
+    Compare the indexes and uniqueness constraints in Memgraph with
+    GRAPH_INDEXES and GRAPH_UNIQUE_CONSTRAINTS.
+
+    Returns:
+        tuple: (missing indexes, missing constraints) as (label, property) lists
+    """
+    indexes = {(index.label, index.property) for index in db.get_indexes()}
+    constraints = set()
+    for constraint in db.get_constraints():
+        if isinstance(constraint, MemgraphConstraintUnique):
+            properties = constraint.property
+            if isinstance(properties, str):
+                properties = (properties,)
+            if len(properties) == 1:
+                constraints.add((constraint.label, properties[0]))
+    return ([key for key in GRAPH_INDEXES if key not in indexes],
+            [key for key in GRAPH_UNIQUE_CONSTRAINTS if key not in constraints])
+
+
+def bootstrap_graph_schema():
+    """
+    Create the missing indexes and uniqueness constraints, then check that
+    they are all in place. Run on startup, before any sync query.
+
+    Raises:
+        RuntimeError: If an index or constraint could not be created, e.g.
+            because existing nodes have duplicate keys
+    """
+    missing_indexes, missing_constraints = missing_graph_schema()
+    for label, property in missing_indexes:
+        print(f"Creating index on :{label}({property})")
+        db.create_index(MemgraphIndex(label, property))
+    for label, property in missing_constraints:
+        print(f"Creating uniqueness constraint on :{label}({property})")
+        try:
+            db.create_constraint(MemgraphConstraintUnique(label, (property,)))
+        except Exception as e:
+            print(f"Could not create uniqueness constraint on :{label}({property}): {str(e)}")
+
+    missing_indexes, missing_constraints = missing_graph_schema()
+    if missing_indexes or missing_constraints:
+        raise RuntimeError(
+            "Graph schema incomplete, missing indexes: "
+            f"{[f':{label}({property})' for label, property in missing_indexes]}, "
+            "missing uniqueness constraints: "
+            f"{[f':{label}({property})' for label, property in missing_constraints]}")
+
+
+# Media records sent per query by sync_media_batch
+SYNC_BATCH_SIZE = 1000
+
+# Upsert a batch of media records: each row's Activity, MediaType and Guide
+# are merged on their unique keys and linked, in one round trip per batch.
+# Activities and media types keep their properties once created; guides are
+# updated from the latest media record.
+MEDIA_SYNC_QUERY = """
+UNWIND $rows AS row
+MERGE (a:Activity {name: row.activity_name})
+ON CREATE SET a.description = row.activity_description,
+              a.duration = row.duration,
+              a.difficulty = 'beginner'
+MERGE (mt:MediaType {name: row.media_type})
+ON CREATE SET mt.formats = [row.format]
+MERGE (g:Guide {url: row.url})
+SET g.name = row.guide_name,
+    g.title = row.guide_name,
+    g.uploadedAt = row.uploaded_at,
+    g.format = row.format,
+    g.fileSize = row.file_size,
+    g.duration = row.duration,
+    g.content = row.content
+MERGE (g)-[:OF_TYPE]->(mt)
+MERGE (a)-[:HAS_GUIDE]->(g)
+"""
+
+# The same upsert for one media record linked to an existing Activity,
+# returning no row if there is no Activity of that name
+GUIDE_SYNC_QUERY = """
+MATCH (a:Activity {name: $activity_name})
+MERGE (mt:MediaType {name: $media_type})
+ON CREATE SET mt.formats = [$format]
+MERGE (g:Guide {url: $url})
+SET g.name = $guide_name,
+    g.title = $guide_name,
+    g.uploadedAt = $uploaded_at,
+    g.format = $format,
+    g.fileSize = $file_size,
+    g.duration = $duration,
+    g.content = $content
+MERGE (g)-[:OF_TYPE]->(mt)
+MERGE (a)-[:HAS_GUIDE]->(g)
+RETURN g.url AS url
+"""
+
+ACTIVITY_SYNC_QUERY = """
+MERGE (a:Activity {name: $activity_name})
+ON CREATE SET a.description = $activity_description,
+              a.duration = $duration,
+              a.difficulty = 'beginner'
+"""
+
+
 def get_media_by_id(supabase_client: Client, media_id: int) -> Optional[dict]:
     """
     Retrieve a media record from Supabase by ID.
@@ -84,161 +204,12 @@ def create_guide_from_media(media_record: dict, activity_name: str) -> bool:
     Returns:
         bool: True if successful, False otherwise
     """
-    print(
-        f"Creating guide from media record: {media_record} and activity name: {activity_name}")
     try:
-        # Parse metadata from JSON string
-        metadata = json.loads(media_record.get("metadata", "{}"))
-        print(f"Metadata: {metadata}")
-        # Get Activity using direct query
-        activity_query = f"""
-        MATCH (a:Activity)
-        WHERE a.name = '{activity_name}'
-        RETURN a.name as name, id(a) as id
-        """
-        print(f"Activity Query: {activity_query}")
-        activity_result = db.execute_and_fetch(
-            activity_query)
-        try:
-            activity_data = next(activity_result)
-            activity_id = activity_data["id"]
-        except StopIteration:
+        row = media_sync_row(media_record)
+        result = next(db.execute_and_fetch(GUIDE_SYNC_QUERY, {**row, "activity_name": activity_name}), None)
+        if result is None:
             print(f"Activity {activity_name} not found")
             return False
-        print(f"Activity ID: {activity_id}")
-        # Create or load MediaType
-        media_type_name = media_record.get("mime_type", "").split("/")[0]
-        print(f"Media Type Name: {media_type_name}")
-        media_type = MediaType(name=media_type_name).load(db)
-        media_type_id = media_type._id
-        # try:
-        #     media_type = MediaType(name=media_type_name).load(db)
-        #     media_type_id = media_type._id
-        # except:
-        #     media_type = MediaType(
-        #         name=media_type_name,
-        #         formats=[media_record.get("mime_type", "").split("/")[-1]]
-        #     ).save(db)
-        #     media_type_id = media_type._id
-        print(f"Media Type ID: {media_type_id}")
-        # Create or load Guide
-
-        guide_name = media_record.get("storage_path").split(".")[0]
-        try:
-            print(f"try updating existing Guide: {guide_name}")
-            guide = Guide(url=media_record["url"]).load(db)
-            # Update guide properties
-            guide.name = guide_name
-            guide.title = guide_name
-            guide.uploadedAt = media_record.get("created_at", "")
-            guide.format = media_record.get("mime_type", "").split("/")[-1]
-            guide.fileSize = metadata.get("filesize")
-            guide.duration = metadata.get("duration")
-            guide.content = media_record.get("description", "")
-            guide.save(db)
-            guide_id = guide._id
-        except:
-            print(f"try creating new Guide: {guide_name}")
-            guide = Guide(
-                url=media_record["url"],
-                name=guide_name,
-                title=guide_name,
-                uploadedAt=media_record.get("created_at", ""),
-                format=media_record.get("mime_type", "").split("/")[-1],
-                fileSize=metadata.get("filesize"),
-                duration=metadata.get("duration"),
-                content=media_record.get("description", "")
-            ).save(db)
-            guide_id = guide._id
-        print(f"Guide ID: {guide_id}")
-        # Verify we have all required IDs
-        if not all([activity_id, media_type_id, guide_id]):
-            print("Missing required node IDs")
-            return False
-
-        # Create relationships using direct queries
-        try:
-            # Check if OF_TYPE relationship exists
-            of_type_check = """
-            MATCH (g:Guide)-[r:OF_TYPE]->(mt:MediaType)
-            WHERE id(g) = $guide_id AND id(mt) = $media_type_id
-            RETURN count(r) as count
-            """
-            result = db.execute_and_fetch(of_type_check, {
-                "guide_id": guide_id,
-                "media_type_id": media_type_id
-            })
-            result = next(result)
-            print(f"OF_TYPE check result: {result}")
-            if result["count"] == 0:
-                print(
-                    f"Creating OF_TYPE relationship for {guide_name} and {media_type_name}")
-                # Create OF_TYPE relationship
-                # of_type_create = """
-                # MATCH (g:Guide), (mt:MediaType)
-                # WHERE id(g) = $guide_id AND id(mt) = $media_type_id
-                # CREATE (g)-[:OF_TYPE]->(mt)
-                # """
-                # db.execute_and_fetch(of_type_create, {
-                #     "guide_id": guide_id,
-                #     "media_type_id": media_type_id
-                # })
-                query = (
-                    match()
-                    .node(labels="Guide", name=guide_name, variable="g")
-                    .match()
-                    .node(labels="MediaType", name=media_type_name, variable="mt")
-                    .create()
-                    .node(variable="g")
-                    .to(relationship_type="OF_TYPE")
-                    .node(variable="mt")
-                    .execute()
-                )
-                print(f"OF_TYPE create result: {query}")
-            # Check if HAS_GUIDE relationship exists
-            has_guide_check = """
-            MATCH (a:Activity)-[r:HAS_GUIDE]->(g:Guide)
-            WHERE id(a) = $activity_id AND id(g) = $guide_id
-            RETURN count(r) as count
-            """
-            result = db.execute_and_fetch(has_guide_check, {
-                "activity_id": activity_id,
-                "guide_id": guide_id
-            })
-            result = next(result)
-            print(f"HAS_GUIDE check result: {result}")
-            if result["count"] == 0:
-                print(
-                    f"Creating HAS_GUIDE relationship for {activity_name} and {guide_name}")
-                # match().node(labels="User", id=0, variable="u").match().node(labels="Movie", id=0, variable="m").create().node(variable="u").to(edge_label="RATED", rating=5.0).node(variable="m").execute()
-                # Create HAS_GUIDE relationship
-                # has_guide_create = """
-                # MATCH (a:Activity), (g:Guide)
-                # WHERE id(a) = $activity_id AND id(g) = $guide_id
-                # CREATE (a)-[:HAS_GUIDE]->(g)
-                # """
-                # result = db.execute_and_fetch(has_guide_create, {
-                #     "activity_id": activity_id,
-                #     "guide_id": guide_id
-                # })
-                # print(f"HAS_GUIDE create result: {next(result)}")
-                query = (
-                    match()
-                    .node(labels="Activity", name=activity_name, variable="a")
-                    .match()
-                    .node(labels="Guide", name=guide_name, variable="g")
-                    .create()
-                    .node(variable="a")
-                    .to(relationship_type="HAS_GUIDE")
-                    .node(variable="g")
-                    .execute()
-                )
-                print(f"HAS_GUIDE create result: {query}")
-
-        except Exception as e:
-            print(f"Error creating relationships: {str(e)}")
-            return False
-
         return True
     except Exception as e:
         print(f"Error creating guide from media: {str(e)}")
@@ -289,30 +260,16 @@ def upload_activity_from_media(media_record: dict):
     """
     Upload an activity from a media record.
     """
-    # Extract filename without extension for activity name
-    filename = os.path.basename(media_record["storage_path"])
-    activity_name = os.path.splitext(filename)[0]
+    row = media_sync_row(media_record)
+    activity_name = row["activity_name"]
 
-    metadata = json.loads(media_record.get("metadata", "{}"))
-    duration = metadata.get("duration")
     # Create Activity node if it doesn't exist
-    try:
-        activity = Activity(name=activity_name).load(db)
-        print(f"Activity '{activity_name}' already exists")
-    except:
-        activity = Activity(
-            name=activity_name,
-            description=f"Activity for {activity_name}",
-            duration=duration,
-            difficulty="beginner"  # Default difficulty
-        ).save(db)
-        print(f"Created new Activity: {activity_name}")
-
-    # Step 4: Sync media to guide and link to activity
+    db.execute(ACTIVITY_SYNC_QUERY, row)
+
+    # Sync media to guide and link to activity
     print(
         f"Syncing media {media_record['id']} to guide for activity '{activity_name}'...")
-    success = sync_media_to_guide(
-        supabase_client, media_record["id"], activity_name)
+    success = create_guide_from_media(media_record, activity_name)
 
     if success:
         print(
@@ -320,7 +277,196 @@ def upload_activity_from_media(media_record: dict):
     else:
         print(
             f"Failed to sync media {media_record['id']} to guide for activity '{activity_name}'")
-    pass
+
+def media_sync_row(media_record: dict) -> dict:
+    """
+    Build the sync query parameters for a media record, naming the
+    Activity after the file and the Guide after its storage path.
+
+    Args:
+        media_record: Media record from Supabase
+
+    Returns:
+        dict: Query row
+    """
+    metadata = json.loads(media_record.get("metadata") or "{}")
+    mime_type = media_record.get("mime_type") or ""
+    storage_path = media_record["storage_path"]
+    activity_name = os.path.splitext(os.path.basename(storage_path))[0]
+    guide_name = storage_path.split(".")[0]
+    return {
+        "activity_name": activity_name,
+        "activity_description": f"Activity for {activity_name}",
+        "media_type": mime_type.split("/")[0],
+        "format": mime_type.split("/")[-1],
+        "url": media_record["url"],
+        "guide_name": guide_name,
+        "uploaded_at": media_record.get("created_at") or "",
+        "file_size": metadata.get("filesize"),
+        "duration": metadata.get("duration"),
+        "content": media_record.get("description") or "",
+    }
+
+
+def sync_media_batch(media_records: List[dict], batch_size: int = SYNC_BATCH_SIZE) -> tuple:
+    """
+    Sync media records to Memgraph as Activities, MediaTypes and Guides,
+    batch_size records per MEDIA_SYNC_QUERY. A batch that fails (e.g. on a
+    uniqueness constraint) is retried one record at a time, so one bad
+    record does not hold back the others.
+
+    Args:
+        media_records: Media records from Supabase
+        batch_size: Records sent per query
+
+    Returns:
+        tuple: (number of records synced, list of media ids that failed)
+    """
+    synced = 0
+    failed = []
+    rows = []
+    for media_record in media_records:
+        try:
+            rows.append((media_record["id"], media_sync_row(media_record)))
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Skipping media record {media_record.get('id')}: {str(e)}")
+            failed.append(media_record.get("id"))
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        try:
+            db.execute(MEDIA_SYNC_QUERY, {"rows": [row for _, row in batch]})
+            synced += len(batch)
+            continue
+        except Exception as e:
+            print(f"Batch of {len(batch)} media records failed, retrying one by one: {str(e)}")
+        for media_id, row in batch:
+            try:
+                db.execute(MEDIA_SYNC_QUERY, {"rows": [row]})
+                synced += 1
+            except Exception as e:
+                print(f"Failed to sync media {media_id}: {str(e)}")
+                failed.append(media_id)
+
+    return synced, failed
+
+
+# Incremental sync state: the (cursor column, id) of the last media record
+# synced, and the ids of records that failed and are retried next time
+MEDIA_SYNC_CHECKPOINT = os.environ.get("MEDIA_SYNC_CHECKPOINT", ".media_sync_checkpoint.json")
+# Column ordering media records by change. The media table only has
+# created_at, so only new records are picked up; point this at an
+# updated_at column maintained by a trigger to pick up edits as well.
+MEDIA_SYNC_CURSOR_COLUMN = os.environ.get("MEDIA_SYNC_CURSOR_COLUMN", "created_at")
+MEDIA_SYNC_PAGE_SIZE = 1000
+
+
+def load_checkpoint(path: str = MEDIA_SYNC_CHECKPOINT) -> dict:
+    """
+    Load the incremental sync checkpoint, or an empty one if there is none.
+
+    Returns:
+        dict: {"cursor": value or None, "id": int or None, "failed": [ids]}
+    """
+    try:
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        checkpoint = {}
+    return {"cursor": checkpoint.get("cursor"), "id": checkpoint.get("id"),
+            "failed": checkpoint.get("failed", [])}
+
+
+def save_checkpoint(checkpoint: dict, path: str = MEDIA_SYNC_CHECKPOINT):
+    """Write the checkpoint atomically, so an interrupted run leaves the previous one."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary_path, path)
+
+
+def fetch_media_page(supabase_client: Client, cursor, last_id, page_size: int = MEDIA_SYNC_PAGE_SIZE) -> List[dict]:
+    """
+    Fetch the next page of media records after (cursor, last_id), ordered
+    by MEDIA_SYNC_CURSOR_COLUMN then id. Keyset pagination keeps every page
+    an index range scan, however far into the table it is.
+
+    Args:
+        supabase_client: Supabase client instance
+        cursor: MEDIA_SYNC_CURSOR_COLUMN value of the last record synced, None to start over
+        last_id: ID of the last record synced
+        page_size: Maximum number of records to return
+
+    Returns:
+        list: Media records
+    """
+    column = MEDIA_SYNC_CURSOR_COLUMN
+    query = supabase_client.table("media").select("*")
+    if cursor is not None:
+        query = query.or_(f'{column}.gt."{cursor}",and({column}.eq."{cursor}",id.gt.{last_id})')
+    return query.order(column).order("id").limit(page_size).execute().data
+
+
+def sync_new_media(supabase_client: Client, checkpoint_path: str = MEDIA_SYNC_CHECKPOINT,
+                   page_size: int = MEDIA_SYNC_PAGE_SIZE) -> tuple:
+    """
+    Sync the media records added (or changed, see MEDIA_SYNC_CURSOR_COLUMN)
+    since the last run, a page at a time, then records that failed before.
+    The checkpoint is saved after every page, so an interrupted run resumes
+    where it stopped.
+
+    Args:
+        supabase_client: Supabase client instance
+        checkpoint_path: File holding the checkpoint
+        page_size: Media records fetched and synced at a time
+
+    Returns:
+        tuple: (number of records synced, list of media ids that failed)
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    synced = 0
+
+    # Retry the records that failed last time
+    retry_ids = checkpoint["failed"]
+    checkpoint["failed"] = []
+    if retry_ids:
+        records = supabase_client.table("media").select("*").in_("id", retry_ids).execute().data
+        retried, failed = sync_media_batch(records)
+        synced += retried
+        checkpoint["failed"].extend(failed)
+        save_checkpoint(checkpoint, checkpoint_path)
+
+    while True:
+        records = fetch_media_page(supabase_client, checkpoint["cursor"], checkpoint["id"], page_size)
+        if not records:
+            break
+        page_synced, failed = sync_media_batch(records)
+        synced += page_synced
+        checkpoint["failed"].extend(failed)
+        checkpoint["cursor"] = records[-1][MEDIA_SYNC_CURSOR_COLUMN]
+        checkpoint["id"] = records[-1]["id"]
+        save_checkpoint(checkpoint, checkpoint_path)
+        if len(records) < page_size:
+            break
+
+    return synced, checkpoint["failed"]
+
+
+def run_media_sync(supabase_client: Client, interval: float = 30,
+                   checkpoint_path: str = MEDIA_SYNC_CHECKPOINT):
+    """
+    Keep the graph in sync with the media table, checking for new records
+    every interval seconds until interrupted.
+    """
+    while True:
+        try:
+            synced, failed = sync_new_media(supabase_client, checkpoint_path)
+            if synced or failed:
+                print(f"Synced {synced} media records to guides, {len(failed)} failed")
+        except Exception as e:
+            print(f"Media sync failed, retrying in {interval}s: {str(e)}")
+        time.sleep(interval)
+
 
 # export PYTHON_PATH=/Users/artlings/Documents/GitHub/health-protocol/tools:$PYTHON_PATH
 
@@ -329,23 +475,35 @@ def main():
     """
     Main function demonstrating the usage of all methods.
     """
+    parser = argparse.ArgumentParser(description="Upload media and sync it to the graph as guides")
+    parser.add_argument("--skip-upload", action="store_true", help="Only sync, without uploading files first")
+    parser.add_argument("--full", action="store_true", help="Sync every media record, ignoring the checkpoint")
+    parser.add_argument("--watch", action="store_true", help="Keep syncing new media records")
+    parser.add_argument("--interval", type=float, default=30, help="Seconds between checks with --watch")
+    args = parser.parse_args()
+
+    # Indexes and constraints the sync queries rely on
+    bootstrap_graph_schema()
+
     # Directory containing files to upload
     directory_path = "video/upload"
     bucket_name = "video"
 
     # Step 1: Upload files to Supabase
-    print(f"Uploading files from {directory_path} to Supabase...")
-    upload_directory(directory_path, bucket_name)
-
-    # Step 2: Get all media records from Supabase
-    print("Retrieving media records from Supabase...")
-    media_records = supabase_client.table("media").select("*").execute().data
-
-    # Step 3: Process each media record
-    for media_record in media_records:
-        upload_activity_from_media(media_record)
+    if not args.skip_upload:
+        print(f"Uploading files from {directory_path} to Supabase...")
+        upload_directory(directory_path, bucket_name)
+
+    # Step 2: Sync the media records added since the last run to activities and guides
+    if args.full and os.path.exists(MEDIA_SYNC_CHECKPOINT):
+        os.remove(MEDIA_SYNC_CHECKPOINT)
+    if args.watch:
+        run_media_sync(supabase_client, args.interval)
+    else:
+        synced, failed = sync_new_media(supabase_client)
+        print(f"Synced {synced} media records to guides, {len(failed)} failed")
 
-    # Step 5: Audit the database
+    # Step 3: Audit the database
     # print("\nAuditing database...")
     # audit_database()
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark Guide lookups in Memgraph with and without the label-property
+index that core_data.bootstrap_graph_schema creates.
+
+Seeds --guides nodes under a scratch label (so the real Guide nodes are
+left alone), then times the lookups the media sync does, a MATCH on url
+and a MERGE upsert on url, first without an index and then with the index
+and uniqueness constraint. The scratch nodes, index and constraint are
+removed afterwards.
+
+    python graph_db/lookup_benchmark.py --guides 100_000
+"""
+import argparse
+import random
+import statistics
+import time
+from gqlalchemy import Memgraph
+
+SEED_QUERY = """
+UNWIND $rows AS row
+CREATE (:{label} {{url: row.url, name: row.name, format: 'mp4'}})
+"""
+
+LOOKUP_QUERIES = {
+    "match": "MATCH (g:{label} {{url: $url}}) RETURN g.name AS name",
+    "merge": "MERGE (g:{label} {{url: $url}}) SET g.format = 'mp4' RETURN g.name AS name",
+}
+
+
+def count_argument(value):
+    """Parse a positive count, allowing underscores (100_000)."""
+    count = int(value.replace("_", ""))
+    if count < 1:
+        raise argparse.ArgumentTypeError("must be positive")
+    return count
+
+
+def guide_url(number: int) -> str:
+    return f"https://example.com/storage/v1/object/public/video/guide-{number:07d}.mp4"
+
+
+def seed_guides(db: Memgraph, label: str, count: int, batch_size: int = 10000):
+    """Create count scratch guide nodes, batch_size per query."""
+    query = SEED_QUERY.format(label=label)
+    for start in range(0, count, batch_size):
+        rows = [{"url": guide_url(number), "name": f"guide-{number:07d}"}
+                for number in range(start, min(start + batch_size, count))]
+        db.execute(query, {"rows": rows})
+
+
+def time_lookups(db: Memgraph, query: str, urls: list) -> dict:
+    """
+    Run query once per url.
+
+    Returns:
+        dict: p50, p95 and p99 latency in milliseconds
+    """
+    latencies = []
+    for url in urls:
+        start = time.perf_counter()
+        list(db.execute_and_fetch(query, {"url": url}))
+        latencies.append((time.perf_counter() - start) * 1000)
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {"p50": percentiles[49], "p95": percentiles[94], "p99": percentiles[98]}
+
+
+def run_benchmark(db: Memgraph, label: str, guides: int, lookups: int, unindexed_lookups: int, seed: int):
+    rng = random.Random(seed)
+    urls = [guide_url(rng.randrange(guides)) for _ in range(lookups)]
+    results = []
+
+    print(f"Seeding {guides} :{label} nodes...")
+    start = time.perf_counter()
+    seed_guides(db, label, guides)
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    for name, query in LOOKUP_QUERIES.items():
+        results.append((name, "no index", time_lookups(db, query.format(label=label), urls[:unindexed_lookups])))
+
+    start = time.perf_counter()
+    db.execute(f"CREATE INDEX ON :{label}(url)")
+    db.execute(f"CREATE CONSTRAINT ON (g:{label}) ASSERT g.url IS UNIQUE")
+    print(f"Built index and constraint in {time.perf_counter() - start:.1f}s")
+
+    for name, query in LOOKUP_QUERIES.items():
+        results.append((name, "index", time_lookups(db, query.format(label=label), urls)))
+
+    print(f"\n{'query':<8}{'schema':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, schema, latency in results:
+        print(f"{name:<8}{schema:<10}{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}")
+
+
+def drop_scratch(db: Memgraph, label: str):
+    """Remove the scratch nodes, constraint and index, whichever exist."""
+    for query in (f"DROP CONSTRAINT ON (g:{label}) ASSERT g.url IS UNIQUE", f"DROP INDEX ON :{label}(url)"):
+        try:
+            db.execute(query)
+        except Exception:
+            pass
+    db.execute(f"MATCH (g:{label}) DETACH DELETE g")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Guide lookups with and without an index")
+    parser.add_argument("--guides", type=count_argument, default=100000, help="Guide nodes to seed")
+    parser.add_argument("--lookups", type=count_argument, default=2000, help="Lookups timed with the index")
+    parser.add_argument("--unindexed-lookups", type=count_argument, default=200,
+                        help="Lookups timed without the index, each of which scans every guide")
+    parser.add_argument("--label", default="BenchmarkGuide", help="Scratch label for the seeded nodes")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the looked up urls")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7687)
+    args = parser.parse_args()
+
+    db = Memgraph(host=args.host, port=args.port)
+    drop_scratch(db, args.label)
+    try:
+        run_benchmark(db, args.label, args.guides, args.lookups,
+                      min(args.unindexed_lookups, args.lookups), args.seed)
+    finally:
+        drop_scratch(db, args.label)
+
+
+if __name__ == "__main__":
+    main()
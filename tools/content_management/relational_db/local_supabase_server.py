@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the parts of Supabase the media ingest talks to, for
+testing upload_directory without a Supabase project or network:
+
+- storage uploads (POST /storage/v1/object/<bucket>/<path>), resumable
+  TUS uploads (/storage/v1/upload/resumable) and public downloads
+  (GET /storage/v1/object/public/<bucket>/<path>)
+- inserts into and selects from the media table (/rest/v1/media)
+
+Uploads can be throttled per request and in total, to see how the ingest
+behaves on a slow uplink, and every request can be delayed by a fixed
+latency. A share of resumable upload chunks can be made to fail halfway,
+dropping the connection, to exercise retries. Objects and rows are kept
+in memory.
+
+    python -m relational_db.local_supabase_server --port 54321 --bandwidth 10 --stream-bandwidth 2
+
+and point the client at it:
+
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=local.stand-in python ...
+"""
+import argparse
+import base64
+import json
+import random
+import socket
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+READ_CHUNK_SIZE = 64 * 1024
+RESUMABLE_PATH = "/storage/v1/upload/resumable"
+
+
+class Throttle:
+    """Token bucket limiting reads to rate bytes per second (None: unlimited)."""
+
+    def __init__(self, rate: float = None):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.available_at = time.monotonic()
+
+    def wait(self, size: int):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.available_at = max(self.available_at, now) + size / self.rate
+            delay = self.available_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SupabaseStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0, bandwidth: float = None, stream_bandwidth: float = None,
+                 fail_rate: float = 0, seed: int = 0):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.uplink = Throttle(bandwidth)
+        self.stream_bandwidth = stream_bandwidth
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.objects = {}
+        # Resumable uploads in progress: id -> {key, length, data}
+        self.uploads = {}
+        self.media = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def parse_multipart(body: bytes, content_type: str) -> dict:
+    """Split a multipart/form-data body into {field name: bytes}."""
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    fields = {}
+    for part in body.split(b"--" + boundary)[1:-1]:
+        headers, _, value = part[2:].partition(b"\r\n\r\n")
+        disposition = next(line for line in headers.decode().split("\r\n")
+                           if line.lower().startswith("content-disposition"))
+        name = disposition.split('name="', 1)[1].split('"', 1)[0]
+        fields[name] = value[:-2]
+    return fields
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, error: str, message: str):
+        self.send_json(status, {"statusCode": str(status), "error": error, "message": message})
+
+    def read_body(self, limit: int = None) -> bytes:
+        """Read the request body, or its first limit bytes, at the configured bandwidth."""
+        remaining = int(self.headers.get("Content-Length", 0))
+        if limit is not None:
+            remaining = min(remaining, limit)
+        stream = Throttle(self.server.stream_bandwidth)
+        chunks = []
+        while remaining:
+            chunk = self.rfile.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            self.server.uplink.wait(len(chunk))
+            stream.wait(len(chunk))
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def route(self):
+        time.sleep(self.server.latency)
+        parsed = urllib.parse.urlsplit(self.path)
+        return urllib.parse.unquote(parsed.path), urllib.parse.parse_qs(parsed.query)
+
+    def do_POST(self):
+        path, _ = self.route()
+        if path.startswith("/storage/v1/object/"):
+            self.upload_object(path[len("/storage/v1/object/"):])
+        elif path == RESUMABLE_PATH:
+            self.create_upload()
+        elif path == "/rest/v1/media":
+            self.insert_media()
+        else:
+            self.read_body()
+            self.send_error_json(404, "not_found", f"No route for POST {path}")
+
+    def do_GET(self):
+        path, query = self.route()
+        if path.startswith("/storage/v1/object/public/"):
+            key = path[len("/storage/v1/object/public/"):]
+            with self.server.lock:
+                data = self.server.objects.get(key)
+            if data is None:
+                self.send_error_json(404, "not_found", "Object not found")
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif path == "/rest/v1/media":
+            self.select_media(query)
+        else:
+            self.send_error_json(404, "not_found", f"No route for GET {path}")
+
+    def do_HEAD(self):
+        path, _ = self.route()
+        with self.server.lock:
+            upload = self.server.uploads.get(path[len(RESUMABLE_PATH) + 1:])
+            offset = len(upload["data"]) if upload else None
+        if offset is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Tus-Resumable", "1.0.0")
+        self.send_header("Upload-Offset", str(offset))
+        self.send_header("Upload-Length", str(upload["length"]))
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_PATCH(self):
+        path, _ = self.route()
+        upload_id = path[len(RESUMABLE_PATH) + 1:]
+        with self.server.lock:
+            upload = self.server.uploads.get(upload_id)
+        if upload is None:
+            self.read_body()
+            self.send_error_json(404, "not_found", "Upload not found")
+            return
+        if int(self.headers["Upload-Offset"]) != len(upload["data"]):
+            self.read_body()
+            self.send_error_json(409, "conflict", "Upload-Offset does not match the upload")
+            return
+
+        with self.server.lock:
+            fail = self.server.random.random() < self.server.fail_rate
+        if fail:
+            # Keep the first half of the chunk, as a dropped connection would
+            upload["data"] += self.read_body(int(self.headers.get("Content-Length", 0)) // 2)
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        upload["data"] += self.read_body()
+
+        if len(upload["data"]) >= upload["length"]:
+            with self.server.lock:
+                self.server.objects[upload["key"]] = bytes(upload["data"])
+        self.send_response(204)
+        self.send_header("Tus-Resumable", "1.0.0")
+        self.send_header("Upload-Offset", str(len(upload["data"])))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def create_upload(self):
+        self.read_body()
+        metadata = {}
+        for item in self.headers.get("Upload-Metadata", "").split(","):
+            name, _, value = item.strip().partition(" ")
+            metadata[name] = base64.b64decode(value).decode()
+        key = f"{metadata['bucketName']}/{metadata['objectName']}"
+        length = int(self.headers["Upload-Length"])
+        upload_id = uuid.uuid4().hex
+        with self.server.lock:
+            if key in self.server.objects and self.headers.get("x-upsert", "false") != "true":
+                self.send_error_json(409, "Duplicate", "The resource already exists")
+                return
+            self.server.uploads[upload_id] = {"key": key, "length": length, "data": bytearray()}
+            if not length:
+                self.server.objects[key] = b""
+        self.send_response(201)
+        self.send_header("Tus-Resumable", "1.0.0")
+        self.send_header("Location", f"{self.server.url}{RESUMABLE_PATH}/{upload_id}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def upload_object(self, key: str):
+        body = self.read_body()
+        upsert = self.headers.get("x-upsert", "false") == "true"
+        content_type = self.headers.get("Content-Type", "")
+        data = parse_multipart(body, content_type)["file"] if content_type.startswith("multipart/") else body
+        with self.server.lock:
+            if key in self.server.objects and not upsert:
+                self.send_error_json(409, "Duplicate", "The resource already exists")
+                return
+            self.server.objects[key] = data
+        self.send_json(200, {"Key": key, "Id": key})
+
+    def insert_media(self):
+        records = json.loads(self.read_body() or b"[]")
+        if isinstance(records, dict):
+            records = [records]
+        created_at = datetime.now(timezone.utc).isoformat()
+        with self.server.lock:
+            rows = []
+            for record in records:
+                row = {"id": len(self.server.media) + 1, "created_at": created_at, **record}
+                self.server.media.append(row)
+                rows.append(row)
+        self.send_json(201, rows)
+
+    def select_media(self, query: dict):
+        """Rows of the media table, with eq. filters and limit applied."""
+        with self.server.lock:
+            rows = list(self.server.media)
+        for column, values in query.items():
+            if column in ("select", "limit", "order", "or"):
+                continue
+            operator, _, value = values[0].partition(".")
+            if operator == "eq":
+                rows = [row for row in rows if str(row.get(column)) == value]
+        if "limit" in query:
+            rows = rows[:int(query["limit"][0])]
+        self.send_json(200, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for Supabase storage and the media table")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every request")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Total upload MB/s across all requests")
+    parser.add_argument("--stream-bandwidth", type=float, default=None, help="Upload MB/s of each request")
+    parser.add_argument("--fail-rate", type=float, default=0,
+                        help="Share of resumable upload chunks that fail halfway")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for which chunks fail")
+    args = parser.parse_args()
+
+    megabyte = 1024 * 1024
+    server = SupabaseStandIn(
+        (args.host, args.port), args.latency / 1000,
+        args.bandwidth * megabyte if args.bandwidth else None,
+        args.stream_bandwidth * megabyte if args.stream_bandwidth else None,
+        args.fail_rate, args.seed)
+    print(f"Serving on {server.url}, use SUPABASE_URL={server.url} SUPABASE_KEY=local.stand-in")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
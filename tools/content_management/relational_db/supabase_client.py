@@ -1,6 +1,14 @@
 import os
+import base64
+import hashlib
 import mimetypes
 import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Optional
+import httpx
 from moviepy import VideoFileClip
 from dotenv import load_dotenv
 from supabase import create_client, Client
@@ -15,6 +23,20 @@ url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 supabase_client: Client = create_client(url, key)
 
+# Resumable (TUS) uploads. Supabase storage requires 6 MB chunks.
+RESUMABLE_UPLOAD_URL = f"{url}/storage/v1/upload/resumable"
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+# Attempts per chunk before giving up, with exponential backoff between them
+UPLOAD_RETRIES = 5
+RETRY_BACKOFF = 1.0
+tus_client = httpx.Client(
+    headers={"Authorization": f"Bearer {key}", "apikey": key, "Tus-Resumable": "1.0.0"},
+    timeout=httpx.Timeout(60, connect=10))
+
+# Uploaded files by bucket and SHA-256 of their content, so upload_directory
+# skips files it already uploaded and resumes interrupted uploads
+MEDIA_UPLOAD_MANIFEST = os.environ.get("MEDIA_UPLOAD_MANIFEST", ".media_upload_manifest.json")
+
 
 def get_all_countries():
     data = supabase_client.table("countries").select("*").execute()
@@ -77,6 +99,97 @@ def upload_file(file_path: str, file_name: str, bucket_name: str, mime_type: str
         return response
 
 
+def create_resumable_upload(file_name: str, bucket_name: str, mime_type: str, size: int) -> str:
+    """
+    Start a resumable upload of size bytes to bucket_name/file_name.
+
+    Returns:
+        str: URL of the upload, to send the file's chunks to
+    """
+    metadata = {"bucketName": bucket_name, "objectName": file_name, "contentType": mime_type,
+                "cacheControl": "3600"}
+    response = tus_client.post(RESUMABLE_UPLOAD_URL, headers={
+        "Upload-Length": str(size),
+        "Upload-Metadata": ",".join(f"{name} {base64.b64encode(value.encode()).decode()}"
+                                    for name, value in metadata.items()),
+    })
+    response.raise_for_status()
+    return urllib.parse.urljoin(RESUMABLE_UPLOAD_URL, response.headers["Location"])
+
+
+def resumable_upload_offset(upload_url: str) -> Optional[int]:
+    """
+    Get how many bytes of a resumable upload the server has.
+
+    Returns:
+        int: Offset to continue from, None if the upload expired or is unknown
+    """
+    response = tus_client.head(upload_url)
+    if response.status_code in (404, 410):
+        return None
+    response.raise_for_status()
+    return int(response.headers["Upload-Offset"])
+
+
+def upload_file_resumable(file_path: str, file_name: str, bucket_name: str, mime_type: str,
+                          upload_url: Optional[str] = None, on_created=None,
+                          chunk_size: int = UPLOAD_CHUNK_SIZE, retries: int = UPLOAD_RETRIES) -> str:
+    """
+    Upload a file to Supabase storage in chunks, resuming from where the
+    server got to when a chunk fails.
+
+    Args:
+        file_path (str): Path to the file to upload
+        file_name (str): Name to give the file in storage
+        bucket_name (str): Name of the Supabase storage bucket
+        mime_type (str): MIME type of the file
+        upload_url (str): URL of an earlier upload of the file to resume
+        on_created: Called with the URL of a new upload before any chunk is
+            sent, so it can be saved and resumed later
+        chunk_size (int): Bytes sent per request
+        retries (int): Attempts per chunk before giving up
+
+    Returns:
+        str: URL of the completed upload
+    """
+    size = os.path.getsize(file_path)
+    offset = resumable_upload_offset(upload_url) if upload_url else None
+    if offset is None:
+        upload_url = create_resumable_upload(file_name, bucket_name, mime_type, size)
+        if on_created:
+            on_created(upload_url)
+        offset = 0
+
+    failures = 0
+    with open(file_path, "rb") as f:
+        while offset is None or offset < size:
+            try:
+                if offset is None:
+                    # Find out how much of the failed chunk arrived
+                    offset = resumable_upload_offset(upload_url)
+                    if offset is None:
+                        raise RuntimeError(f"Upload of {file_name} expired")
+                    continue
+                f.seek(offset)
+                response = tus_client.patch(upload_url, content=f.read(chunk_size), headers={
+                    "Upload-Offset": str(offset),
+                    "Content-Type": "application/offset+octet-stream",
+                })
+                response.raise_for_status()
+                offset = int(response.headers["Upload-Offset"])
+                failures = 0
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                failures += 1
+                if failures >= retries or (status is not None and status < 500 and status != 409):
+                    raise
+                delay = RETRY_BACKOFF * 2 ** (failures - 1)
+                print(f"Upload of {file_name} failed at byte {offset}, retrying in {delay:g}s: {str(e)}")
+                time.sleep(delay)
+                offset = None
+    return upload_url
+
+
 def get_public_url(file_name: str, bucket_name: str):
     response = supabase_client.storage.from_(
         bucket_name).get_public_url(file_name)
@@ -84,7 +197,9 @@ def get_public_url(file_name: str, bucket_name: str):
     url = response.split("://")
     protocol = url[0]
     [path, query] = url[1].split("?")
-    return protocol+'://'+urllib.parse.quote(path)+'?'+query
+    # Quote the object path only, keeping a host:port as is
+    host, _, path = path.partition("/")
+    return protocol+'://'+host+'/'+urllib.parse.quote(path)+'?'+query
 
 
 def insert_media(mime_type: str, storage_path: str, url: str, metadata: dict):
@@ -99,48 +214,317 @@ def insert_media(mime_type: str, storage_path: str, url: str, metadata: dict):
     return query
 
 
-def upload_directory(directory_path: str, bucket_name: str):
+def file_sha256(file_path: str) -> str:
+    """Hex SHA-256 of a file's content, read a megabyte at a time."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadManifest:
+    """
+    Local record of uploads by bucket and SHA-256 of the file content, saved
+    after every change. Each entry holds the names the content was found
+    under, its status (uploading, uploaded or inserted), the storage path,
+    the resumable upload URL and the id of its media row.
     """
-    Upload all files from a directory to Supabase storage.
 
-    Args:
-        directory_path (str): Path to the directory containing files to upload
-        bucket_name (str): Name of the Supabase storage bucket
+    def __init__(self, path: str = MEDIA_UPLOAD_MANIFEST):
+        self.path = path
+        self.lock = threading.Lock()
+        # (bucket, digest) -> name of the file of this run uploading it
+        self.claimed = {}
+        self.buckets = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.buckets = json.load(f)
+
+    def save(self):
+        """Write the manifest atomically, so an interrupted run leaves the previous one."""
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self.buckets, f, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def claim(self, bucket_name: str, digest: str, file_name: str) -> tuple:
+        """
+        Record file_name as holding content digest and claim the content
+        for uploading, unless it was already inserted or another file of
+        this run claimed it. Claiming in the order of the file names makes
+        the first name the one the content is uploaded under.
+
+        Returns:
+            tuple: (whether the caller should upload and insert it, copy of the entry)
+        """
+        with self.lock:
+            entry = self.buckets.setdefault(bucket_name, {}).setdefault(digest, {"names": []})
+            if file_name not in entry["names"]:
+                entry["names"].append(file_name)
+                self.save()
+            if entry.get("status") == "inserted" or (bucket_name, digest) in self.claimed:
+                return False, dict(entry)
+            self.claimed[(bucket_name, digest)] = file_name
+            return True, dict(entry)
+
+    def claimant(self, bucket_name: str, digest: str) -> Optional[str]:
+        """Name of the file of this run holding the claim on content digest."""
+        with self.lock:
+            return self.claimed.get((bucket_name, digest))
+
+    def release(self, bucket_name: str, digest: str):
+        """Give up a claim after a failure, letting another file of this run with the content claim it."""
+        with self.lock:
+            self.claimed.pop((bucket_name, digest), None)
+
+    def status(self, bucket_name: str, digest: str) -> Optional[str]:
+        with self.lock:
+            return self.buckets[bucket_name][digest].get("status")
+
+    def update(self, bucket_name: str, digest: str, **fields):
+        with self.lock:
+            self.buckets[bucket_name][digest].update(fields)
+            self.save()
+
+
+# Files handled at once by each stage of upload_directory. Uploads are
+# bound by the uplink, probes by ffmpeg and inserts by round trips, so
+# each stage gets its own pool.
+UPLOAD_WORKERS = 4
+PROBE_WORKERS = 2
+INSERT_WORKERS = 4
+
+
+class StageMetrics:
+    """
+    Files, bytes and busy time of one upload_directory stage, updated from
+    its worker threads.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.files = 0
+        self.failures = 0
+        self.bytes = 0
+        self.busy = 0.0
+
+    @contextmanager
+    def measure(self, size: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self.lock:
+                self.failures += 1
+                self.busy += time.perf_counter() - start
+            raise
+        with self.lock:
+            self.files += 1
+            self.bytes += size
+            self.busy += time.perf_counter() - start
+
+    def summary(self, elapsed: float) -> dict:
+        """Throughput over the elapsed wall time of the whole run."""
+        return {
+            "files": self.files,
+            "failures": self.failures,
+            "files_per_second": self.files / elapsed if elapsed else 0.0,
+            "megabytes_per_second": self.bytes / 1024 / 1024 / elapsed if elapsed else 0.0,
+            "average_seconds": self.busy / (self.files + self.failures) if self.files + self.failures else 0.0,
+            # Average number of files the stage was working on at once
+            "concurrency": self.busy / elapsed if elapsed else 0.0,
+        }
+
+
+def list_upload_files(directory_path: str) -> list:
+    """
+    List the files of a directory to upload with their MIME types.
+
+    Returns:
+        list: (filename, file path, MIME type) tuples
     """
     if not os.path.isdir(directory_path):
         raise ValueError(f"Directory not found: {directory_path}")
 
-    for filename in os.listdir(directory_path):
+    files = []
+    for filename in sorted(os.listdir(directory_path)):
         # Skip .DS_Store files
         if filename == '.DS_Store':
             continue
-
         file_path = os.path.join(directory_path, filename)
         if os.path.isfile(file_path):
+            # Detect MIME type
+            mime_type, _ = mimetypes.guess_type(file_path)
+            if mime_type is None:
+                mime_type = 'application/octet-stream'  # Default MIME type if detection fails
+            files.append((filename, file_path, mime_type))
+    return files
+
+
+def upload_directory(directory_path: str, bucket_name: str, upload_workers: int = UPLOAD_WORKERS,
+                     probe_workers: int = PROBE_WORKERS, insert_workers: int = INSERT_WORKERS,
+                     manifest_path: str = MEDIA_UPLOAD_MANIFEST) -> dict:
+    """
+    Upload all files from a directory to Supabase storage and insert a
+    media row for each.
+
+    Files go through three stages, each with a bounded pool of threads so
+    they overlap: hashing and uploading the file in resumable chunks,
+    probing video metadata, and inserting the media row once both are done.
+
+    The manifest at manifest_path records each content hash as it goes, so
+    a file whose content was already inserted is skipped, an interrupted
+    upload is resumed, and files with identical content under different
+    names are uploaded and inserted once, under the first of the names.
+    Files whose content failed to upload or insert under another name are
+    reported as failed.
+
+    Args:
+        directory_path (str): Path to the directory containing files to upload
+        bucket_name (str): Name of the Supabase storage bucket
+        upload_workers (int): Files uploaded at once
+        probe_workers (int): Videos probed for metadata at once
+        insert_workers (int): Media rows inserted at once
+        manifest_path (str): Path of the upload manifest
+
+    Returns:
+        dict: Names of the files inserted, skipped as already uploaded,
+            skipped as duplicates and failed, and the throughput of each stage
+    """
+    files = list_upload_files(directory_path)
+    manifest = UploadManifest(manifest_path)
+    metrics = {stage: StageMetrics(stage) for stage in ("hash", "upload", "probe", "insert")}
+    inserted = []
+    skipped = []
+    duplicates = []
+    failed = []
+    # Set once a file's content is claimed (or it failed before), so that
+    # files are claimed in listing order while being hashed in parallel
+    claims_made = [threading.Event() for _ in files]
+
+    def probe(file_path, mime_type):
+        # Get metadata if it's a video file
+        with metrics["probe"].measure():
+            return get_video_metadata(file_path) if mime_type.startswith('video/') else {}
+
+    def upload(index, filename, file_path, mime_type, probes):
+        try:
+            size = os.path.getsize(file_path)
+            with metrics["hash"].measure(size):
+                digest = file_sha256(file_path)
+            # Uploads start in listing order, so the previous file is being
+            # hashed or done already
+            if index:
+                claims_made[index - 1].wait()
+            claimed, entry = manifest.claim(bucket_name, digest, filename)
+        finally:
+            claims_made[index].set()
+        if not claimed:
+            return digest, entry, None
+
+        try:
+            probed = probes.submit(probe, file_path, mime_type)
+            storage_path = entry.get("storage_path", filename)
+            if entry.get("status") != "uploaded":
+                with metrics["upload"].measure(size):
+                    upload_file_resumable(
+                        file_path, storage_path, bucket_name, mime_type, entry.get("upload_url"),
+                        on_created=lambda upload_url: manifest.update(
+                            bucket_name, digest, status="uploading", storage_path=storage_path,
+                            upload_url=upload_url))
+                manifest.update(bucket_name, digest, status="uploaded", storage_path=storage_path)
+            return digest, entry, (storage_path, get_public_url(storage_path, bucket_name), probed)
+        except Exception:
+            manifest.release(bucket_name, digest)
+            raise
+
+    def insert(digest, mime_type, storage_path, public_url, metadata):
+        with metrics["insert"].measure():
+            response = insert_media(mime_type, storage_path, public_url, {**metadata, "sha256": digest})
+            manifest.update(bucket_name, digest, status="inserted", url=public_url,
+                            media_id=response.data[0]["id"] if response.data else None)
+
+    def insert_when_probed(inserts, probed, digest, mime_type, storage_path, public_url):
+        # Chained from the probe rather than waited on, so neither this loop
+        # nor an insert worker blocks while a video is still being probed
+        row = Future()
+
+        def forward(future):
+            if future.exception() is not None:
+                row.set_exception(future.exception())
+            else:
+                row.set_result(future.result())
+
+        def submit(probed):
             try:
-                # Detect MIME type
-                mime_type, _ = mimetypes.guess_type(file_path)
-                if mime_type is None:
-                    mime_type = 'application/octet-stream'  # Default MIME type if detection fails
-
-                response = upload_file(
-                    file_path, filename, bucket_name, mime_type)
-                print(
-                    f"Successfully uploaded {filename} (MIME type: {mime_type})")
-                # UploadResponse(path='lateral bear walks.mp4', full_path='video/lateral bear walks.mp4', fullPath='video/lateral bear walks.mp4')
-
-                public_url = get_public_url(filename, bucket_name)
-                print(f"Successfully got public URL for {filename}")
-
-                # Get metadata if it's a video file
-                metadata = {}
-                if mime_type.startswith('video/'):
-                    metadata = get_video_metadata(file_path)
-
-                insert_media(mime_type, response.path, public_url, metadata)
-                print(f"Successfully inserted media for {filename}")
+                inserts.submit(insert, digest, mime_type, storage_path, public_url,
+                               probed.result()).add_done_callback(forward)
+            except Exception as e:
+                row.set_exception(e)
+
+        probed.add_done_callback(submit)
+        return row
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(upload_workers) as uploads, ThreadPoolExecutor(probe_workers) as probes, \
+            ThreadPoolExecutor(insert_workers) as inserts:
+        uploaded = {uploads.submit(upload, index, filename, file_path, mime_type, probes): (filename, mime_type)
+                    for index, (filename, file_path, mime_type) in enumerate(files)}
+
+        # Insert each file's media row as soon as it is uploaded
+        pending = {}
+        duplicate_digests = {}
+        for future in as_completed(uploaded):
+            filename, mime_type = uploaded[future]
+            try:
+                digest, entry, result = future.result()
+                if result is None:
+                    if entry.get("status") == "inserted":
+                        print(f"Skipping {filename}, already uploaded as {entry.get('storage_path')}")
+                        skipped.append(filename)
+                    else:
+                        print(f"Skipping {filename}, same content as {manifest.claimant(bucket_name, digest)}")
+                        duplicate_digests[filename] = digest
+                    continue
+                storage_path, public_url, probed = result
+                print(f"Successfully uploaded {filename} (MIME type: {mime_type})")
+                pending[insert_when_probed(inserts, probed, digest, mime_type, storage_path, public_url)] = \
+                    (filename, digest)
             except Exception as e:
                 print(f"Failed to upload {filename}: {str(e)}")
+                failed.append(filename)
+
+        for future in as_completed(pending):
+            filename, digest = pending[future]
+            try:
+                future.result()
+                print(f"Successfully inserted media for {filename}")
+                inserted.append(filename)
+            except Exception as e:
+                print(f"Failed to insert media for {filename}: {str(e)}")
+                manifest.release(bucket_name, digest)
+                failed.append(filename)
+
+    # Content inserted under another name of the run, or left to fail with it
+    for filename, digest in duplicate_digests.items():
+        if manifest.status(bucket_name, digest) == "inserted":
+            duplicates.append(filename)
+        else:
+            print(f"Failed to upload {filename}, its content failed to upload or insert under another name")
+            failed.append(filename)
+    elapsed = time.perf_counter() - start
+
+    summary = {name: stage.summary(elapsed) for name, stage in metrics.items()}
+    print(f"Uploaded {len(inserted)} of {len(files)} files in {elapsed:.1f}s, "
+          f"skipped {len(skipped)} already uploaded and {len(duplicates)} duplicates")
+    for name, stage in summary.items():
+        print(f"  {name:<8}{stage['files']:>6} files {stage['failures']:>4} failed "
+              f"{stage['files_per_second']:>8.2f} files/s {stage['megabytes_per_second']:>8.2f} MB/s "
+              f"{stage['average_seconds']:>7.2f}s avg {stage['concurrency']:>5.1f} busy")
+    return {"inserted": inserted, "skipped": skipped, "duplicates": duplicates, "failed": failed,
+            "elapsed": elapsed, "stages": summary}
 
 
 def sign_in_with_oauth():
@@ -2,6 +2,7 @@
 """
 Activity data generators
 """
+from collections import defaultdict
 
 def generate_activities():
     """Generate activities test data"""
@@ -131,6 +132,58 @@ def generate_activity_tags():
         (48, 12, 9)   # Shoulder Press - Advanced
     ]
 
+def activity_template(activity_id, base_count):
+    """Get the id of the fixed activity a generated variant is based on."""
+    return (activity_id - 1) % base_count + 1
+
+def generate_activity_variants(activities, count):
+    """
+    Generate variants of the fixed activities, up to count activities in
+    total. Variant n of an activity keeps its type and difficulty, so the
+    catalog grows without changing its mix.
+    """
+    base_count = len(activities)
+    for activity_id in range(base_count + 1, count + 1):
+        template = activities[activity_template(activity_id, base_count) - 1]
+        variation = (activity_id - 1) // base_count
+        yield (activity_id, f"{template[1]} (Variation {variation})") + tuple(template[2:])
+
+def generate_variant_links(links, base_count, count, adapt=None):
+    """
+    Copy the rows linking each fixed activity to other data (tags, body
+    areas, media, skills, protocols) to its variants, giving them new ids.
+    
+    Args:
+        links: Fixed rows as (id, activity_id, ...) tuples
+        base_count: Number of fixed activities
+        count: Total number of activities
+        adapt: Optional function (row, activity_id) -> row changing copied values
+    """
+    links_by_activity = defaultdict(list)
+    for link in links:
+        links_by_activity[link[1]].append(link)
+    
+    next_id = len(links) + 1
+    for activity_id in range(base_count + 1, count + 1):
+        for link in links_by_activity[activity_template(activity_id, base_count)]:
+            row = (next_id, activity_id) + tuple(link[2:])
+            yield adapt(row, activity_id) if adapt else row
+            next_id += 1
+
+def variant_media_url(row, activity_id):
+    """Give copied media rows a URL of their own."""
+    return row[:3] + (f"{row[3]}?variant={activity_id}",)
+
+def generate_variant_relationships(relationships, base_count, count):
+    """
+    Copy the relationships between fixed activities to their variants,
+    relating variants of the same variation number to each other.
+    """
+    for row in generate_variant_links(relationships, base_count, count):
+        related_activity_id = row[2] + (row[1] - activity_template(row[1], base_count))
+        if related_activity_id <= count:
+            yield (row[0], row[1], related_activity_id, row[3])
+
 def insert_activities(cursor, activities):
     """Insert activities into database"""
     cursor.executemany("INSERT INTO activities VALUES (?, ?, ?, ?, ?, ?, ?)", activities)
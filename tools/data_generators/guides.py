@@ -2,7 +2,7 @@
 """
 Guides data generators
 """
-from datetime import datetime
+from datetime import datetime, timezone
 
 def generate_guides():
     """Generate guides test data"""
@@ -31,13 +31,20 @@ def generate_guide_parts():
         (13, 4, "Getting Started Safely", "Begin with lighter weights to perfect form...", 3)
     ]
 
-def generate_guide_versions():
-    """Generate guide versions test data"""
+def generate_guide_versions(reference_ms=None):
+    """
+    Generate guide versions test data, released at reference_ms (defaults
+    to now). created_at is stored as SQLite's CURRENT_TIMESTAMP would
+    store it, in UTC, so it reads back as a DATETIME.
+    """
+    released = datetime.now(timezone.utc) if reference_ms is None else \
+        datetime.fromtimestamp(reference_ms / 1000, timezone.utc)
+    created_at = released.strftime("%Y-%m-%d %H:%M:%S")
     return [
-        (1, 1, 1, "Initial release", datetime.now().timestamp()),
-        (2, 2, 1, "Initial release", datetime.now().timestamp()),
-        (3, 3, 1, "Initial release", datetime.now().timestamp()),
-        (4, 4, 1, "Initial release", datetime.now().timestamp())
+        (1, 1, 1, "Initial release", created_at),
+        (2, 2, 1, "Initial release", created_at),
+        (3, 3, 1, "Initial release", created_at),
+        (4, 4, 1, "Initial release", created_at)
     ]
 
 def generate_guide_part_versions():
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Bulk loading of generated data into a new SQLite database
+"""
+import multiprocessing
+import time
+from collections import deque
+from contextlib import contextmanager
+from .utils import insert_chunked
+
+# PRAGMAs for loading a database nothing else is using yet. Without a
+# journal a crash leaves a corrupt file, which is fine when the file is
+# thrown away and regenerated anyway.
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": -262144,      # negative values are KiB, so 256 MiB
+}
+
+# SQLite's defaults, restored once loading is done
+RESTORED_PRAGMAS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "temp_store": "DEFAULT",
+    "cache_size": -2000,
+}
+
+def _set_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+def deferred_objects(conn):
+    """
+    Get the indexes and triggers that can be dropped during a bulk load and
+    recreated afterwards, as (type, name, sql) tuples. Automatic indexes for
+    primary keys and UNIQUE columns have no SQL and are kept.
+    """
+    return conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY type, name
+    """).fetchall()
+
+@contextmanager
+def bulk_load(conn, rebuild=()):
+    """
+    Load data with indexes and triggers dropped and bulk load PRAGMAs set.
+
+    On exit the indexes are built once over all rows, which is much faster
+    than updating them row by row, then the triggers are recreated and the
+    rebuild functions are called with the connection to recompute the
+    tables those triggers would have maintained (search index, rollups,
+    skill availability). This also happens when the load fails, after
+    rolling back its open transaction, so the database is never left
+    without its indexes and triggers or with derived tables out of step
+    with the rows committed so far.
+
+    Args:
+        conn: Database connection
+        rebuild: Functions to call with the connection after loading
+    """
+    objects = deferred_objects(conn)
+    for object_type, name, _ in objects:
+        conn.execute(f'DROP {object_type.upper()} "{name}"')
+    conn.commit()
+    _set_pragmas(conn, BULK_LOAD_PRAGMAS)
+
+    try:
+        yield
+    except BaseException:
+        conn.rollback()
+        print("  load failed, restoring indexes and triggers")
+        raise
+    finally:
+        try:
+            started = time.perf_counter()
+            # Indexes before triggers, so the rebuilds below can use them
+            for object_type, _, sql in sorted(objects, key=lambda item: item[0] != "index"):
+                conn.execute(sql)
+            conn.commit()
+            print(f"  indexes and triggers: {len(objects)} created in {time.perf_counter() - started:.1f}s")
+
+            for function in rebuild:
+                started = time.perf_counter()
+                function(conn)
+                print(f"  {function.__name__}: {time.perf_counter() - started:.1f}s")
+        finally:
+            _set_pragmas(conn, RESTORED_PRAGMAS)
+
+def load_table(conn, table, insert_function, rows, chunk_size=10000):
+    """
+    Stream rows into a table in chunks and report the rate.
+
+    Returns:
+        Number of rows inserted
+    """
+    started = time.perf_counter()
+    count = insert_chunked(conn, insert_function, rows, chunk_size)
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    print(f"  {table}: {count} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+    return count
+
+# Set in each worker process by _init_worker
+_worker_generator = None
+
+def _init_worker(generator, kwargs):
+    global _worker_generator
+    _worker_generator = (generator, kwargs)
+
+def _generate_users(user_range):
+    generator, kwargs = _worker_generator
+    return list(generator(first_user_id=user_range[0], user_count=user_range[1], **kwargs))
+
+def generate_in_workers(generator, kwargs, user_count, workers=1, users_per_task=1000):
+    """
+    Run a per-user generator (one taking first_user_id and user_count, such
+    as generate_activity_history) over ranges of users in worker processes,
+    yielding the rows in user order for a single writer.
+
+    Each user's rows only depend on the seed and the user id, so the output
+    is the same as one serial run; the row ids each range starts from 1,
+    and are renumbered here. At most two ranges per worker are in flight,
+    which bounds memory however many users there are.
+
+    Args:
+        generator: Module-level generator function
+        kwargs: Its other keyword arguments, sent to each worker once
+        user_count: Number of users, with ids 1 to user_count
+        workers: Number of worker processes; 1 generates in this process
+        users_per_task: Users per range handed to a worker
+
+    Returns:
+        Iterator of row tuples
+    """
+    ranges = [(first_user_id, min(first_user_id + users_per_task - 1, user_count))
+              for first_user_id in range(1, user_count + 1, users_per_task)]
+    row_id = 0
+
+    if workers <= 1:
+        for first_user_id, last_user_id in ranges:
+            for row in generator(first_user_id=first_user_id, user_count=last_user_id, **kwargs):
+                row_id += 1
+                yield (row_id,) + row[1:]
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(generator, kwargs)) as pool:
+        pending = deque()
+        for user_range in ranges:
+            pending.append(pool.apply_async(_generate_users, (user_range,)))
+            if len(pending) < workers * 2:
+                continue
+            for row in pending.popleft().get():
+                row_id += 1
+                yield (row_id,) + row[1:]
+        while pending:
+            for row in pending.popleft().get():
+                row_id += 1
+                yield (row_id,) + row[1:]
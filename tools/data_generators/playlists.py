@@ -2,9 +2,27 @@
 """
 Playlists data generators
 """
+import itertools
 import json
-import random
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from .utils import seeded_rng, lognormal_count, zipf_weights
+
+PLAYLIST_LIMIT = 20
+
+PLAYLIST_NAMES = [
+    ("Morning Routine", "Start the day right"),
+    ("Recovery Day", "Low intensity recovery activities"),
+    ("Evening Wind Down", "Relaxation before sleep"),
+    ("Energy Boost", "Activities for energy"),
+    ("Full Body Workout", "Complete body workout"),
+    ("Mind Training", "Mental exercises"),
+    ("Lunch Break Reset", "A short break in the middle of the day"),
+    ("Upper Body Day", "Pushing and pulling work"),
+    ("Leg Day", "Lower body strength"),
+    ("Pre-Sleep Calm", "Slow breathing and meditation"),
+    ("Travel Session", "No equipment needed"),
+    ("Focus Before Work", "Clear the mind before deep work"),
+]
 
 def generate_playlists():
     """Generate playlists test data"""
@@ -52,48 +70,93 @@ def generate_playlist_items():
         (19, 6, 6, 3)   # Loving-Kindness Meditation
     ]
 
-def generate_playlist_performances(playlists):
+def generate_more_playlists(playlists, first_user_id, user_count, playlists_per_user=2, seed=0):
+    """
+    Generate playlists for the users from first_user_id to user_count, who
+    have none among the fixed ones. Users keep a few playlists each, many
+    none at all.
+    
+    Returns:
+        Iterator of playlist tuples
+    """
+    playlist_id = len(playlists)
+    for user_id in range(first_user_id, user_count + 1):
+        rng = seeded_rng(seed, "playlists", user_id)
+        count = lognormal_count(rng, playlists_per_user, sigma=0.8, maximum=PLAYLIST_LIMIT)
+        for name, description in rng.sample(PLAYLIST_NAMES, min(count, len(PLAYLIST_NAMES))):
+            playlist_id += 1
+            yield (playlist_id, user_id, name, description)
+
+def generate_more_playlist_items(playlist_items, playlists, activity_count, seed=0):
     """
-    Generate random playlist performance data for all users.
+    Generate the items of generated playlists, drawing activities by
+    popularity.
     
     Args:
-        playlists: List of playlist tuples
+        playlist_items: Fixed playlist item tuples
+        playlists: Iterable of the generated playlist tuples
+        activity_count: Number of activities to choose from
         
     Returns:
-        List of playlist performance tuples
+        Iterator of playlist item tuples
     """
-    playlist_performances = []
+    activity_ids = list(range(1, activity_count + 1))
+    cum_weights = list(itertools.accumulate(zipf_weights(activity_count)))
+    item_id = len(playlist_items)
+    for playlist in playlists:
+        rng = seeded_rng(seed, "playlist_items", playlist[0])
+        item_count = rng.randint(2, 8)
+        activities = []
+        for activity_id in rng.choices(activity_ids, cum_weights=cum_weights, k=item_count * 3):
+            if activity_id not in activities:
+                activities.append(activity_id)
+                if len(activities) == item_count:
+                    break
+        for position, activity_id in enumerate(activities, start=1):
+            item_id += 1
+            yield (item_id, playlist[0], activity_id, position)
+
+def generate_playlist_performances(playlists, seed=0, reference_ms=None):
+    """
+    Generate random playlist performance data for all playlists, one
+    playlist at a time.
     
-    for user_id in range(1, 4):
-        # Get playlists for this user
-        user_playlists = [(p[0]) for p in playlists if p[1] == user_id]
+    Args:
+        playlists: Iterable of playlist tuples
+        seed: Seed making the generated rows reproducible
+        reference_ms: Time the performances end at (defaults to now)
         
-        for playlist_id in user_playlists:
-            # 3-8 performances per playlist
-            performance_count = random.randint(3, 8)
+    Returns:
+        Iterator of playlist performance tuples
+    """
+    reference = datetime.now(timezone.utc) if reference_ms is None else \
+        datetime.fromtimestamp(reference_ms / 1000, timezone.utc)
+    performance_id = 0
+    for playlist_id, user_id, _, _ in playlists:
+        rng = seeded_rng(seed, "playlist_performances", playlist_id)
+        # 3-8 performances per playlist
+        performance_count = rng.randint(3, 8)
+        
+        for i in range(performance_count):
+            # Random time in the past 2 months
+            performance_time = reference - timedelta(days=rng.randint(0, 60), seconds=rng.randint(0, 86399))
             
-            for i in range(performance_count):
-                # Random day in the past 2 months
-                days_ago = random.randint(0, 60)
-                performance_time = datetime.now() - timedelta(days=days_ago)
-                
-                # Random performance data
-                performance_data = {
-                    "completed": random.choice([True, True, True, False]),
-                    "duration_minutes": random.randint(15, 90),
-                    "energy_level": random.randint(1, 10),
-                    "satisfaction": random.randint(1, 10)
-                }
-                
-                playlist_performances.append((
-                    len(playlist_performances) + 1,  # id
-                    user_id,
-                    playlist_id,
-                    performance_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    json.dumps(performance_data)
-                ))
-    
-    return playlist_performances
+            # Random performance data
+            performance_data = {
+                "completed": rng.choice([True, True, True, False]),
+                "duration_minutes": rng.randint(15, 90),
+                "energy_level": rng.randint(1, 10),
+                "satisfaction": rng.randint(1, 10)
+            }
+            
+            performance_id += 1
+            yield (
+                performance_id,
+                user_id,
+                playlist_id,
+                performance_time.strftime("%Y-%m-%d %H:%M:%S"),
+                json.dumps(performance_data)
+            )
 
 def insert_playlists(cursor, playlists):
     """Insert playlists into database"""
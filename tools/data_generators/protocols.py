@@ -2,10 +2,32 @@
 """
 Protocols data generators
 """
+import itertools
 import json
+import math
 import time
-import random
-from .utils import current_timestamp_ms, random_past_timestamp_ms, random_duration_ms, ms_to_iso_string
+from .utils import current_timestamp_ms, ms_to_iso_string, seeded_rng, lognormal_count, zipf_weights
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# Mostly completed, some in progress or abandoned
+STATUSES = ["completed", "in_progress", "abandoned"]
+STATUS_WEIGHTS = [80, 5, 15]
+
+NOTES = [
+    "Felt great today!",
+    "Struggled with focus.",
+    "Making progress.",
+    "Need to work on technique.",
+    "Energy was low today.",
+    "Personal best!",
+    "Tried new variation.",
+    "",
+    "",
+    ""
+]
 
 def generate_protocols():
     """Generate protocols test data"""
@@ -16,88 +38,149 @@ def generate_protocols():
         (4, "Strength Foundations", "console.log('Starting strength foundations')", "Basic strength training routine")
     ]
 
-def generate_activity_protocols():
-    """Generate activity protocols test data"""
+def generate_activity_protocols(reference_ms=None):
+    """
+    Generate activity protocols test data, created at reference_ms
+    (defaults to now). created_at is in seconds.
+    """
+    created_at = int(time.time()) if reference_ms is None else reference_ms // 1000
     return [
-        (1, 1, 1, json.dumps({"duration": 300, "instructions": "Focus on breath"}), int(time.time())),
-        (2, 3, 1, json.dumps({"duration": 180, "instructions": "4-7-8 pattern"}), int(time.time())),
-        (3, 4, 1, json.dumps({"duration": 600, "instructions": "Body awareness"}), int(time.time())),
-        (4, 1, 2, json.dumps({"duration": 240, "instructions": "Box breathing for stress"}), int(time.time())),
-        (5, 3, 2, json.dumps({"duration": 300, "instructions": "Relaxation breathing"}), int(time.time())),
-        (6, 5, 2, json.dumps({"duration": 600, "instructions": "Full body scan"}), int(time.time())),
-        (7, 7, 3, json.dumps({"reps": 10, "sets": 3, "rest": 60}), int(time.time())),
-        (8, 9, 3, json.dumps({"reps": 12, "sets": 3, "rest": 60}), int(time.time())),
-        (9, 10, 4, json.dumps({"weight": "bodyweight", "reps": 8, "sets": 3}), int(time.time())),
-        (10, 11, 4, json.dumps({"weight": "light", "reps": 10, "sets": 3}), int(time.time())),
-        (11, 12, 4, json.dumps({"weight": "light", "reps": 10, "sets": 3}), int(time.time()))
+        (1, 1, 1, json.dumps({"duration": 300, "instructions": "Focus on breath"}), created_at),
+        (2, 3, 1, json.dumps({"duration": 180, "instructions": "4-7-8 pattern"}), created_at),
+        (3, 4, 1, json.dumps({"duration": 600, "instructions": "Body awareness"}), created_at),
+        (4, 1, 2, json.dumps({"duration": 240, "instructions": "Box breathing for stress"}), created_at),
+        (5, 3, 2, json.dumps({"duration": 300, "instructions": "Relaxation breathing"}), created_at),
+        (6, 5, 2, json.dumps({"duration": 600, "instructions": "Full body scan"}), created_at),
+        (7, 7, 3, json.dumps({"reps": 10, "sets": 3, "rest": 60}), created_at),
+        (8, 9, 3, json.dumps({"reps": 12, "sets": 3, "rest": 60}), created_at),
+        (9, 10, 4, json.dumps({"weight": "bodyweight", "reps": 8, "sets": 3}), created_at),
+        (10, 11, 4, json.dumps({"weight": "light", "reps": 10, "sets": 3}), created_at),
+        (11, 12, 4, json.dumps({"weight": "light", "reps": 10, "sets": 3}), created_at)
     ]
 
-def generate_activity_history(activity_protocols):
+def protocol_popularity(activity_protocols):
+    """
+    Get the ids of the activity protocols with cumulative Zipf popularity
+    weights, for drawing which protocols users practice. Computed once, so
+    each draw is a binary search rather than a pass over the catalog.
+    """
+    ids = [ap[0] for ap in activity_protocols]
+    return ids, list(itertools.accumulate(zipf_weights(len(ids))))
+
+def user_protocol_sessions(popularity, user_id, history_per_user, seed=0):
+    """
+    Decide how many sessions a user has logged with each activity protocol.
+    
+    The number of sessions is log-normal around history_per_user, spread
+    over a small repertoire of protocols drawn by popularity. Activity
+    history and skill progress both call this, so a user's progress always
+    matches their history without either being held in memory.
+    
+    Returns:
+        Dict of activity protocol id -> session count
+    """
+    ids, cum_weights = popularity
+    rng = seeded_rng(seed, "sessions", user_id)
+    session_count = lognormal_count(rng, history_per_user, maximum=history_per_user * 20)
+    if not session_count or not ids:
+        return {}
+    
+    repertoire_size = min(len(ids), 1 + lognormal_count(rng, 4, sigma=0.6))
+    repertoire = []
+    for activity_protocol_id in rng.choices(ids, cum_weights=cum_weights, k=repertoire_size * 5):
+        if activity_protocol_id not in repertoire:
+            repertoire.append(activity_protocol_id)
+            if len(repertoire) == repertoire_size:
+                break
+    
+    # Favourites get most of the sessions
+    weights = [rng.paretovariate(1.5) for _ in repertoire]
+    sessions = {}
+    for activity_protocol_id in rng.choices(repertoire, weights=weights, k=session_count):
+        sessions[activity_protocol_id] = sessions.get(activity_protocol_id, 0) + 1
+    return sessions
+
+def _session_start_ms(rng, reference_ms, history_days):
+    """Pick a start time within history_days before reference_ms, at a morning or evening peak."""
+    day = int(rng.random() * history_days) + 1
+    if rng.random() < 0.55:
+        hour = rng.gauss(7.5, 1.5)
+    else:
+        hour = rng.gauss(19, 2)
+    hour = min(max(hour, 0), 23.99)
+    return reference_ms - day * DAY_MS + int(hour * HOUR_MS)
+
+def _session_parameters(rng, protocol_parameters, status):
+    """Record what was done in a session, varying the protocol's targets."""
+    parameters = {"completed": status == "completed"}
+    for key in ("reps", "sets"):
+        if key in protocol_parameters:
+            parameters[key] = max(1, protocol_parameters[key] + rng.randint(-2, 2))
+    if rng.random() < 0.4:
+        parameters["heart_rate"] = int(rng.gauss(95, 20))
+    return parameters
+
+def generate_activity_history(activity_protocols, user_count=3, history_per_user=22, seed=0, reference_ms=None,
+                              first_user_id=1):
     """
-    Generate random activity history data for all users.
+    Generate activity history for all users, one user at a time.
     
     Args:
         activity_protocols: List of activity protocol tuples
+        user_count: Number of users, with ids 1 to user_count
+        history_per_user: Mean number of sessions per user
+        seed: Seed making the generated rows reproducible
+        reference_ms: Time the history ends at (defaults to now)
+        first_user_id: First user to generate history for, to split users between workers
         
     Returns:
-        List of activity history tuples
+        Iterator of activity history tuples
     """
-    activity_history = []
+    if reference_ms is None:
+        reference_ms = current_timestamp_ms()
+    popularity = protocol_popularity(activity_protocols)
+    protocol_parameters = {ap[0]: json.loads(ap[3]) for ap in activity_protocols}
     
-    # Generate activity history entries for each user
-    for user_id in range(1, 4):  # 3 users
-        # Each user will have practiced different activities
-        activity_count = random.randint(15, 30)
+    history_id = 0
+    for user_id in range(first_user_id, user_count + 1):
+        sessions = user_protocol_sessions(popularity, user_id, history_per_user, seed)
+        rng = seeded_rng(seed, "history", user_id)
+        # Time since the user joined, up to a year
+        history_days = rng.randint(14, 365)
         
-        for i in range(activity_count):
-            # Random activity protocol
-            activity_protocol_id = random.randint(1, len(activity_protocols))
-            
-            # Random time in the past (up to 3 months)
-            start_time_ms = random_past_timestamp_ms(90)
+        user_sessions = []
+        for activity_protocol_id, count in sorted(sessions.items()):
+            for _ in range(count):
+                user_sessions.append((_session_start_ms(rng, reference_ms, history_days), activity_protocol_id))
+        user_sessions.sort()
+        
+        taken = set()
+        for start_time_ms, activity_protocol_id in user_sessions:
+            # A user cannot start the same protocol twice in the same millisecond
+            while (activity_protocol_id, start_time_ms) in taken:
+                start_time_ms += 1
+            taken.add((activity_protocol_id, start_time_ms))
             
-            # Activity duration between 5 minutes and 1 hour
-            duration_ms = random_duration_ms(5, 60)
+            status = rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0]
+            duration_ms = int(rng.lognormvariate(math.log(20), 0.5) * MINUTE_MS)
+            duration_ms = min(max(duration_ms, 2 * MINUTE_MS), 120 * MINUTE_MS)
+            if status == "abandoned":
+                duration_ms = int(duration_ms * rng.uniform(0.1, 0.6))
             end_time_ms = start_time_ms + duration_ms
             
-            # Convert to datetime for timestamp format
-            start_time = ms_to_iso_string(start_time_ms)
-            end_time = ms_to_iso_string(end_time_ms)
-            
-            # Status (mostly completed, some in progress or abandoned)
-            status_options = ["completed", "completed", "completed", "completed", "in_progress", "abandoned"]
-            status = random.choice(status_options)
-            
-            # Random notes
-            notes_options = [
-                "Felt great today!",
-                "Struggled with focus.",
-                "Making progress.",
-                "Need to work on technique.",
-                "Energy was low today.",
-                "Personal best!",
-                "Tried new variation.",
-                "",
-                "",
-                ""
-            ]
-            notes = random.choice(notes_options)
-            
-            # Add to activity history
-            activity_history.append((
-                len(activity_history) + 1,  # id
+            history_id += 1
+            yield (
+                history_id,
                 user_id,
                 activity_protocol_id,
-                json.dumps({"completed": status == "completed"}),
-                start_time,
-                end_time,
+                json.dumps(_session_parameters(rng, protocol_parameters[activity_protocol_id], status)),
+                ms_to_iso_string(start_time_ms),
+                ms_to_iso_string(end_time_ms),
                 start_time_ms,
                 end_time_ms,
                 status,
-                notes
-            ))
-    
-    return activity_history
+                rng.choice(NOTES)
+            )
 
 def insert_protocols(cursor, protocols):
     """Insert protocols into database"""
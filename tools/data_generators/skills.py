@@ -2,8 +2,11 @@
 """
 Skills data generators
 """
-import random
-from .utils import current_timestamp_ms, random_past_timestamp_ms
+import math
+from collections import defaultdict
+from .activities import activity_template
+from .protocols import DAY_MS, MINUTE_MS, protocol_popularity, user_protocol_sessions
+from .utils import current_timestamp_ms, seeded_rng
 
 def generate_skill_categories():
     """Generate skill categories test data"""
@@ -55,72 +58,99 @@ def generate_skill_prerequisites():
         (11, 20, 19, 0.8)   # Overhead Position requires Shoulder Stability
     ]
 
-def generate_user_skill_progress(activity_history, activity_protocols, activity_skills):
+def variant_skill_name(row, activity_id):
+    """Name copied skills after the variant they belong to."""
+    return row[:2] + (f"{row[2]} (Activity {activity_id})",) + row[3:]
+
+def generate_variant_prerequisites(skill_prerequisites, activity_skills, base_activity_count):
     """
-    Generate user skill progress based on activity history.
+    Copy the prerequisites between the skills of each fixed activity to the
+    skills its variants were given (see activities.generate_variant_links).
     
     Args:
-        activity_history: List of activity history records
-        activity_protocols: List of activity protocol records
-        activity_skills: List of activity skill records
+        skill_prerequisites: Fixed skill prerequisite tuples
+        activity_skills: All activity skill tuples, fixed and copied, in id order
+        base_activity_count: Number of fixed activities
         
     Returns:
-        List of user skill progress records
+        Iterator of skill prerequisite tuples
     """
-    user_skill_progress = []
-    now = current_timestamp_ms()
-    
-    # Create a mapping of activity IDs to their skills
-    activity_to_skills = {}
+    skills_by_activity = defaultdict(list)
     for skill in activity_skills:
-        skill_id, activity_id = skill[0], skill[1]
-        if activity_id not in activity_to_skills:
-            activity_to_skills[activity_id] = []
-        activity_to_skills[activity_id].append(skill_id)
+        skills_by_activity[skill[1]].append(skill[0])
+    prerequisites_by_skill = defaultdict(list)
+    for prerequisite in skill_prerequisites:
+        prerequisites_by_skill[prerequisite[1]].append(prerequisite)
     
-    # Create a mapping of activity protocol IDs to activity IDs
-    protocol_to_activity = {}
-    for ap in activity_protocols:
-        protocol_id, activity_id = ap[0], ap[1]
-        protocol_to_activity[protocol_id] = activity_id
+    next_id = len(skill_prerequisites) + 1
+    for activity_id in sorted(skills_by_activity):
+        if activity_id <= base_activity_count:
+            continue
+        template_id = activity_template(activity_id, base_activity_count)
+        copied = dict(zip(skills_by_activity[template_id], skills_by_activity[activity_id]))
+        for template_skill_id in skills_by_activity[template_id]:
+            for _, _, prerequisite_id, required_mastery in prerequisites_by_skill[template_skill_id]:
+                if prerequisite_id in copied:
+                    yield (next_id, copied[template_skill_id], copied[prerequisite_id], required_mastery)
+                    next_id += 1
+
+def generate_user_skill_progress(activity_protocols, activity_skills, user_count=3, history_per_user=22,
+                                 seed=0, reference_ms=None, first_user_id=1):
+    """
+    Generate user skill progress matching the activity history generated
+    with the same arguments, one user at a time.
     
-    # Find which activities each user has practiced
-    user_activities = {}
-    for history in activity_history:
-        user_id, protocol_id = history[1], history[2]
-        if user_id not in user_activities:
-            user_activities[user_id] = set()
-        if protocol_id in protocol_to_activity:
-            activity_id = protocol_to_activity[protocol_id]
-            user_activities[user_id].add(activity_id)
+    Mastery grows with practice and levels off, at a rate that differs
+    between users.
+    
+    Args:
+        activity_protocols: List of activity protocol records
+        activity_skills: List of activity skill records
+        user_count: Number of users, with ids 1 to user_count
+        history_per_user: Mean number of sessions per user
+        seed: Seed making the generated rows reproducible
+        reference_ms: Time the history ends at (defaults to now)
+        first_user_id: First user to generate progress for, to split users between workers
+        
+    Returns:
+        Iterator of user skill progress records
+    """
+    if reference_ms is None:
+        reference_ms = current_timestamp_ms()
+    popularity = protocol_popularity(activity_protocols)
     
-    # Generate skill progress for each user based on their activities
-    for user_id, activities in user_activities.items():
-        for activity_id in activities:
-            if activity_id in activity_to_skills:
-                skills = activity_to_skills[activity_id]
-                for skill_id in skills:
-                    # Generate random mastery level between 0.1 and 0.9
-                    mastery = random.uniform(0.1, 0.9)
-                    
-                    # Generate random practice data
-                    total_practice_time = random.randint(1800000, 7200000)  # 30 min to 2 hours in ms
-                    practice_count = random.randint(3, 20)
-                    
-                    # Last practiced time (random in last 30 days)
-                    last_practiced = random_past_timestamp_ms(30)
-                    
-                    user_skill_progress.append((
-                        len(user_skill_progress) + 1,  # id
-                        user_id,
-                        skill_id,
-                        mastery,
-                        last_practiced,
-                        total_practice_time,
-                        practice_count
-                    ))
+    activity_to_skills = defaultdict(list)
+    for skill in activity_skills:
+        activity_to_skills[skill[1]].append(skill[0])
+    protocol_to_activity = {ap[0]: ap[1] for ap in activity_protocols}
     
-    return user_skill_progress
+    progress_id = 0
+    for user_id in range(first_user_id, user_count + 1):
+        sessions = user_protocol_sessions(popularity, user_id, history_per_user, seed)
+        rng = seeded_rng(seed, "progress", user_id)
+        learning_rate = rng.uniform(8, 40)
+        
+        practice_counts = defaultdict(int)
+        for activity_protocol_id, count in sessions.items():
+            for skill_id in activity_to_skills[protocol_to_activity[activity_protocol_id]]:
+                practice_counts[skill_id] += count
+        
+        for skill_id in sorted(practice_counts):
+            practice_count = practice_counts[skill_id]
+            mastery = (1 - math.exp(-practice_count / learning_rate)) * rng.uniform(0.85, 1.0)
+            average_session_ms = rng.lognormvariate(math.log(20), 0.3) * MINUTE_MS
+            last_practiced = reference_ms - int(rng.expovariate(1 / 7) * DAY_MS)
+            
+            progress_id += 1
+            yield (
+                progress_id,
+                user_id,
+                skill_id,
+                round(min(max(mastery, 0.0), 1.0), 4),
+                last_practiced,
+                int(practice_count * average_session_ms),
+                practice_count
+            )
 
 def insert_skill_categories(cursor, skill_categories):
     """Insert skill categories into database"""
@@ -3,6 +3,11 @@
 User data generators
 """
 
+FIRST_NAMES = ["Alex", "Sam", "Maria", "Chen", "Priya", "Omar", "Lena", "Diego", "Aiko", "Noah",
+               "Fatima", "Lucas", "Zoe", "Ivan", "Amara", "Mateo", "Sofia", "Kenji", "Nadia", "Leo"]
+LAST_NAMES = ["Garcia", "Kim", "Nguyen", "Patel", "Muller", "Silva", "Cohen", "Okafor", "Rossi", "Tanaka",
+              "Ivanova", "Brown", "Haddad", "Larsen", "Moreau", "Singh", "Lopez", "Novak", "Sato", "Walker"]
+
 def generate_users():
     """Generate user test data"""
     return [
@@ -11,6 +16,18 @@ def generate_users():
         (3, "Michael", "Johnson", "mjohnson", "michael.johnson@example.com")
     ]
 
+def generate_more_users(users, count):
+    """
+    Generate users after the fixed ones, up to count users in total.
+    Names cycle through fixed lists and usernames carry the id, so they
+    are unique and the same for every run.
+    """
+    for user_id in range(len(users) + 1, count + 1):
+        first_name = FIRST_NAMES[user_id % len(FIRST_NAMES)]
+        last_name = LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        username = f"{first_name}{last_name}{user_id}".lower()
+        yield (user_id, first_name, last_name, username, f"{username}@example.com")
+
 def insert_users(cursor, users):
     """Insert users into database"""
     cursor.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?)", users)
@@ -2,10 +2,12 @@
 """
 Utility functions for data generation.
 """
+import itertools
 import json
+import math
 import random
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 # Time utility functions
 def current_timestamp_ms():
@@ -26,8 +28,8 @@ def random_past_timestamp_ms(max_days_ago=90):
     return now - (days_ago * one_day_ms) - random.randint(0, one_day_ms)
 
 def ms_to_iso_string(timestamp_ms):
-    """Convert timestamp in milliseconds to ISO 8601 string"""
-    return datetime.fromtimestamp(timestamp_ms / 1000).isoformat()
+    """Convert timestamp in milliseconds to ISO 8601 string (UTC)"""
+    return datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).replace(tzinfo=None).isoformat()
 
 # Random data generation helpers
 def random_duration_ms(min_minutes=5, max_minutes=60):
@@ -37,3 +39,67 @@ def random_duration_ms(min_minutes=5, max_minutes=60):
 def random_choice_weighted(options, weights=None):
     """Choose random element from options with optional weights"""
     return random.choices(options, weights=weights, k=1)[0]
+
+# Scaled generation helpers
+def seeded_rng(seed, stream, key=None):
+    """
+    Get a random generator for one stream of data (and optionally one user
+    or playlist within it). Streams are independent of each other and of
+    the order rows are generated in, so the same seed always gives the same
+    rows and two generators can derive the same per-user choices.
+    """
+    return random.Random(f"{seed}:{stream}:{key}")
+
+def reference_timestamp_ms(date=None):
+    """
+    Get the timestamp generated data is placed relative to: midnight UTC of
+    the given YYYY-MM-DD date, or of today. Passing a fixed date makes
+    seeded runs reproduce the same timestamps.
+    """
+    if date is None:
+        day = datetime.utcnow().date()
+    else:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    return int(datetime(day.year, day.month, day.day).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def lognormal_count(rng, mean, sigma=1.0, maximum=None):
+    """
+    Draw a non-negative count from a log-normal distribution with the given
+    mean, giving the long tail of per-user activity seen in real usage
+    (most users light, a few very heavy).
+    """
+    if mean <= 0:
+        return 0
+    mu = math.log(mean) - sigma ** 2 / 2
+    count = int(round(rng.lognormvariate(mu, sigma)))
+    return min(count, maximum) if maximum is not None else count
+
+def zipf_weights(count, exponent=1.1):
+    """Popularity weights for count ranked items, the first being the most popular."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+def chunked(rows, chunk_size):
+    """Split an iterable of rows into lists of at most chunk_size rows."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def insert_chunked(conn, insert_function, rows, chunk_size=10000):
+    """
+    Insert rows from a (possibly lazy) iterable with one of the insert_*
+    functions, committing every chunk_size rows so memory and journal size
+    stay bounded however many rows there are.
+    
+    Returns:
+        Number of rows inserted
+    """
+    cursor = conn.cursor()
+    count = 0
+    for chunk in chunked(rows, chunk_size):
+        insert_function(cursor, chunk)
+        conn.commit()
+        count += len(chunk)
+    return count
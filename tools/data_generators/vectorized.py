@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+NumPy generators for activity history and user skill progress
+
+Instead of drawing values one row at a time, these generate whole columns
+(user ids, start times, durations, mastery levels) for a block of users at
+once and zip them into rows. They follow the same distributions as the
+generators in protocols.py and skills.py but draw from NumPy random
+generators, so the rows differ from theirs while being just as
+reproducible for a given seed.
+
+Random draws are seeded per block of BLOCK_USERS users, so user ranges
+handed to generate_in_workers must start on a block boundary.
+"""
+import json
+import numpy as np
+from .protocols import DAY_MS, HOUR_MS, MINUTE_MS, NOTES, STATUSES, STATUS_WEIGHTS
+from .utils import current_timestamp_ms, zipf_weights
+
+BLOCK_USERS = 10000
+
+# Streams of random draws, so each column is independent of the others
+SESSIONS_STREAM = 1
+HISTORY_STREAM = 2
+PROGRESS_STREAM = 3
+
+def _block_rng(seed, stream, block):
+    return np.random.default_rng([seed, stream, block])
+
+def _blocks(first_user_id, user_count):
+    """Split users first_user_id to user_count into (block, first, last) ranges."""
+    if (first_user_id - 1) % BLOCK_USERS:
+        raise ValueError(f"first_user_id must be 1 plus a multiple of {BLOCK_USERS}")
+    for first in range(first_user_id, user_count + 1, BLOCK_USERS):
+        yield (first - 1) // BLOCK_USERS, first, min(first + BLOCK_USERS - 1, user_count)
+
+def _lognormal_counts(rng, mean, sigma, size):
+    """Vectorized utils.lognormal_count."""
+    if mean <= 0:
+        return np.zeros(size, dtype=np.int64)
+    mu = np.log(mean) - sigma ** 2 / 2
+    return np.rint(rng.lognormal(mu, sigma, size)).astype(np.int64)
+
+def block_sessions(protocol_count, first, last, history_per_user, seed, block):
+    """
+    Draw the sessions of users first to last, as user_protocol_sessions
+    does for one user: a log-normal number of sessions spread over a small
+    repertoire of protocols drawn by popularity, favourites getting most.
+
+    Returns:
+        (user ids, activity protocol indexes) arrays, one entry per session
+    """
+    rng = _block_rng(seed, SESSIONS_STREAM, block)
+    users = np.arange(first, last + 1)
+    session_counts = np.minimum(_lognormal_counts(rng, history_per_user, 1.0, len(users)), history_per_user * 20)
+    repertoire_sizes = np.minimum(1 + _lognormal_counts(rng, 4, 0.6, len(users)), protocol_count)
+
+    # Repertoire slots of all users, back to back, with a protocol and a weight each
+    cum_popularity = np.cumsum(zipf_weights(protocol_count))
+    slot_protocols = np.searchsorted(cum_popularity, rng.random(repertoire_sizes.sum()) * cum_popularity[-1],
+                                     side="right")
+    slot_weights = np.cumsum(rng.pareto(1.5, len(slot_protocols)) + 1)
+
+    # Pick a slot for each session within its user's part of slot_weights
+    slot_ends = np.cumsum(repertoire_sizes)
+    user_top = slot_weights[slot_ends - 1]
+    user_base = np.concatenate(([0.0], user_top[:-1]))
+    session_users = np.repeat(np.arange(len(users)), session_counts)
+    draws = user_base[session_users] + rng.random(len(session_users)) * (user_top - user_base)[session_users]
+    slots = np.minimum(np.searchsorted(slot_weights, draws, side="right"), slot_ends[session_users] - 1)
+    return users[session_users], slot_protocols[slots]
+
+def _json_fields(key, values):
+    """Format one optional JSON field per row, -1 meaning absent."""
+    return ["" if value < 0 else f', "{key}": {value}' for value in values]
+
+def _parameters_json(completed, reps, sets, heart_rates):
+    """
+    Build the parameters JSON of each row from columns, as json.dumps would
+    for the dicts protocols.generate_activity_history records, without
+    building a dict per row.
+    """
+    return [
+        f'{{"completed": {"true" if row_completed else "false"}{row_reps}{row_sets}{heart_rate}}}'
+        for row_completed, row_reps, row_sets, heart_rate in zip(
+            completed, _json_fields("reps", reps), _json_fields("sets", sets),
+            _json_fields("heart_rate", heart_rates))
+    ]
+
+def _iso_strings(timestamps_ms):
+    """Format millisecond timestamps as ISO 8601 strings (UTC)."""
+    return np.datetime_as_string(timestamps_ms.astype("datetime64[ms]"), unit="us").tolist()
+
+def generate_activity_history(activity_protocols, user_count=3, history_per_user=22, seed=0, reference_ms=None,
+                              first_user_id=1):
+    """
+    Generate activity history for all users a block of users at a time.
+    Takes the same arguments as protocols.generate_activity_history.
+
+    Returns:
+        Iterator of activity history tuples
+    """
+    if reference_ms is None:
+        reference_ms = current_timestamp_ms()
+    protocol_ids = np.array([ap[0] for ap in activity_protocols])
+    protocol_parameters = [json.loads(ap[3]) for ap in activity_protocols]
+    target_reps = np.array([p.get("reps", -1) for p in protocol_parameters])
+    target_sets = np.array([p.get("sets", -1) for p in protocol_parameters])
+    status_probabilities = np.array(STATUS_WEIGHTS) / sum(STATUS_WEIGHTS)
+
+    history_id = 0
+    for block, first, last in _blocks(first_user_id, user_count):
+        users, protocols = block_sessions(len(protocol_ids), first, last, history_per_user, seed, block)
+        rng = _block_rng(seed, HISTORY_STREAM, block)
+        count = len(users)
+
+        # Start times within each user's history, at morning or evening peaks
+        history_days = rng.integers(14, 366, last - first + 1)[users - first]
+        days = np.floor(rng.random(count) * history_days).astype(np.int64) + 1
+        hours = np.where(rng.random(count) < 0.55, rng.normal(7.5, 1.5, count), rng.normal(19, 2, count))
+        start_ms = reference_ms - days * DAY_MS + (np.clip(hours, 0, 23.99) * HOUR_MS).astype(np.int64)
+
+        # A user cannot start the same protocol twice in the same millisecond
+        while True:
+            order = np.lexsort((start_ms, protocols, users))
+            repeated = ((users[order][1:] == users[order][:-1]) &
+                        (protocols[order][1:] == protocols[order][:-1]) &
+                        (start_ms[order][1:] == start_ms[order][:-1]))
+            if not repeated.any():
+                break
+            start_ms[order[1:][repeated]] += 1
+
+        # Each user's sessions in chronological order
+        order = np.lexsort((start_ms, users))
+        users, protocols, start_ms = users[order], protocols[order], start_ms[order]
+
+        statuses = rng.choice(len(STATUSES), count, p=status_probabilities)
+        duration_ms = np.clip(rng.lognormal(np.log(20), 0.5, count) * MINUTE_MS, 2 * MINUTE_MS, 120 * MINUTE_MS)
+        abandoned = statuses == STATUSES.index("abandoned")
+        duration_ms[abandoned] *= rng.uniform(0.1, 0.6, abandoned.sum())
+        end_ms = start_ms + duration_ms.astype(np.int64)
+
+        reps = np.where(target_reps[protocols] >= 0,
+                        np.maximum(1, target_reps[protocols] + rng.integers(-2, 3, count)), -1)
+        sets = np.where(target_sets[protocols] >= 0,
+                        np.maximum(1, target_sets[protocols] + rng.integers(-2, 3, count)), -1)
+        heart_rates = np.where(rng.random(count) < 0.4, np.maximum(rng.normal(95, 20, count), 30).astype(np.int64), -1)
+        notes = rng.integers(0, len(NOTES), count)
+
+        completed = (statuses == STATUSES.index("completed")).tolist()
+        columns = (
+            range(history_id + 1, history_id + count + 1),
+            users.tolist(),
+            protocol_ids[protocols].tolist(),
+            _parameters_json(completed, reps.tolist(), sets.tolist(), heart_rates.tolist()),
+            _iso_strings(start_ms),
+            _iso_strings(end_ms),
+            start_ms.tolist(),
+            end_ms.tolist(),
+            [STATUSES[status] for status in statuses.tolist()],
+            [NOTES[note] for note in notes.tolist()],
+        )
+        history_id += count
+        yield from zip(*columns)
+
+def generate_user_skill_progress(activity_protocols, activity_skills, user_count=3, history_per_user=22,
+                                 seed=0, reference_ms=None, first_user_id=1):
+    """
+    Generate user skill progress matching the vectorized activity history
+    generated with the same arguments, a block of users at a time.
+    Takes the same arguments as skills.generate_user_skill_progress.
+
+    Returns:
+        Iterator of user skill progress records
+    """
+    if reference_ms is None:
+        reference_ms = current_timestamp_ms()
+
+    # Skills of each activity protocol, as offsets into one array
+    activity_to_skills = {}
+    for skill in activity_skills:
+        activity_to_skills.setdefault(skill[1], []).append(skill[0])
+    protocol_skills = [activity_to_skills.get(ap[1], []) for ap in activity_protocols]
+    skill_counts = np.array([len(skills) for skills in protocol_skills])
+    skill_offsets = np.concatenate(([0], np.cumsum(skill_counts)[:-1]))
+    skill_ids = np.array([skill_id for skills in protocol_skills for skill_id in skills], dtype=np.int64)
+    max_skill_id = int(skill_ids.max()) + 1 if len(skill_ids) else 1
+
+    progress_id = 0
+    for block, first, last in _blocks(first_user_id, user_count):
+        users, protocols = block_sessions(len(activity_protocols), first, last, history_per_user, seed, block)
+        rng = _block_rng(seed, PROGRESS_STREAM, block)
+
+        # Sessions per user and protocol, then per user and skill
+        pairs, practice = np.unique(users * len(activity_protocols) + protocols, return_counts=True)
+        pair_users, pair_protocols = np.divmod(pairs, len(activity_protocols))
+        repeats = skill_counts[pair_protocols]
+        within = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        skill_rows = skill_ids[np.repeat(skill_offsets[pair_protocols], repeats) + within]
+        keys, inverse = np.unique(np.repeat(pair_users, repeats) * max_skill_id + skill_rows, return_inverse=True)
+        practice_counts = np.bincount(inverse, weights=np.repeat(practice, repeats)).astype(np.int64)
+        row_users, row_skills = np.divmod(keys, max_skill_id)
+        count = len(keys)
+
+        # Mastery grows with practice and levels off, at a per-user rate
+        learning_rates = rng.uniform(8, 40, last - first + 1)[row_users - first]
+        mastery = (1 - np.exp(-practice_counts / learning_rates)) * rng.uniform(0.85, 1.0, count)
+        average_session_ms = rng.lognormal(np.log(20), 0.3, count) * MINUTE_MS
+        last_practiced = reference_ms - (rng.exponential(7, count) * DAY_MS).astype(np.int64)
+
+        columns = (
+            range(progress_id + 1, progress_id + count + 1),
+            row_users.tolist(),
+            row_skills.tolist(),
+            np.round(np.clip(mastery, 0.0, 1.0), 4).tolist(),
+            last_practiced.tolist(),
+            (practice_counts * average_session_ms).astype(np.int64).tolist(),
+            practice_counts.tolist(),
+        )
+        progress_id += count
+        yield from zip(*columns)
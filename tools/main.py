@@ -1,13 +1,29 @@
 #!/usr/bin/env python3
 """
 Main script to generate test data for Health Protocol database
+
+The fixed test data is always generated. Larger datasets add generated
+users, activity variants, history, skill progress and playlists on top of
+it, streamed into the database in chunks:
+
+    python main.py --users 1_000_000 --activities 50_000 --history-per-user 500 \\
+        --seed 42 --reference-date 2025-01-01
+
+The same seed and reference date always produce the same database.
 """
+import argparse
+import itertools
 import sqlite3
 import sys
 import os
 
-from tools.schema_utils import initialize_database
-from data_generators.users import generate_users, insert_users
+from tools.schema_utils import (
+    initialize_database, create_activity_search_index, create_rollups, rebuild_skill_availability
+)
+from data_generators import vectorized
+from data_generators.loader import bulk_load, generate_in_workers, load_table
+from data_generators.utils import reference_timestamp_ms
+from data_generators.users import generate_users, generate_more_users, insert_users
 from data_generators.metadata import (
     generate_difficulty_levels, generate_body_areas, generate_tags,
     insert_difficulty_levels, insert_body_areas, insert_tags
@@ -15,11 +31,13 @@ from data_generators.metadata import (
 from data_generators.activities import (
     generate_activities, generate_activity_body_areas, generate_activity_media,
     generate_activity_relationships, generate_activity_tags,
+    generate_activity_variants, generate_variant_links, generate_variant_relationships, variant_media_url,
     insert_activities, insert_activity_body_areas, insert_activity_media,
     insert_activity_relationships, insert_activity_tags
 )
 from data_generators.skills import (
     generate_skill_categories, generate_activity_skills, generate_skill_prerequisites,
+    generate_variant_prerequisites, variant_skill_name,
     generate_user_skill_progress, insert_skill_categories, insert_activity_skills,
     insert_skill_prerequisites, insert_user_skill_progress
 )
@@ -29,6 +47,7 @@ from data_generators.protocols import (
 )
 from data_generators.playlists import (
     generate_playlists, generate_playlist_items, generate_playlist_performances,
+    generate_more_playlists, generate_more_playlist_items,
     insert_playlists, insert_playlist_items, insert_playlist_performances
 )
 from data_generators.guides import (
@@ -36,99 +55,162 @@ from data_generators.guides import (
     insert_guides, insert_guide_parts, insert_guide_versions, insert_guide_part_versions
 )
 
-def main():
+def count_argument(value):
+    """Parse a non-negative count, allowing underscores (1_000_000)."""
+    count = int(value.replace("_", ""))
+    if count < 0:
+        raise argparse.ArgumentTypeError("must not be negative")
+    return count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate test data for the Health Protocol database")
+    parser.add_argument("--db", default="health_protocol.db", help="Database file to create")
+    parser.add_argument("--users", type=count_argument, default=3,
+                        help="Total number of users (at least the 3 fixed ones)")
+    parser.add_argument("--activities", type=count_argument, default=12,
+                        help="Total number of activities (at least the 12 fixed ones)")
+    parser.add_argument("--history-per-user", type=count_argument, default=22,
+                        help="Mean number of activity history entries per user")
+    parser.add_argument("--playlists-per-user", type=count_argument, default=2,
+                        help="Mean number of playlists per generated user")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated data")
+    parser.add_argument("--reference-date", default=None,
+                        help="YYYY-MM-DD the generated history leads up to (default: today)")
+    parser.add_argument("--chunk-size", type=count_argument, default=10000,
+                        help="Rows inserted per transaction")
+    parser.add_argument("--workers", type=count_argument, default=1,
+                        help="Processes generating activity history and skill progress")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="Generate activity history and skill progress with NumPy, whole columns at a time")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to generate and insert test data"""
+    args = parse_args(argv)
+    reference_ms = reference_timestamp_ms(args.reference_date)
+
     # Initialize database
     print("Initializing database...")
-    conn = initialize_database()
+    conn = initialize_database(args.db)
     cursor = conn.cursor()
-    
-    # Generate data for each table
+
+    # Generate the catalog, which is small enough to keep in memory
     print("Generating test data...")
-    
+
     # Basic data
-    users = generate_users()
+    fixed_users = generate_users()
     difficulty_levels = generate_difficulty_levels()
     body_areas = generate_body_areas()
     tags = generate_tags()
     skill_categories = generate_skill_categories()
-    
-    # Activity data
-    activities = generate_activities()
-    activity_body_areas = generate_activity_body_areas()
-    activity_media = generate_activity_media()
-    activity_tags = generate_activity_tags()
-    activity_relationships = generate_activity_relationships()
-    
+
+    # Activity data, extended with variants of the fixed activities
+    fixed_activities = generate_activities()
+    base_count = len(fixed_activities)
+    activity_count = max(args.activities, base_count)
+
+    def with_variants(links, adapt=None):
+        return links + list(generate_variant_links(links, base_count, activity_count, adapt))
+
+    activities = fixed_activities + list(generate_activity_variants(fixed_activities, activity_count))
+    activity_body_areas = with_variants(generate_activity_body_areas())
+    activity_media = with_variants(generate_activity_media(), variant_media_url)
+    activity_tags = with_variants(generate_activity_tags())
+    fixed_relationships = generate_activity_relationships()
+    activity_relationships = fixed_relationships + list(
+        generate_variant_relationships(fixed_relationships, base_count, activity_count))
+
     # Skills data
-    activity_skills = generate_activity_skills()
-    skill_prerequisites = generate_skill_prerequisites()
-    
+    activity_skills = with_variants(generate_activity_skills(), variant_skill_name)
+    fixed_prerequisites = generate_skill_prerequisites()
+    skill_prerequisites = fixed_prerequisites + list(
+        generate_variant_prerequisites(fixed_prerequisites, activity_skills, base_count))
+
     # Protocol data
     protocols = generate_protocols()
-    activity_protocols = generate_activity_protocols()
-    
-    # Dynamic data that depends on previous data
-    activity_history = generate_activity_history(activity_protocols)
-    user_skill_progress = generate_user_skill_progress(activity_history, activity_protocols, activity_skills)
-    
-    # Content data
-    playlists = generate_playlists()
-    playlist_items = generate_playlist_items()
-    playlist_performances = generate_playlist_performances(playlists)
-    
+    activity_protocols = with_variants(generate_activity_protocols(reference_ms))
+
     # Guide data
     guides = generate_guides()
     guide_parts = generate_guide_parts()
-    guide_versions = generate_guide_versions()
+    guide_versions = generate_guide_versions(reference_ms)
     guide_part_versions = generate_guide_part_versions()
-    
-    # Insert all data into database
+
+    # Per-user data is generated lazily, in worker processes for history and progress
+    user_count = max(args.users, len(fixed_users))
+
+    fixed_playlists = generate_playlists()
+    fixed_playlist_items = generate_playlist_items()
+
+    def more_playlists():
+        return generate_more_playlists(fixed_playlists, len(fixed_users) + 1, user_count,
+                                       args.playlists_per_user, args.seed)
+
+    if args.vectorized:
+        history_generator = vectorized.generate_activity_history
+        progress_generator = vectorized.generate_user_skill_progress
+        users_per_task = vectorized.BLOCK_USERS
+    else:
+        history_generator = generate_activity_history
+        progress_generator = generate_user_skill_progress
+        users_per_task = 1000
+    user_options = {"history_per_user": args.history_per_user, "seed": args.seed, "reference_ms": reference_ms}
+    activity_history = generate_in_workers(
+        history_generator, {"activity_protocols": activity_protocols, **user_options},
+        user_count, args.workers, users_per_task)
+    user_skill_progress = generate_in_workers(
+        progress_generator,
+        {"activity_protocols": activity_protocols, "activity_skills": activity_skills, **user_options},
+        user_count, args.workers, users_per_task)
+
+    tables = [
+        # Metadata tables
+        ("DifficultyLevels", insert_difficulty_levels, difficulty_levels),
+        ("BodyAreas", insert_body_areas, body_areas),
+        ("Tags", insert_tags, tags),
+        ("skill_categories", insert_skill_categories, skill_categories),
+        # Activity tables
+        ("activities", insert_activities, activities),
+        ("ActivityBodyAreas", insert_activity_body_areas, activity_body_areas),
+        ("ActivityMedia", insert_activity_media, activity_media),
+        ("ActivityTags", insert_activity_tags, activity_tags),
+        ("ActivityRelationships", insert_activity_relationships, activity_relationships),
+        # Skills tables
+        ("activity_skills", insert_activity_skills, activity_skills),
+        ("skill_prerequisites", insert_skill_prerequisites, skill_prerequisites),
+        # Protocol tables
+        ("protocols", insert_protocols, protocols),
+        ("activity_protocols", insert_activity_protocols, activity_protocols),
+        # Guide tables
+        ("Guides", insert_guides, guides),
+        ("GuideParts", insert_guide_parts, guide_parts),
+        ("GuideVersions", insert_guide_versions, guide_versions),
+        ("GuidePartVersions", insert_guide_part_versions, guide_part_versions),
+        # Users and their data
+        ("users", insert_users, itertools.chain(fixed_users, generate_more_users(fixed_users, user_count))),
+        ("activity_history", insert_activity_history, activity_history),
+        ("user_skill_progress", insert_user_skill_progress, user_skill_progress),
+        ("Playlists", insert_playlists, itertools.chain(fixed_playlists, more_playlists())),
+        ("PlaylistItems", insert_playlist_items, itertools.chain(
+            fixed_playlist_items,
+            generate_more_playlist_items(fixed_playlist_items, more_playlists(), activity_count, args.seed))),
+        ("PlaylistPerformance", insert_playlist_performances, generate_playlist_performances(
+            itertools.chain(fixed_playlists, more_playlists()), args.seed, reference_ms)),
+    ]
+
+    # Insert all data into database, then build the indexes and derived tables
     print("Inserting data into database...")
-    
-    # Users
-    insert_users(cursor, users)
-    
-    # Metadata tables
-    insert_difficulty_levels(cursor, difficulty_levels)
-    insert_body_areas(cursor, body_areas)
-    insert_tags(cursor, tags)
-    insert_skill_categories(cursor, skill_categories)
-    
-    # Activity tables
-    insert_activities(cursor, activities)
-    insert_activity_body_areas(cursor, activity_body_areas)
-    insert_activity_media(cursor, activity_media)
-    insert_activity_tags(cursor, activity_tags)
-    insert_activity_relationships(cursor, activity_relationships)
-    
-    # Skills tables
-    insert_activity_skills(cursor, activity_skills)
-    insert_skill_prerequisites(cursor, skill_prerequisites)
-    
-    # Protocol tables
-    insert_protocols(cursor, protocols)
-    insert_activity_protocols(cursor, activity_protocols)
-    insert_activity_history(cursor, activity_history)
-    
-    # User progress
-    insert_user_skill_progress(cursor, user_skill_progress)
-    
-    # Playlist tables
-    insert_playlists(cursor, playlists)
-    insert_playlist_items(cursor, playlist_items)
-    insert_playlist_performances(cursor, playlist_performances)
-    
-    # Guide tables
-    insert_guides(cursor, guides)
-    insert_guide_parts(cursor, guide_parts)
-    insert_guide_versions(cursor, guide_versions)
-    insert_guide_part_versions(cursor, guide_part_versions)
-    
+    with bulk_load(conn, rebuild=(create_activity_search_index, create_rollups, rebuild_skill_availability)):
+        for table, insert_function, rows in tables:
+            load_table(conn, table, insert_function, rows, args.chunk_size)
+
+    # Planner statistics for the loaded data
+    cursor.execute("ANALYZE")
+
     # Commit and close
     conn.commit()
     conn.close()
-    
+
     print("Data generation complete. Database has been populated with test data.")
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Apply pending schema migrations to an existing Health Protocol database.
+
+Usage:
+    python migrate.py --db health_protocol.db            # apply pending migrations
+    python migrate.py --db health_protocol.db --status   # list applied and pending migrations
+    python migrate.py --db health_protocol.db --dry-run  # print the SQL that would run
+"""
+import argparse
+import sqlite3
+import sys
+
+from schema_utils import MIGRATIONS, applied_migrations, dry_run_migrations, migrate
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--db", default="health_protocol.db", help="Path to the database file")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations")
+    parser.add_argument("--dry-run", action="store_true", help="Print the SQL of pending migrations without running it")
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.status:
+            applied = applied_migrations(conn)
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in applied else 'pending':<8} {name}")
+        elif args.dry_run:
+            plan = dry_run_migrations(conn)
+            for version, name, statements in plan:
+                print(f"-- {version}: {name}")
+                for statement in statements:
+                    print(f"{statement.rstrip(';')};")
+                print()
+            print(f"-- {len(plan)} pending migration(s)")
+        else:
+            try:
+                applied = migrate(conn)
+            except RuntimeError as e:
+                print(e, file=sys.stderr)
+                sys.exit(1)
+            for version, name, duration_ms in applied:
+                print(f"Applied {version}: {name} ({duration_ms} ms)")
+            print(f"{len(applied)} migration(s) applied")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,160 @@ Handles schema creation and validation functions.
 """
 import os
 import sqlite3
+import time
+from api.json_field_columns import JSON_FIELDS
+
+# Full-text search index over activities. Each FTS5 row mirrors one activity
+# (rowid = activities.id) with its tag and body area names denormalized into
+# their own columns, so a single MATCH covers all four fields.
+ACTIVITY_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS activity_search USING fts5(
+    name,
+    description,
+    tags,
+    body_areas,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- The sync triggers look up associations by activity; without these every
+-- tag or body area insert would scan the whole association table.
+CREATE INDEX IF NOT EXISTS idx_activity_tags_activity_id ON ActivityTags (activity_id);
+CREATE INDEX IF NOT EXISTS idx_activity_body_areas_activity_id ON ActivityBodyAreas (activity_id);
+"""
+
+ACTIVITY_SEARCH_ROW = """
+    SELECT
+        a.id,
+        a.name,
+        a.description,
+        (SELECT group_concat(t.name, ' ') FROM ActivityTags at
+         JOIN Tags t ON t.id = at.tag_id WHERE at.activity_id = a.id),
+        (SELECT group_concat(b.name, ' ') FROM ActivityBodyAreas aba
+         JOIN BodyAreas b ON b.id = aba.body_area_id WHERE aba.activity_id = a.id)
+    FROM activities a
+"""
+
+# (trigger name, trigger event, SQL selecting the affected activity ids)
+ACTIVITY_SEARCH_TRIGGERS = [
+    ("activity_search_ai", "AFTER INSERT ON activities", "SELECT new.id"),
+    ("activity_search_au", "AFTER UPDATE OF name, description ON activities", "SELECT new.id"),
+    ("activity_search_tags_ai", "AFTER INSERT ON ActivityTags", "SELECT new.activity_id"),
+    ("activity_search_tags_au", "AFTER UPDATE ON ActivityTags", "SELECT old.activity_id UNION SELECT new.activity_id"),
+    ("activity_search_tags_ad", "AFTER DELETE ON ActivityTags", "SELECT old.activity_id"),
+    ("activity_search_tag_names_au", "AFTER UPDATE OF name ON Tags",
+     "SELECT activity_id FROM ActivityTags WHERE tag_id = new.id"),
+    ("activity_search_body_areas_ai", "AFTER INSERT ON ActivityBodyAreas", "SELECT new.activity_id"),
+    ("activity_search_body_areas_au", "AFTER UPDATE ON ActivityBodyAreas",
+     "SELECT old.activity_id UNION SELECT new.activity_id"),
+    ("activity_search_body_areas_ad", "AFTER DELETE ON ActivityBodyAreas", "SELECT old.activity_id"),
+    ("activity_search_body_area_names_au", "AFTER UPDATE OF name ON BodyAreas",
+     "SELECT activity_id FROM ActivityBodyAreas WHERE body_area_id = new.id"),
+]
+
+# Reference tables whose writes bump a row in table_versions. The API uses
+# these counters to build ETags without reading the tables themselves.
+VERSIONED_TABLES = ["DifficultyLevels", "Tags", "BodyAreas", "skill_categories", "protocols", "skill_prerequisites"]
+
+# Indexes for the foreign key lookups the API makes, as (table, columns).
+# Composite indexes put the filtered key first and the column the route
+# orders or ranges by second, so those queries need no sort step. Keys
+# already leading another index (e.g. ActivityTags.activity_id,
+# activity_history.user_id) are not repeated.
+FOREIGN_KEY_INDEXES = [
+    ("ActivityTags", ("tag_id", "activity_id")),
+    ("ActivityBodyAreas", ("body_area_id", "activity_id")),
+    ("ActivityMedia", ("activity_id",)),
+    ("ActivityRelationships", ("activity1_id",)),
+    ("ActivityRelationships", ("activity2_id",)),
+    ("activities", ("difficulty_level",)),
+    ("activity_protocols", ("protocol_id", "activity_id")),
+    ("activity_protocols", ("activity_id",)),
+    ("activity_history", ("activity_protocol_id", "start_time_ms")),
+    ("Useractivities", ("user_id", "performed_at")),
+    ("Useractivities", ("activity_id",)),
+    ("Playlists", ("user_id",)),
+    ("PlaylistItems", ("playlist_id", "order")),
+    ("PlaylistItems", ("activity_id",)),
+    ("PlaylistPerformance", ("playlist_id", "performed_at")),
+    ("PlaylistPerformance", ("user_id",)),
+    ("ActivitySharing", ("user_activity_id",)),
+    ("PlaylistSharing", ("playlist_id",)),
+    ("GuideParts", ("guide_id", "order")),
+    ("GuideVersions", ("guide_id", "version_number")),
+    ("GuidePartVersions", ("guide_version_id",)),
+    ("activity_skills", ("activity_id",)),
+    ("activity_skills", ("category_id",)),
+    ("skill_prerequisites", ("prerequisite_skill_id",)),
+    ("user_skill_progress", ("user_id", "skill_id")),
+    ("user_skill_progress", ("skill_id",)),
+]
+
+# Natural key of an activity history record: a user starts a given activity
+# protocol at most once per millisecond. Making it unique lets the batch
+# ingestion endpoint skip records a device sends again after a retry.
+ACTIVITY_HISTORY_KEY_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_activity_history_key
+ON activity_history (user_id, activity_protocol_id, start_time_ms);
+"""
+
+# Materialized replacement for the available_user_skills view: one row per
+# user and skill the user has progress on, with is_available set when every
+# prerequisite of the skill has reached its required mastery level for that
+# user. The API keeps it up to date as progress and prerequisites change.
+SKILL_AVAILABILITY_TABLE = """
+CREATE TABLE IF NOT EXISTS user_skill_availability (
+    user_id INTEGER NOT NULL,
+    skill_id INTEGER NOT NULL,
+    is_available INTEGER NOT NULL,
+    PRIMARY KEY (user_id, skill_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_skill_prerequisites_skill_id ON skill_prerequisites (skill_id);
+"""
+
+SKILL_AVAILABILITY_ROW = """
+    SELECT
+        us.user_id,
+        us.skill_id,
+        NOT EXISTS (
+            SELECT 1 FROM skill_prerequisites sp
+            LEFT JOIN user_skill_progress p
+                ON p.user_id = us.user_id AND p.skill_id = sp.prerequisite_skill_id
+            WHERE sp.skill_id = us.skill_id
+              AND NOT coalesce(p.mastery_level >= sp.required_mastery_level, FALSE)
+        ) AS is_available
+    FROM user_skill_progress us
+"""
+
+# Daily and weekly per-user aggregates of activity history and playlist
+# performances, kept current by triggers on the raw tables so that stats
+# queries never scan raw rows. Periods are UTC days and Monday-based weeks.
+# A key looked up in another table ("key_table") is also kept current when
+# that table's row is changed to point elsewhere.
+ROLLUPS = [
+    {
+        "table": "activity_history_rollups",
+        "source": "activity_history",
+        "key": "activity_id",
+        "key_sql": "(SELECT activity_id FROM activity_protocols WHERE id = {row}.activity_protocol_id)",
+        "key_table": ("activity_protocols", "activity_id", "activity_protocol_id"),
+        "time_sql": "{row}.start_time_ms / 1000, 'unixepoch'",
+        "completed_sql": "{row}.status = 'completed'",
+        "duration_sql": "{row}.end_time_ms - {row}.start_time_ms",
+    },
+    {
+        "table": "playlist_performance_rollups",
+        "source": "PlaylistPerformance",
+        "key": "playlist_id",
+        "key_sql": "{row}.playlist_id",
+        "time_sql": "{row}.performed_at",
+        "completed_sql": "CASE WHEN json_valid({row}.performance_data) "
+                         "THEN coalesce(json_extract({row}.performance_data, '$.completed'), 0) ELSE 0 END",
+        "duration_sql": "CASE WHEN json_valid({row}.performance_data) "
+                        "THEN coalesce(json_extract({row}.performance_data, '$.duration_minutes'), 0) * 60000 ELSE 0 END",
+    },
+]
 
 def setup_database(db_path="health_protocol.db"):
     """
@@ -60,9 +214,595 @@ def execute_schema(conn, schema_file="schema.sql"):
     
     return conn
 
+def activity_search_schema():
+    """
+    Build the SQL that creates the activity full-text search table and the
+    triggers keeping it in sync with activities, tags and body areas.
+
+    Returns:
+        str: SQL script
+    """
+    statements = [ACTIVITY_SEARCH_TABLE]
+
+    for name, event, activity_ids in ACTIVITY_SEARCH_TRIGGERS:
+        statements.append(f"""
+CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN
+    INSERT OR REPLACE INTO activity_search (rowid, name, description, tags, body_areas)
+    {ACTIVITY_SEARCH_ROW} WHERE a.id IN ({activity_ids});
+END;
+""")
+
+    statements.append("""
+CREATE TRIGGER IF NOT EXISTS activity_search_ad AFTER DELETE ON activities BEGIN
+    DELETE FROM activity_search WHERE rowid = old.id;
+END;
+""")
+
+    return "".join(statements)
+
+def create_activity_search_index(conn):
+    """
+    Create the activity full-text search index and (re)build its contents.
+    Safe to run against an existing database.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with the search index applied
+    """
+    cursor = conn.cursor()
+    cursor.executescript(activity_search_schema())
+    
+    # Rebuild from the current tables so existing rows are searchable
+    cursor.execute("DELETE FROM activity_search")
+    cursor.execute(
+        f"INSERT INTO activity_search (rowid, name, description, tags, body_areas) {ACTIVITY_SEARCH_ROW}"
+    )
+    conn.commit()
+    
+    return conn
+
+def table_versions_schema():
+    """
+    Build the SQL that creates the table_versions table and the triggers
+    bumping it on every insert, update or delete of a versioned table.
+    
+    Returns:
+        str: SQL script
+    """
+    statements = ["""
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""]
+
+    for table in VERSIONED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(f"""
+CREATE TRIGGER IF NOT EXISTS {table.lower()}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('{table}', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+""")
+
+    return "".join(statements)
+
+def create_table_versions(conn):
+    """
+    Create the table_versions counters and their triggers.
+    Safe to run against an existing database.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with the version counters applied
+    """
+    cursor = conn.cursor()
+    cursor.executescript(table_versions_schema())
+    conn.commit()
+    
+    return conn
+
+def foreign_key_index_schema():
+    """
+    Build the SQL that creates the FOREIGN_KEY_INDEXES.
+    
+    Returns:
+        str: SQL script
+    """
+    statements = []
+    for table, columns in FOREIGN_KEY_INDEXES:
+        name = f"idx_{table.lower()}_{'_'.join(columns)}"
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        statements.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list});\n")
+    return "".join(statements)
+
+def create_foreign_key_indexes(conn):
+    """
+    Create the FOREIGN_KEY_INDEXES.
+    Safe to run against an existing database: each index is built and
+    committed on its own, so writers wait for one index build at a time
+    rather than for all of them, and an interrupted run resumes where it
+    stopped.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with the indexes applied
+    """
+    cursor = conn.cursor()
+    for statement in foreign_key_index_schema().splitlines():
+        cursor.execute(statement)
+        conn.commit()
+    
+    return conn
+
+def create_activity_history_key(conn):
+    """
+    Create the unique index on the activity history natural key.
+    Safe to run against an existing database: records sent twice, equal in
+    every column but their id, are deleted first, keeping the oldest one,
+    and their number is printed.
+    Records sharing a key but differing otherwise are not merged; they are
+    reported and the index is not created until they are resolved.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with the index applied
+    """
+    cursor = conn.cursor()
+    columns = ", ".join(
+        row[1] for row in cursor.execute("PRAGMA table_info(activity_history)") if row[1] != "id"
+    )
+    deleted = cursor.execute(
+        f"DELETE FROM activity_history WHERE id NOT IN "
+        f"(SELECT min(id) FROM activity_history GROUP BY {columns})"
+    ).rowcount
+    conflicts = cursor.execute(
+        "SELECT user_id, activity_protocol_id, start_time_ms, group_concat(id, ', ') "
+        "FROM activity_history GROUP BY user_id, activity_protocol_id, start_time_ms "
+        "HAVING count(*) > 1"
+    ).fetchall()
+    if conflicts:
+        conn.rollback()
+        listed = "\n".join(
+            f"  user {user_id}, activity protocol {activity_protocol_id}, start_time_ms {start_time_ms}: ids {ids}"
+            for user_id, activity_protocol_id, start_time_ms, ids in conflicts[:20]
+        )
+        more = f"\n  ... and {len(conflicts) - 20} more" if len(conflicts) > 20 else ""
+        raise RuntimeError(
+            f"{len(conflicts)} activity history keys have differing records; "
+            f"delete or fix all but one record of each, then migrate again:\n{listed}{more}"
+        )
+    cursor.executescript(ACTIVITY_HISTORY_KEY_INDEX)
+    conn.commit()
+    if deleted:
+        print(f"Deleted {deleted} activity history records sent twice")
+    
+    return conn
+
+def rebuild_skill_availability(conn):
+    """
+    Create the user_skill_availability table if needed and recompute it
+    from user_skill_progress and skill_prerequisites. Run this after
+    loading progress data outside the API.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with skill availability rebuilt
+    """
+    cursor = conn.cursor()
+    cursor.executescript(SKILL_AVAILABILITY_TABLE)
+    cursor.execute("DELETE FROM user_skill_availability")
+    cursor.execute(
+        f"INSERT INTO user_skill_availability (user_id, skill_id, is_available) {SKILL_AVAILABILITY_ROW}"
+    )
+    conn.commit()
+    
+    return conn
+
+def rollup_rows(rollup, row, source="", key_sql=None):
+    """
+    Build a SELECT turning source rows into one (user_id, period,
+    period_start, key, completed, duration_ms) row per day and week.
+    
+    Args:
+        rollup: Entry of ROLLUPS
+        row: Name the source row is referenced by ('new', 'old' or an alias)
+        source: FROM clause for the source rows, empty inside triggers
+        key_sql: Key to use instead of the rollup's key_sql
+        
+    Returns:
+        str: SQL query
+    """
+    fields = {name: rollup[name].format(row=row) for name in
+              ("key_sql", "time_sql", "completed_sql", "duration_sql")}
+    if key_sql is not None:
+        fields["key_sql"] = key_sql
+    from_clause = f"{source}, " if source else ""
+    return f"""
+        SELECT * FROM (
+            SELECT {row}.user_id AS user_id,
+                   periods.period,
+                   CASE periods.period
+                       WHEN 'day' THEN date({fields["time_sql"]})
+                       ELSE date({fields["time_sql"]}, 'weekday 0', '-6 days')
+                   END AS period_start,
+                   {fields["key_sql"]} AS rollup_key,
+                   {fields["completed_sql"]} AS completed,
+                   {fields["duration_sql"]} AS duration_ms
+            FROM {from_clause}(SELECT 'day' AS period UNION ALL SELECT 'week') AS periods
+        )
+        WHERE user_id IS NOT NULL AND period_start IS NOT NULL AND rollup_key IS NOT NULL"""
+
+def rollup_schema():
+    """
+    Build the SQL that creates the rollup tables and the triggers adding
+    each inserted, updated or deleted source row to its day and week, and
+    moving the rows of a changed key_table row to its new key.
+    
+    Returns:
+        str: SQL script
+    """
+    statements = []
+    
+    for rollup in ROLLUPS:
+        table, key = rollup["table"], rollup["key"]
+        statements.append(f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    user_id INTEGER NOT NULL,
+    period TEXT NOT NULL CHECK (period IN ('day', 'week')),
+    period_start TEXT NOT NULL,
+    {key} INTEGER NOT NULL,
+    session_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    total_duration_ms INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period, period_start, {key})
+) WITHOUT ROWID;
+""")
+
+        def apply(row, sign, source="", key_sql=None):
+            return f"""
+    INSERT INTO {table} (user_id, period, period_start, {key}, session_count, completed_count, total_duration_ms)
+    SELECT user_id, period, period_start, rollup_key, {sign}, {sign} * completed, {sign} * duration_ms
+    FROM ({rollup_rows(rollup, row, source, key_sql)})
+    WHERE true
+    ON CONFLICT (user_id, period, period_start, {key}) DO UPDATE SET
+        session_count = session_count + excluded.session_count,
+        completed_count = completed_count + excluded.completed_count,
+        total_duration_ms = total_duration_ms + excluded.total_duration_ms;"""
+
+        # Drop periods whose last row went away
+        prune = f"""
+    DELETE FROM {table} WHERE user_id = old.user_id AND session_count = 0;"""
+
+        for event, body in (("INSERT", apply("new", 1)),
+                            ("UPDATE", apply("old", -1) + apply("new", 1) + prune),
+                            ("DELETE", apply("old", -1) + prune)):
+            statements.append(f"""
+CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()} AFTER {event} ON {rollup["source"]} BEGIN{body}
+END;
+""")
+
+        if "key_table" in rollup:
+            key_table, key_column, reference = rollup["key_table"]
+            rows = f"(SELECT * FROM {rollup['source']} WHERE {reference} = old.id) AS src"
+            body = (apply("src", -1, rows, f"old.{key_column}") + apply("src", 1, rows, f"new.{key_column}") + f"""
+    DELETE FROM {table} WHERE session_count = 0
+        AND user_id IN (SELECT user_id FROM {rollup['source']} WHERE {reference} = old.id);""")
+            statements.append(f"""
+CREATE TRIGGER IF NOT EXISTS {table}_{key_table}_update AFTER UPDATE OF {key_column} ON {key_table}
+WHEN old.{key_column} IS NOT new.{key_column} BEGIN{body}
+END;
+""")
+
+    return "".join(statements)
+
+def create_rollups(conn):
+    """
+    Create the stats rollup tables and their triggers and (re)build their
+    contents from the raw history and performance rows.
+    Safe to run against an existing database.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with the rollups applied
+    """
+    cursor = conn.cursor()
+    cursor.executescript(rollup_schema())
+    
+    for rollup in ROLLUPS:
+        rebuild_rollup(cursor, rollup)
+    conn.commit()
+    
+    return conn
+
+def rollup_totals_sql(rollup):
+    """
+    Build the query aggregating the raw source rows of a rollup, giving
+    the rows its table should hold.
+    
+    Returns:
+        str: SQL query
+    """
+    return f"""
+            SELECT user_id, period, period_start, rollup_key, count(*), sum(completed), sum(duration_ms)
+            FROM ({rollup_rows(rollup, "src", f"{rollup['source']} AS src")})
+            GROUP BY user_id, period, period_start, rollup_key"""
+
+def rebuild_rollup(cursor, rollup):
+    """
+    Replace the contents of a rollup table with the totals of its source rows.
+    
+    Args:
+        cursor: Database cursor
+        rollup: ROLLUPS entry
+    """
+    table, key = rollup["table"], rollup["key"]
+    cursor.execute(f"DELETE FROM {table}")
+    cursor.execute(f"""
+            INSERT INTO {table} (user_id, period, period_start, {key}, session_count, completed_count, total_duration_ms)
+            {rollup_totals_sql(rollup)}
+        """)
+
+def create_rollup_key_triggers(conn):
+    """
+    Create the triggers moving rollup rows when a key_table row changes key.
+    Rollups built before these triggers existed may have missed such a
+    change; the tables that no longer match their source rows are rebuilt,
+    the others, such as those of a fresh database, are left untouched.
+    Safe to run against an existing database.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with the triggers applied
+    """
+    cursor = conn.cursor()
+    cursor.executescript(rollup_schema())
+    
+    for rollup in ROLLUPS:
+        if "key_table" not in rollup:
+            continue
+        table, key = rollup["table"], rollup["key"]
+        stored = f"""
+            SELECT user_id, period, period_start, {key}, session_count, completed_count, total_duration_ms
+            FROM {table}"""
+        totals = rollup_totals_sql(rollup)
+        stale = cursor.execute(
+            f"SELECT EXISTS ({stored} EXCEPT {totals}) OR EXISTS ({totals} EXCEPT {stored})"
+        ).fetchone()[0]
+        if stale:
+            rebuild_rollup(cursor, rollup)
+    conn.commit()
+    
+    return conn
+
+def json_field_sql(column, key, sql_type):
+    """
+    Build the generated column expression extracting a typed JSON key.
+    Malformed JSON and values of another JSON type give NULL rather than
+    an error, so bad rows never block writes.
+    
+    Returns:
+        str: SQL expression
+    """
+    json_types = "'true', 'false'" if sql_type == "BOOLEAN" else "'integer', 'real'"
+    storage_type = "INTEGER" if sql_type == "BOOLEAN" else sql_type
+    return (f"CASE WHEN json_valid({column}) THEN "
+            f"CASE WHEN json_type({column}, '$.{key}') IN ({json_types}) "
+            f"THEN CAST(json_extract({column}, '$.{key}') AS {storage_type}) END END")
+
+def create_json_field_columns(conn):
+    """
+    Add the JSON_FIELDS generated columns and their indexes to the tables
+    that do not have them yet. Generated columns are VIRTUAL, so existing
+    rows need no rewrite; the indexes store the extracted values.
+    Safe to run against an existing database.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        conn: Database connection with the typed columns applied
+    """
+    cursor = conn.cursor()
+    
+    for table, (column, fields) in JSON_FIELDS.items():
+        # table_xinfo, unlike table_info, lists generated columns
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_xinfo({table})")}
+        for key, sql_type in fields:
+            name = f"{column}_{key}"
+            if name not in existing:
+                storage_type = "INTEGER" if sql_type == "BOOLEAN" else sql_type
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {name} {storage_type} "
+                    f"GENERATED ALWAYS AS ({json_field_sql(column, key, sql_type)}) VIRTUAL"
+                )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table.lower()}_{name} ON {table} ({name})")
+    conn.commit()
+    
+    return conn
+
+# Numbered schema migrations applied on top of schema.sql, as (version,
+# name, function). Each function must be safe to run again on a database
+# it was already applied to, since it may have been interrupted. Append
+# new migrations with the next version number; never renumber.
+MIGRATIONS = [
+    (1, "activity search index", create_activity_search_index),
+    (2, "table versions", create_table_versions),
+    (3, "activity history key", create_activity_history_key),
+    (4, "foreign key indexes", create_foreign_key_indexes),
+    (5, "skill availability", rebuild_skill_availability),
+    (6, "stats rollups", create_rollups),
+    (7, "json field columns", create_json_field_columns),
+    (8, "stats rollup key updates", create_rollup_key_triggers),
+]
+
+SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INTEGER
+);
+"""
+
+def applied_migrations(conn):
+    """
+    Get the migrations recorded in schema_version.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        set: Applied migration versions, empty for databases without the table
+    """
+    cursor = conn.cursor()
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not exists:
+        return set()
+    return {row[0] for row in cursor.execute("SELECT version FROM schema_version")}
+
+def pending_migrations(conn):
+    """
+    Get the migrations not applied to the database yet, in order.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        list: (version, name, function) tuples
+    """
+    applied = applied_migrations(conn)
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+def schema_clone(conn):
+    """
+    Copy the schema of a database, without its rows, into an in-memory one.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        Connection to the in-memory copy
+    """
+    clone = sqlite3.connect(":memory:")
+    rows = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+    ).fetchall()
+    for (sql,) in rows:
+        try:
+            clone.execute(sql)
+        except sqlite3.OperationalError as e:
+            # Shadow tables of FTS5 indexes are created with their virtual table
+            if "already exists" not in str(e):
+                raise
+    clone.commit()
+    return clone
+
+def strip_leading_comments(statement):
+    """
+    Remove the blank and -- comment lines preceding a statement, which
+    executescript passes on to the trace callback along with it.
+    
+    Args:
+        statement: SQL statement
+        
+    Returns:
+        str: The statement, empty if it held only comments
+    """
+    lines = statement.strip().splitlines()
+    while lines and (not lines[0].strip() or lines[0].lstrip().startswith("--")):
+        lines.pop(0)
+    return "\n".join(lines).strip()
+
+def dry_run_migrations(conn):
+    """
+    Get the SQL the pending migrations would run, without changing the
+    database. The migrations are run against an empty copy of its schema,
+    so this is fast even for large databases.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        list: (version, name, statements) tuples
+    """
+    clone = schema_clone(conn)
+    statements = []
+    clone.set_trace_callback(statements.append)
+    
+    plan = []
+    for version, name, apply in pending_migrations(conn):
+        statements.clear()
+        apply(clone)
+        plan.append((version, name, [
+            statement for statement in map(strip_leading_comments, statements)
+            if statement and statement not in ("BEGIN", "COMMIT")
+        ]))
+    clone.close()
+    return plan
+
+def migrate(conn, busy_timeout_ms=30000):
+    """
+    Apply the pending migrations in order, recording each in schema_version.
+    
+    The database must already have the base schema from schema.sql.
+    Migrations only add tables, columns, indexes and triggers (besides
+    deleting activity history records sent twice), so this is safe to run
+    against a database the API is serving: busy_timeout makes the
+    migration and the API wait for each other's write locks instead of
+    failing.
+    
+    Args:
+        conn: Database connection
+        busy_timeout_ms: How long to wait for a write lock
+        
+    Returns:
+        list: (version, name, duration in ms) of the applied migrations
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    has_base_schema = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+    ).fetchone()
+    if not has_base_schema:
+        raise RuntimeError("Database has no base schema; create it with initialize_database first")
+    
+    cursor.executescript(SCHEMA_VERSION_TABLE)
+    applied = []
+    for version, name, apply in pending_migrations(conn):
+        started = time.monotonic()
+        apply(conn)
+        duration_ms = int((time.monotonic() - started) * 1000)
+        cursor.execute(
+            "INSERT INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)",
+            (version, name, duration_ms)
+        )
+        conn.commit()
+        applied.append((version, name, duration_ms))
+    
+    return applied
+
 def initialize_database(db_path="health_protocol.db", paste_file="paste.txt", schema_file="schema.sql"):
     """
-    Initialize the database with schema from the paste file.
+    Initialize a fresh database with schema from the paste file and all
+    migrations applied. To update an existing database instead, use
+    migrate() (or migrate.py).
     
     Args:
         db_path: Path to the database file
@@ -75,5 +815,6 @@ def initialize_database(db_path="health_protocol.db", paste_file="paste.txt", sc
     conn = setup_database(db_path)
     create_schema_file(paste_file, schema_file)
     conn = execute_schema(conn, schema_file)
+    migrate(conn)
     
     return conn